@@ -37,15 +37,18 @@ class DICOMM3DPluginClass(DICOMPluginBase):
     """
     loadables = []
 
+    fileValues = self.getFileValues(files, [self.tags['modality'], self.tags['instanceUID'],
+                                            self.tags['seriesDescription']])
+
     for candidateFile in files:
       #read modality type to flag M3D object.
-      isDicomM3D = (slicer.dicomDatabase.fileValue(candidateFile, self.tags['modality']) == 'M3D')
+      isDicomM3D = (fileValues[candidateFile][self.tags['modality']] == 'M3D')
       if isDicomM3D:
-        uid = slicer.dicomDatabase.fileValue(candidateFile, self.tags['instanceUID'])
+        uid = fileValues[candidateFile][self.tags['instanceUID']]
         if uid == '':
           return []
 
-        desc = slicer.dicomDatabase.fileValue(candidateFile, self.tags['seriesDescription'])
+        desc = fileValues[candidateFile][self.tags['seriesDescription']]
         if desc == '':
           desc = "Unknown"
 
@@ -64,7 +67,7 @@ class DICOMM3DPluginClass(DICOMPluginBase):
 
   def getFrameOfReferenceUID(self, candidateFile):
     """Returns the frame of referenceUID for the given loadable"""
-    dcm = pydicom.dcmread(candidateFile)
+    dcm = self.readDICOMHeader(candidateFile, ["FrameOfReferenceUID"])
     if hasattr(dcm, "FrameOfReferenceUID"):
       return dcm.FrameOfReferenceUID
     else:
@@ -27,17 +27,20 @@ class DICOMParametricMapPluginClass(DICOMPluginBase):
     # just read the modality type; need to go to reporting logic, since DCMTK
     #   is not wrapped ...
 
+    fileValues = self.getFileValues(files, [self.tags['instanceUID'], self.tags['seriesDescription'],
+                                            self.tags['classUID']])
+
     for cFile in files:
 
-      uid = slicer.dicomDatabase.fileValue(cFile, self.tags['instanceUID'])
+      uid = fileValues[cFile][self.tags['instanceUID']]
       if uid == '':
         return []
 
-      desc = slicer.dicomDatabase.fileValue(cFile, self.tags['seriesDescription'])
+      desc = fileValues[cFile][self.tags['seriesDescription']]
       if desc == '':
         desc = "Unknown"
 
-      isDicomPM = (slicer.dicomDatabase.fileValue(cFile, self.tags['classUID']) == '1.2.840.10008.5.1.4.1.1.30')
+      isDicomPM = (fileValues[cFile][self.tags['classUID']] == '1.2.840.10008.5.1.4.1.1.30')
 
       if isDicomPM:
         loadable = DICOMLoadable()
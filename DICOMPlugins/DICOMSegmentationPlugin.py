@@ -1,10 +1,15 @@
 from __future__ import absolute_import
+import copy
 import glob
 import os
 import json
+import sys
+import tempfile
+import time
 import vtk
 import vtkSegmentationCorePython as vtkSegmentationCore
 import logging
+from collections import OrderedDict
 
 from base.DICOMPluginBase import DICOMPluginBase
 
@@ -21,6 +26,9 @@ from six.moves import range
 #
 class DICOMSegmentationPluginClass(DICOMPluginBase):
 
+  # decode SEG objects in memory, segimage2itkimage is only used if this fails
+  useNativeReader = True
+
   def __init__(self):
     super(DICOMSegmentationPluginClass,self).__init__()
     self.loadType = "DICOMSegmentation"
@@ -35,17 +43,20 @@ class DICOMSegmentationPluginClass(DICOMPluginBase):
     # just read the modality type; need to go to reporting logic, since DCMTK
     #   is not wrapped ...
 
+    fileValues = self.getFileValues(files, [self.tags['instanceUID'], self.tags['seriesDescription'],
+                                            self.tags['modality']])
+
     for cFile in files:
 
-      uid = slicer.dicomDatabase.fileValue(cFile, self.tags['instanceUID'])
+      uid = fileValues[cFile][self.tags['instanceUID']]
       if uid == '':
         return []
 
-      desc = slicer.dicomDatabase.fileValue(cFile, self.tags['seriesDescription'])
+      desc = fileValues[cFile][self.tags['seriesDescription']]
       if desc == '':
         desc = "Unknown"
 
-      isDicomSeg = (slicer.dicomDatabase.fileValue(cFile, self.tags['modality']) == 'SEG')
+      isDicomSeg = (fileValues[cFile][self.tags['modality']] == 'SEG')
 
       if isDicomSeg:
         loadable = DICOMLoadable()
@@ -87,6 +98,72 @@ class DICOMSegmentationPluginClass(DICOMPluginBase):
     except AttributeError:
       return False
 
+    segFileName = slicer.dicomDatabase.fileForInstance(uid)
+    if segFileName is None:
+      logging.error('Failed to get the filename from the DICOM database for ' + uid)
+      return False
+
+    if self.useNativeReader:
+      try:
+        return self._loadWithReader(loadable, segFileName)
+      except Exception as exc:
+        logging.warning("Decoding DICOM Segmentation in memory failed ({}), falling back to segimage2itkimage"
+                        .format(str(exc)))
+    return self._loadWithCLI(loadable, segFileName)
+
+  def _loadWithReader(self, loadable, segFileName):
+    startTime = time.time()
+    reader = DICOMSegmentationReader(segFileName)
+    segmentLabelmaps = reader.getSegmentLabelmaps()
+    segmentsAttributes = reader.getSegmentAttributes()
+
+    # the SEG's own terminology is loaded like for segimage2itkimage, using a descriptor file in dcmqi format
+    terminologiesLogic = slicer.modules.terminologies.logic()
+    descriptorFile, descriptorFileName = tempfile.mkstemp(suffix=".json")
+    try:
+      with os.fdopen(descriptorFile, "w") as f:
+        json.dump({"segmentAttributes": [[attributes] for attributes in segmentsAttributes]}, f)
+      categoryContextName, anatomicContextName = self._loadTerminologyContexts(loadable, descriptorFileName,
+                                                                               terminologiesLogic)
+    finally:
+      os.remove(descriptorFileName)
+
+    segmentationNode = self._initializeSegmentation(loadable)
+    wasModified = segmentationNode.StartModify()
+    try:
+      segmentation = segmentationNode.GetSegmentation()
+      binaryLabelmapName = \
+        vtkSegmentationCore.vtkSegmentationConverter.GetSegmentationBinaryLabelmapRepresentationName()
+      for segmentAttributes in segmentsAttributes:
+        segment = vtkSegmentationCore.vtkSegment()
+        segment.AddRepresentation(binaryLabelmapName, segmentLabelmaps[segmentAttributes["labelID"]])
+        self._setSegmentAttributes(segment, self._getLabelAttributes(segmentAttributes, terminologiesLogic,
+                                                                     categoryContextName, anatomicContextName))
+        segmentation.AddSegment(segment)
+      # segments are intentionally not collapsed into shared layers, which would expand them to the union extent
+      segmentationNode.EndModify(wasModified)
+      self._finalizeSegmentationNode(loadable, segmentationNode)
+    except Exception:
+      # do not leave a partially loaded segmentation behind, load() falls back to segimage2itkimage
+      segmentationNode.EndModify(wasModified)
+      self._removeSegmentationNode(segmentationNode)
+      raise
+    logging.info("Loaded {} segments from {} in {:.2f}s (peak RSS: {})"
+                 .format(len(segmentsAttributes), segFileName, time.time() - startTime, self.getPeakMemoryUsage()))
+    return True
+
+  @staticmethod
+  def getPeakMemoryUsage():
+    try:
+      import resource
+    except ImportError:
+      # not available on Windows
+      return "n/a"
+    maxRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # reported in bytes on macOS and in kilobytes elsewhere
+    return "{:.1f} MB".format(maxRSS / (1024. * 1024.) if sys.platform == "darwin" else maxRSS / 1024.)
+
+  def _loadWithCLI(self, loadable, segFileName):
     self.tempDir = os.path.join(slicer.app.temporaryPath, "QIICR", "SEG", self.currentDateTime, loadable.uid)
     try:
       os.makedirs(self.tempDir)
@@ -95,12 +172,6 @@ class DICOMSegmentationPluginClass(DICOMPluginBase):
 
     # produces output label map files, one per segment, and information files with
     # the terminology information for each segment
-    segFileName = slicer.dicomDatabase.fileForInstance(uid)
-    if segFileName is None:
-      logging.error('Failed to get the filename from the DICOM database for ' + uid)
-      self.cleanup()
-      return False
-
     parameters = {
       "inputSEGFileName": segFileName,
       "outputDirName": self.tempDir,
@@ -132,19 +203,8 @@ class DICOMSegmentationPluginClass(DICOMPluginBase):
 
     # Load terminology in the metafile into context
     terminologiesLogic = slicer.modules.terminologies.logic()
-
-    categoryContextName = loadable.name
-    if not terminologiesLogic.LoadTerminologyFromSegmentDescriptorFile(categoryContextName, metaFileName):
-      categoryContextName = "Segmentation category and type - DICOM master list"
-
-    anatomicContextName = loadable.name
-    try:
-      if not terminologiesLogic.LoadRegionContextFromSegmentDescriptorFile(anatomicContextName, metaFileName):
-        anatomicContextName = "Anatomic codes - DICOM master list"
-    except AttributeError:
-      # backward compatibility with Slicer 5.8.1
-      if not terminologiesLogic.LoadAnatomicContextFromSegmentDescriptorFile(anatomicContextName, metaFileName):
-        anatomicContextName = "Anatomic codes - DICOM master list"
+    categoryContextName, anatomicContextName = self._loadTerminologyContexts(loadable, metaFileName,
+                                                                             terminologiesLogic)
 
     with open(metaFileName) as metaFile:
       data = json.load(metaFile)
@@ -157,10 +217,6 @@ class DICOMSegmentationPluginClass(DICOMPluginBase):
 
       for segmentationId,segmentAttributes in enumerate(data["segmentAttributes"]):
 
-        # TODO: Create logic class that both CLI and this plugin uses so that we don't need to have temporary NRRD
-        # files and labelmap nodes
-        # if not hasattr(slicer.modules, 'segmentations'):
-
         labelFileName = os.path.join(self.tempDir, str(segmentationId+1) + ".nrrd")
         # The temporary folder contains 1.nrrd, 2.nrrd,... files. We must specify singleFile=True to ensure
         # they are not loaded as an image stack (could happen if each image file has a single slice only).
@@ -169,61 +225,8 @@ class DICOMSegmentationPluginClass(DICOMPluginBase):
         labelNode.labelAttributes = []
 
         for segment in segmentAttributes:
-          try:
-            rgb255 = segment["recommendedDisplayRGBValue"]
-            rgb = [float(c) / 255. for c in rgb255]
-          except KeyError:
-            rgb = (150., 150., 0.)
-
-          segmentId = segment["labelID"]
-
-          categoryCode, categoryCodingScheme, categoryCodeMeaning = \
-            self.getValuesFromCodeSequence(segment, "SegmentedPropertyCategoryCodeSequence")
-
-          typeCode, typeCodingScheme, typeCodeMeaning = \
-            self.getValuesFromCodeSequence(segment, "SegmentedPropertyTypeCodeSequence")
-
-          typeModCode, typeModCodingScheme, typeModCodeMeaning = \
-            self.getValuesFromCodeSequence(segment, "SegmentedPropertyTypeModifierCodeSequence")
-
-          regionCode, regionCodingScheme, regionCodeMeaning = \
-            self.getValuesFromCodeSequence(segment, "AnatomicRegionSequence")
-
-          regionModCode, regionModCodingScheme, regionModCodeMeaning = \
-            self.getValuesFromCodeSequence(segment, "AnatomicRegionModifierSequence")
-
-          segmentTerminologyTag = terminologiesLogic.SerializeTerminologyEntry(
-                                    categoryContextName,
-                                    categoryCode, categoryCodingScheme, categoryCodeMeaning,
-                                    typeCode, typeCodingScheme, typeCodeMeaning,
-                                    typeModCode, typeModCodingScheme, typeModCodeMeaning,
-                                    anatomicContextName,
-                                    regionCode, regionCodingScheme, regionCodeMeaning,
-                                    regionModCode, regionModCodingScheme, regionModCodeMeaning)
-
-
-          # Set terminology properties as attributes to the label node (which is a temporary node)
-          segmentNameAutoGenerated = False  # automatically generated from terminology
-          if segment["SegmentLabel"]:
-            segmentName = segment["SegmentLabel"]
-          elif segment["SegmentDescription"]:
-            segmentName = segment["SegmentDescription"]
-          else:
-            segmentName = typeCodeMeaning
-            segmentNameAutoGenerated = True
-
-          labelAttributes = {}
-          labelAttributes["Name"] = segmentName
-          labelAttributes["NameAutoGenerated"] = segmentNameAutoGenerated
-          labelAttributes["Description"] = segment["SegmentDescription"]
-          labelAttributes["Terminology"] = segmentTerminologyTag
-          labelAttributes["ColorR"] = rgb[0]
-          labelAttributes["ColorG"] = rgb[1]
-          labelAttributes["ColorB"] = rgb[2]
-          labelAttributes["DICOM.SegmentAlgorithmType"] = segment["SegmentAlgorithmType"] if "SegmentAlgorithmType" in segment else None
-          labelAttributes["DICOM.SegmentAlgorithmName"] = segment["SegmentAlgorithmName"] if "SegmentAlgorithmName" in segment else None
-
-          labelNode.labelAttributes.append(labelAttributes)
+          labelNode.labelAttributes.append(self._getLabelAttributes(segment, terminologiesLogic,
+                                                                    categoryContextName, anatomicContextName))
 
         segmentLabelNodes.append(labelNode)
 
@@ -233,12 +236,87 @@ class DICOMSegmentationPluginClass(DICOMPluginBase):
 
     return True
 
+  @staticmethod
+  def _loadTerminologyContexts(loadable, metaFileName, terminologiesLogic):
+    """ Loads the terminology of a dcmqi segment descriptor file into contexts named after the loadable and returns
+    the category and anatomic context names, which are the DICOM master lists if loading failed
+    """
+    categoryContextName = loadable.name
+    if not terminologiesLogic.LoadTerminologyFromSegmentDescriptorFile(categoryContextName, metaFileName):
+      categoryContextName = "Segmentation category and type - DICOM master list"
+
+    anatomicContextName = loadable.name
+    try:
+      if not terminologiesLogic.LoadRegionContextFromSegmentDescriptorFile(anatomicContextName, metaFileName):
+        anatomicContextName = "Anatomic codes - DICOM master list"
+    except AttributeError:
+      # backward compatibility with Slicer 5.8.1
+      if not terminologiesLogic.LoadAnatomicContextFromSegmentDescriptorFile(anatomicContextName, metaFileName):
+        anatomicContextName = "Anatomic codes - DICOM master list"
+    return categoryContextName, anatomicContextName
+
+  def _getLabelAttributes(self, segment, terminologiesLogic, categoryContextName, anatomicContextName):
+    try:
+      rgb255 = segment["recommendedDisplayRGBValue"]
+      rgb = [float(c) / 255. for c in rgb255]
+    except KeyError:
+      rgb = (150., 150., 0.)
+
+    categoryCode, categoryCodingScheme, categoryCodeMeaning = \
+      self.getValuesFromCodeSequence(segment, "SegmentedPropertyCategoryCodeSequence")
+
+    typeCode, typeCodingScheme, typeCodeMeaning = \
+      self.getValuesFromCodeSequence(segment, "SegmentedPropertyTypeCodeSequence")
+
+    typeModCode, typeModCodingScheme, typeModCodeMeaning = \
+      self.getValuesFromCodeSequence(segment, "SegmentedPropertyTypeModifierCodeSequence")
+
+    regionCode, regionCodingScheme, regionCodeMeaning = \
+      self.getValuesFromCodeSequence(segment, "AnatomicRegionSequence")
+
+    regionModCode, regionModCodingScheme, regionModCodeMeaning = \
+      self.getValuesFromCodeSequence(segment, "AnatomicRegionModifierSequence")
+
+    segmentTerminologyTag = terminologiesLogic.SerializeTerminologyEntry(
+                              categoryContextName,
+                              categoryCode, categoryCodingScheme, categoryCodeMeaning,
+                              typeCode, typeCodingScheme, typeCodeMeaning,
+                              typeModCode, typeModCodingScheme, typeModCodeMeaning,
+                              anatomicContextName,
+                              regionCode, regionCodingScheme, regionCodeMeaning,
+                              regionModCode, regionModCodingScheme, regionModCodeMeaning)
+
+    # Set terminology properties as attributes to the label node (which is a temporary node)
+    segmentNameAutoGenerated = False  # automatically generated from terminology
+    if segment["SegmentLabel"]:
+      segmentName = segment["SegmentLabel"]
+    elif segment["SegmentDescription"]:
+      segmentName = segment["SegmentDescription"]
+    else:
+      segmentName = typeCodeMeaning
+      segmentNameAutoGenerated = True
+
+    labelAttributes = {}
+    labelAttributes["Name"] = segmentName
+    labelAttributes["NameAutoGenerated"] = segmentNameAutoGenerated
+    labelAttributes["Description"] = segment["SegmentDescription"]
+    labelAttributes["Terminology"] = segmentTerminologyTag
+    labelAttributes["ColorR"] = rgb[0]
+    labelAttributes["ColorG"] = rgb[1]
+    labelAttributes["ColorB"] = rgb[2]
+    labelAttributes["DICOM.SegmentAlgorithmType"] = segment["SegmentAlgorithmType"] if "SegmentAlgorithmType" in segment else None
+    labelAttributes["DICOM.SegmentAlgorithmName"] = segment["SegmentAlgorithmName"] if "SegmentAlgorithmName" in segment else None
+    return labelAttributes
+
   def _createSegmentationNode(self, loadable, segmentLabelNodes):
     segmentationNode = self._initializeSegmentation(loadable)
 
     for segmentLabelNode in segmentLabelNodes:
       self._importSegmentAndRemoveLabel(segmentLabelNode, segmentationNode)
 
+    self._finalizeSegmentationNode(loadable, segmentationNode)
+
+  def _finalizeSegmentationNode(self, loadable, segmentationNode):
     self.addSeriesInSubjectHierarchy(loadable, segmentationNode)
     if hasattr(loadable, "referencedSeriesUID"):
       self._findAndSetGeometryReference(loadable.referencedSeriesUID, segmentationNode)
@@ -263,26 +341,35 @@ class DICOMSegmentationPluginClass(DICOMPluginBase):
       logging.info(f"Setting attributes for segment {segmentId} ...")
 
       segment = segmentation.GetNthSegment(segmentId)
-      segment.SetName(segmentLabelNode.labelAttributes[thisLabelSegmentID]["Name"])
-      segment.SetNameAutoGenerated(segmentLabelNode.labelAttributes[thisLabelSegmentID]["NameAutoGenerated"])
-      segment.SetTag("Description", segmentLabelNode.labelAttributes[thisLabelSegmentID]["Description"])
-      segment.SetColor([float(segmentLabelNode.labelAttributes[thisLabelSegmentID]["ColorR"]),
-                        float(segmentLabelNode.labelAttributes[thisLabelSegmentID]["ColorG"]),
-                        float(segmentLabelNode.labelAttributes[thisLabelSegmentID]["ColorB"])])
-      segment.SetTag(vtkSegmentationCore.vtkSegment.GetTerminologyEntryTagName(),
-                     segmentLabelNode.labelAttributes[thisLabelSegmentID]["Terminology"])
-      algorithmName = segmentLabelNode.labelAttributes[thisLabelSegmentID]["DICOM.SegmentAlgorithmName"]
-      if algorithmName is not None:
-        segment.SetTag("DICOM.SegmentAlgorithmName", algorithmName)
-      algorithmType = segmentLabelNode.labelAttributes[thisLabelSegmentID]["DICOM.SegmentAlgorithmType"]
-      if algorithmType is not None:
-        segment.SetTag("DICOM.SegmentAlgorithmType", algorithmType)
+      self._setSegmentAttributes(segment, segmentLabelNode.labelAttributes[thisLabelSegmentID])
       thisLabelSegmentID += 1
 
     self._removeLabelNode(segmentLabelNode)
 
     return segmentation
 
+  def _setSegmentAttributes(self, segment, labelAttributes):
+    segment.SetName(labelAttributes["Name"])
+    segment.SetNameAutoGenerated(labelAttributes["NameAutoGenerated"])
+    segment.SetTag("Description", labelAttributes["Description"])
+    segment.SetColor([float(labelAttributes["ColorR"]),
+                      float(labelAttributes["ColorG"]),
+                      float(labelAttributes["ColorB"])])
+    segment.SetTag(vtkSegmentationCore.vtkSegment.GetTerminologyEntryTagName(), labelAttributes["Terminology"])
+    algorithmName = labelAttributes["DICOM.SegmentAlgorithmName"]
+    if algorithmName is not None:
+      segment.SetTag("DICOM.SegmentAlgorithmName", algorithmName)
+    algorithmType = labelAttributes["DICOM.SegmentAlgorithmType"]
+    if algorithmType is not None:
+      segment.SetTag("DICOM.SegmentAlgorithmType", algorithmType)
+
+  @staticmethod
+  def _removeSegmentationNode(segmentationNode):
+    displayNode = segmentationNode.GetDisplayNode()
+    if displayNode is not None:
+      slicer.mrmlScene.RemoveNode(displayNode)
+    slicer.mrmlScene.RemoveNode(segmentationNode)
+
   def _removeLabelNode(self, labelNode):
     dNode = labelNode.GetDisplayNode()
     if dNode is not None:
@@ -410,6 +497,420 @@ class DICOMSegmentationPluginClass(DICOMPluginBase):
     return ""
 
 
+class DICOMSegmentationReader(object):
+  """This class decodes a DICOM Segmentation object into per segment binary labelmaps without writing any
+  intermediate files. Segment attributes are returned in the same format as the meta.json written by
+  segimage2itkimage.
+  """
+
+  class UnsupportedSegmentationError(ValueError):
+    pass
+
+  # used for deriving the slice spacing from plane positions, in mm
+  positionTolerance = 1e-3
+
+  @staticmethod
+  def getRGBFromDICOMLab(dicomLab):
+    """ Converts a RecommendedDisplayCIELabValue to 8 bit sRGB (D65 white point, as dcmqi does)
+    """
+    L = dicomLab[0] * 100. / 65535.
+    a = dicomLab[1] * 255. / 65535. - 128.
+    b = dicomLab[2] * 255. / 65535. - 128.
+
+    def labToXYZ(t):
+      return t ** 3 if t ** 3 > 0.008856 else (t - 16. / 116.) / 7.787
+
+    fy = (L + 16.) / 116.
+    x = 0.950456 * labToXYZ(fy + a / 500.)
+    y = 1.0 * labToXYZ(fy)
+    z = 1.088754 * labToXYZ(fy - b / 200.)
+
+    def gammaCorrect(c):
+      c = 1.055 * c ** (1. / 2.4) - 0.055 if c > 0.0031308 else 12.92 * c
+      return int(round(min(max(c, 0.), 1.) * 255.))
+
+    return [gammaCorrect(3.2406 * x - 1.5372 * y - 0.4986 * z),
+            gammaCorrect(-0.9689 * x + 1.8758 * y + 0.0415 * z),
+            gammaCorrect(0.0557 * x - 0.2040 * y + 1.0570 * z)]
+
+  @staticmethod
+  def getCodeSequenceAsDict(codeSequence):
+    item = codeSequence[0]
+    codeValue = getattr(item, "CodeValue", None) or getattr(item, "LongCodeValue", None) or \
+                getattr(item, "URNCodeValue", "")
+    return {
+      "CodeValue": str(codeValue),
+      "CodingSchemeDesignator": str(getattr(item, "CodingSchemeDesignator", "")),
+      "CodeMeaning": str(getattr(item, "CodeMeaning", ""))
+    }
+
+  def __init__(self, segFileName):
+    import pydicom
+    self.dataset = pydicom.dcmread(segFileName)
+    if getattr(self.dataset, "DimensionOrganizationType", "") == "TILED_FULL":
+      raise self.UnsupportedSegmentationError("TILED_FULL dimension organization is not supported")
+
+  def getSegmentAttributes(self):
+    segmentsAttributes = []
+    for item in self.dataset.SegmentSequence:
+      attributes = {
+        "labelID": int(item.SegmentNumber),
+        "SegmentLabel": str(getattr(item, "SegmentLabel", "")),
+        "SegmentDescription": str(getattr(item, "SegmentDescription", "")),
+        "SegmentAlgorithmType": str(item.SegmentAlgorithmType)
+      }
+      if "SegmentAlgorithmName" in item:
+        attributes["SegmentAlgorithmName"] = str(item.SegmentAlgorithmName)
+      if "RecommendedDisplayCIELabValue" in item:
+        attributes["recommendedDisplayRGBValue"] = self.getRGBFromDICOMLab(item.RecommendedDisplayCIELabValue)
+      for sequenceName, modifierName in [("SegmentedPropertyCategoryCodeSequence", None),
+                                         ("SegmentedPropertyTypeCodeSequence",
+                                          "SegmentedPropertyTypeModifierCodeSequence"),
+                                         ("AnatomicRegionSequence", "AnatomicRegionModifierSequence")]:
+        if sequenceName not in item or not len(item[sequenceName].value):
+          continue
+        codeSequence = item[sequenceName].value
+        attributes[sequenceName] = self.getCodeSequenceAsDict(codeSequence)
+        if modifierName and modifierName in codeSequence[0] and len(codeSequence[0][modifierName].value):
+          attributes[modifierName] = self.getCodeSequenceAsDict(codeSequence[0][modifierName].value)
+      segmentsAttributes.append(attributes)
+    return segmentsAttributes
+
+  def getFrames(self, frameIndices=None):
+    """ Returns the given frames (all by default) as a binary numpy array of shape (frames, rows, columns). Bit
+    packed frames are unpacked and compressed frames are decoded one at a time, so only the requested frames are
+    expanded to one byte per pixel. With pydicom < 3 compressed pixel data can only be decoded as a whole.
+    """
+    import numpy
+    ds = self.dataset
+    numberOfFrames = int(getattr(ds, "NumberOfFrames", 1))
+    if frameIndices is None:
+      frameIndices = range(numberOfFrames)
+    pixelsPerFrame = ds.Rows * ds.Columns
+    threshold = int(getattr(ds, "MaximumFractionalValue", 255)) / 2. if ds.SegmentationType == "FRACTIONAL" else 0
+    frames = numpy.empty((len(frameIndices), ds.Rows, ds.Columns), dtype=numpy.uint8)
+    isCompressed = ds.file_meta.TransferSyntaxUID.is_compressed
+    if isCompressed:
+      decodeFrame = self._getFrameDecoder()
+    else:
+      pixelData = numpy.frombuffer(ds.PixelData, dtype=numpy.uint8)
+    isPacked = ds.BitsAllocated == 1 and not isCompressed
+    for index, frameIndex in enumerate(frameIndices):
+      start = frameIndex * pixelsPerFrame
+      if isCompressed:
+        frame = decodeFrame(frameIndex)
+      elif isPacked:
+        # frames are packed contiguously, i.e. a frame does not necessarily start at a byte boundary
+        packedFrame = pixelData[start // 8:(start + pixelsPerFrame + 7) // 8]
+        frame = numpy.unpackbits(packedFrame, bitorder="little")[start % 8:start % 8 + pixelsPerFrame]
+      else:
+        frame = pixelData[start:start + pixelsPerFrame]
+      frames[index] = (frame > threshold).reshape(ds.Rows, ds.Columns)
+    return frames
+
+  def _getFrameDecoder(self):
+    """ Returns a function decoding a single compressed frame into a flat numpy array. pydicom < 3 has no per frame
+    decoding, in that case all frames are decoded once and kept by the dataset.
+    """
+    ds = self.dataset
+    try:
+      from pydicom.pixels import get_decoder
+    except ImportError:
+      pixelArray = ds.pixel_array.reshape(-1, ds.Rows * ds.Columns)
+      return lambda frameIndex: pixelArray[frameIndex]
+    decoder = get_decoder(ds.file_meta.TransferSyntaxUID)
+    return lambda frameIndex: decoder.as_array(ds, index=frameIndex)[0].reshape(-1)
+
+  def _getFunctionalGroupValue(self, frameIndex, sequenceName, attributeName):
+    for groups in [self.dataset.PerFrameFunctionalGroupsSequence[frameIndex],
+                   self.dataset.SharedFunctionalGroupsSequence[0]]:
+      if sequenceName in groups:
+        return groups[sequenceName].value[0][attributeName].value
+    raise self.UnsupportedSegmentationError("Missing {} in functional groups".format(sequenceName))
+
+  def getFrameGeometry(self):
+    """ Returns the IJK to RAS matrix of the segmentation volume and the slice index and referenced segment number
+    for each frame
+    """
+    import numpy
+    numberOfFrames = len(self.dataset.PerFrameFunctionalGroupsSequence)
+    orientation = numpy.array(self._getFunctionalGroupValue(0, "PlaneOrientationSequence",
+                                                            "ImageOrientationPatient"), dtype=float)
+    pixelSpacing = [float(v) for v in self._getFunctionalGroupValue(0, "PixelMeasuresSequence", "PixelSpacing")]
+    rowDirection, columnDirection = orientation[:3], orientation[3:]
+    normal = numpy.cross(rowDirection, columnDirection)
+
+    positions = numpy.array([self._getFunctionalGroupValue(frameIndex, "PlanePositionSequence",
+                                                           "ImagePositionPatient")
+                             for frameIndex in range(numberOfFrames)], dtype=float)
+    segmentNumbers = [int(self._getFunctionalGroupValue(frameIndex, "SegmentIdentificationSequence",
+                                                        "ReferencedSegmentNumber"))
+                      for frameIndex in range(numberOfFrames)]
+    offsets = positions.dot(normal)
+
+    sliceSpacing = None
+    try:
+      sliceSpacing = float(self._getFunctionalGroupValue(0, "PixelMeasuresSequence", "SpacingBetweenSlices"))
+    except (KeyError, self.UnsupportedSegmentationError):
+      pass
+    if not sliceSpacing:
+      distances = numpy.diff(numpy.unique(offsets))
+      distances = distances[distances > self.positionTolerance]
+      if len(distances):
+        sliceSpacing = float(distances.min())
+      else:
+        try:
+          sliceSpacing = float(self._getFunctionalGroupValue(0, "PixelMeasuresSequence", "SliceThickness"))
+        except (KeyError, self.UnsupportedSegmentationError):
+          sliceSpacing = 1.0
+
+    origin = positions[numpy.argmin(offsets)]
+    sliceIndices = numpy.rint((offsets - offsets.min()) / sliceSpacing).astype(int)
+
+    lpsToRAS = numpy.diag([-1., -1., 1.])
+    ijkToRAS = numpy.eye(4)
+    ijkToRAS[:3, 0] = lpsToRAS.dot(rowDirection) * pixelSpacing[1]
+    ijkToRAS[:3, 1] = lpsToRAS.dot(columnDirection) * pixelSpacing[0]
+    ijkToRAS[:3, 2] = lpsToRAS.dot(normal) * sliceSpacing
+    ijkToRAS[:3, 3] = lpsToRAS.dot(origin)
+    return ijkToRAS, sliceIndices, segmentNumbers
+
+  def getSegmentLabelmaps(self):
+    """ Returns a dictionary mapping segment number to a vtkOrientedImageData binary labelmap. Each labelmap
+    is cropped to the frames and pixels encoded for its segment, empty segments get an empty extent.
+    """
+    import numpy
+    from vtk.util import numpy_support
+    ijkToRAS, sliceIndices, segmentNumbers = self.getFrameGeometry()
+    ijkToRASMatrix = vtk.vtkMatrix4x4()
+    for row in range(4):
+      for column in range(4):
+        ijkToRASMatrix.SetElement(row, column, ijkToRAS[row][column])
+
+    frameIndicesBySegment = {}
+    for frameIndex, segmentNumber in enumerate(segmentNumbers):
+      frameIndicesBySegment.setdefault(segmentNumber, []).append(frameIndex)
+
+    labelmaps = {}
+    for item in self.dataset.SegmentSequence:
+      segmentNumber = int(item.SegmentNumber)
+      imageData = vtkSegmentationCore.vtkOrientedImageData()
+      imageData.SetImageToWorldMatrix(ijkToRASMatrix)
+      labelmaps[segmentNumber] = imageData
+
+      # frames are unpacked per segment to bound memory to the frames of a single segment
+      segmentFrameIndices = frameIndicesBySegment.get(segmentNumber, [])
+      frames = self.getFrames(segmentFrameIndices)
+      frameSliceIndices = sliceIndices[segmentFrameIndices]
+      frameIndices, extent = self._getSegmentFramesAndExtent(frames, frameSliceIndices)
+      if extent is None:
+        imageData.SetExtent(0, -1, 0, -1, 0, -1)
+        continue
+      c0, c1, r0, r1, k0, k1 = extent
+      imageData.SetExtent(extent)
+      imageData.AllocateScalars(vtk.VTK_UNSIGNED_CHAR, 1)
+      array = numpy_support.vtk_to_numpy(imageData.GetPointData().GetScalars())
+      array = array.reshape(k1 - k0 + 1, r1 - r0 + 1, c1 - c0 + 1)
+      array[:] = 0
+      for frameIndex in frameIndices:
+        array[frameSliceIndices[frameIndex] - k0] |= frames[frameIndex, r0:r1 + 1, c0:c1 + 1]
+      imageData.Modified()
+    return labelmaps
+
+  @staticmethod
+  def _getSegmentFramesAndExtent(frames, sliceIndices):
+    """ Returns the indices of the non-empty frames of a segment and the IJK extent covering them, or None if all
+    are empty. sliceIndices holds the slice index of each frame.
+    """
+    import numpy
+    nonEmptyFrameIndices = []
+    rowMask = numpy.zeros(frames.shape[1], dtype=bool)
+    columnMask = numpy.zeros(frames.shape[2], dtype=bool)
+    for frameIndex in range(len(frames)):
+      frameRows = frames[frameIndex].any(axis=1)
+      if not frameRows.any():
+        continue
+      rowMask |= frameRows
+      columnMask |= frames[frameIndex].any(axis=0)
+      nonEmptyFrameIndices.append(frameIndex)
+    if not nonEmptyFrameIndices:
+      return [], None
+    rows = numpy.flatnonzero(rowMask)
+    columns = numpy.flatnonzero(columnMask)
+    slices = sliceIndices[nonEmptyFrameIndices]
+    return nonEmptyFrameIndices, [int(columns[0]), int(columns[-1]), int(rows[0]), int(rows[-1]),
+                                  int(slices.min()), int(slices.max())]
+
+
+class SegmentExtentAnalyzer(object):
+  """ Finds the voxels, voxel counts and bounding boxes of all segments of a labelmap layer in a single pass over the
+  layer, instead of scanning the layer once per segment
+  """
+
+  @staticmethod
+  def groupVoxels(array, labelValues):
+    """ Returns the flat indices of the voxels belonging to the segments of labelValues ({segmentID: labelValue}),
+    the index of the segment (in the order of labelValues) of each of these voxels and the voxel count of each
+    segment. Voxel indices are ascending.
+    """
+    import numpy
+    numberOfSegments = len(labelValues)
+    flatLabels = array.reshape(-1)
+    voxelIndices = numpy.flatnonzero(flatLabels)
+
+    # map label values to group indices 1..n, 0 for voxels of segments which are not requested
+    labels = numpy.maximum(flatLabels[voxelIndices], 0).astype(numpy.int64)
+    lookupTable = numpy.zeros(max(int(labels.max()) if labels.size else 0,
+                                  max(labelValues.values()) if labelValues else 0) + 1, dtype=numpy.int32)
+    lookupTable[list(labelValues.values())] = numpy.arange(1, numberOfSegments + 1)
+    groups = lookupTable[labels]
+    requested = groups > 0
+    voxelIndices, groups = voxelIndices[requested], groups[requested] - 1
+    return voxelIndices, groups, numpy.bincount(groups, minlength=numberOfSegments)
+
+  @staticmethod
+  def getVoxelCountsAndExtents(array, labelValues):
+    """ Returns {segmentID: (voxelCount, extent)} for labelValues given as {segmentID: labelValue}, extent being
+    [iMin, iMax, jMin, jMax, kMin, kMax] of the KJI ordered array or None for empty segments
+    """
+    import numpy
+    voxelIndices, groups, counts = SegmentExtentAnalyzer.groupVoxels(array, labelValues)
+    nonEmpty = numpy.flatnonzero(counts)
+    # stable sort by segment, voxel indices and thereby slices stay ascending within each segment
+    order = numpy.argsort(groups, kind="stable")
+    starts = (numpy.cumsum(counts) - counts)[nonEmpty]
+    ends = starts + counts[nonEmpty] - 1
+    k, j, i = numpy.unravel_index(voxelIndices[order], array.shape)
+    bounds = [numpy.minimum.reduceat(i, starts), numpy.maximum.reduceat(i, starts),
+              numpy.minimum.reduceat(j, starts), numpy.maximum.reduceat(j, starts),
+              k[starts], k[ends]] if len(nonEmpty) else []
+
+    results = {segmentID: (0, None) for segmentID in labelValues.keys()}
+    segmentIDs = list(labelValues.keys())
+    for index, segmentIndex in enumerate(nonEmpty):
+      results[segmentIDs[segmentIndex]] = (int(counts[segmentIndex]), [int(bound[index]) for bound in bounds])
+    return results
+
+  @staticmethod
+  def getSegmentIDsByLayer(segmentation, segmentIDs):
+    """ Returns the segment IDs grouped by their shared labelmap layer """
+    segmentIDsByLayer = {}
+    for segmentID in segmentIDs:
+      segmentIDsByLayer.setdefault(segmentation.GetLayerIndex(segmentID), []).append(segmentID)
+    return list(segmentIDsByLayer.values())
+
+  @staticmethod
+  def getSegmentVoxelCountsAndExtents(segmentationNode, segmentIDs):
+    """ Returns {segmentID: (voxelCount, extent)} with the extent in the IJK coordinates of the segment's binary
+    labelmap or None for empty segments. Each shared labelmap layer is read once, regardless of its segment count.
+    """
+    segmentation = segmentationNode.GetSegmentation()
+    binaryLabelmapName = vtkSegmentationCore.vtkSegmentationConverter.GetSegmentationBinaryLabelmapRepresentationName()
+    results = {}
+    for layerSegmentIDs in SegmentExtentAnalyzer.getSegmentIDsByLayer(segmentation, segmentIDs):
+      labelmap = segmentation.GetSegment(layerSegmentIDs[0]).GetRepresentation(binaryLabelmapName)
+      if labelmap is None or labelmap.GetPointData().GetScalars() is None:
+        results.update({segmentID: (0, None) for segmentID in layerSegmentIDs})
+        continue
+      imageExtent = labelmap.GetExtent()
+      array = DICOMSegmentationExporter._getArrayInExtent(labelmap, imageExtent)
+      labelValues = {segmentID: segmentation.GetSegment(segmentID).GetLabelValue() for segmentID in layerSegmentIDs}
+      for segmentID, (voxelCount, extent) in SegmentExtentAnalyzer.getVoxelCountsAndExtents(array,
+                                                                                            labelValues).items():
+        if extent is not None:
+          extent = [bound + imageExtent[2 * (index // 2)] for index, bound in enumerate(extent)]
+        results[segmentID] = (voxelCount, extent)
+    return results
+
+  @staticmethod
+  def getEffectiveExtents(segmentationNode, segmentIDs, referenceGeometry):
+    """ Returns {segmentID: extent} with the tight extents of the segments in the IJK coordinates of
+    referenceGeometry (a vtkOrientedImageData), clipped to its extent, or None for empty segments
+    """
+    segmentation = segmentationNode.GetSegmentation()
+    binaryLabelmapName = vtkSegmentationCore.vtkSegmentationConverter.GetSegmentationBinaryLabelmapRepresentationName()
+    referenceExtent = referenceGeometry.GetExtent()
+    worldToReference = vtk.vtkMatrix4x4()
+    referenceGeometry.GetWorldToImageMatrix(worldToReference)
+
+    extents = {}
+    for segmentID, (_, extent) in SegmentExtentAnalyzer.getSegmentVoxelCountsAndExtents(segmentationNode,
+                                                                                         segmentIDs).items():
+      if extent is not None:
+        labelmapToWorld = vtk.vtkMatrix4x4()
+        segmentation.GetSegment(segmentID).GetRepresentation(binaryLabelmapName).GetImageToWorldMatrix(
+          labelmapToWorld)
+        labelmapToReference = vtk.vtkMatrix4x4()
+        vtk.vtkMatrix4x4.Multiply4x4(worldToReference, labelmapToWorld, labelmapToReference)
+        extent = SegmentExtentAnalyzer.transformExtent(extent, labelmapToReference)
+        extent = [max(bound, referenceExtent[index]) if index % 2 == 0 else min(bound, referenceExtent[index])
+                  for index, bound in enumerate(extent)]
+        if any(extent[2 * axis] > extent[2 * axis + 1] for axis in range(3)):
+          extent = None
+      extents[segmentID] = extent
+    return extents
+
+  @staticmethod
+  def transformExtent(extent, matrix):
+    """ Returns the extent covering all voxels of extent after transforming them with the IJK to IJK matrix
+    (a vtkMatrix4x4), which is the extent itself if the matrix is the identity
+    """
+    import itertools
+    import math
+    isIdentity = all(abs(matrix.GetElement(row, column) - (row == column)) < 1e-6
+                     for row in range(4) for column in range(4))
+    if isIdentity:
+      return list(extent)
+    corners = [matrix.MultiplyPoint(list(corner) + [1.0])[:3] for corner in
+               itertools.product(*[(extent[2 * axis] - 0.5, extent[2 * axis + 1] + 0.5) for axis in range(3)])]
+    # voxels overlapping the transformed bounds, voxel i covering [i - 0.5, i + 0.5]
+    return [int(math.floor(min(corner[index // 2] for corner in corners) + 0.5)) if index % 2 == 0 else
+            int(math.ceil(max(corner[index // 2] for corner in corners) - 0.5)) for index in range(6)]
+
+  @staticmethod
+  def getUnionExtent(extents):
+    """ Returns the extent covering all given extents, ignoring None, or None if there are none """
+    extents = [extent for extent in extents if extent is not None]
+    if not extents:
+      return None
+    return [min(extent[index] for extent in extents) if index % 2 == 0 else max(extent[index] for extent in extents)
+            for index in range(6)]
+
+  @staticmethod
+  def getCroppedGeometry(geometry, extent):
+    """ Returns a vtkOrientedImageData without scalars sharing the lattice of geometry, restricted to extent """
+    croppedGeometry = vtkSegmentationCore.vtkOrientedImageData()
+    croppedGeometry.SetExtent(extent)
+    imageToWorld = vtk.vtkMatrix4x4()
+    geometry.GetImageToWorldMatrix(imageToWorld)
+    croppedGeometry.SetImageToWorldMatrix(imageToWorld)
+    return croppedGeometry
+
+  @staticmethod
+  def getSegmentationGeometry(segmentationNode):
+    """ Returns the reference image geometry of the segmentation as vtkOrientedImageData without scalars or None
+    if it has none
+    """
+    converter = vtkSegmentationCore.vtkSegmentationConverter
+    geometryString = segmentationNode.GetSegmentation().GetConversionParameter(
+      converter.GetReferenceImageGeometryParameterName())
+    if not geometryString:
+      return None
+    geometry = vtkSegmentationCore.vtkOrientedImageData()
+    converter.DeserializeImageGeometry(geometryString, geometry, False)
+    return geometry
+
+  @staticmethod
+  def cropArray(array, extent, origin=(0, 0, 0)):
+    """ Returns a view of the KJI ordered array, whose first voxel has the IJK coordinates origin, covering extent.
+    The view is empty for extent None.
+    """
+    if extent is None:
+      return array[:0, :0, :0]
+    return array[tuple(slice(extent[2 * axis] - origin[axis], extent[2 * axis + 1] - origin[axis] + 1)
+                       for axis in (2, 1, 0))]
+
+
 class DICOMSegmentationExporter(ModuleLogicMixin):
   """This class can be used for exporting a segmentation into DICOM """
 
@@ -422,6 +923,11 @@ class DICOMSegmentationExporter(ModuleLogicMixin):
   class MissingAttributeError(ValueError):
     pass
 
+  # code sequences by serialized terminology entry, see getTerminologyCodeSequences. The least recently used entries
+  # beyond terminologyCacheSize are evicted
+  terminologyCache = OrderedDict()
+  terminologyCacheSize = 1000
+
   @staticmethod
   def getDeserializedTerminologyEntry(vtkSegment):
     terminologyEntry = slicer.vtkSlicerTerminologyEntry()
@@ -431,6 +937,50 @@ class DICOMSegmentationExporter(ModuleLogicMixin):
     terminologyLogic.DeserializeTerminologyEntry(tag, terminologyEntry)
     return terminologyEntry
 
+  @staticmethod
+  def getTerminologyTag(vtkSegment):
+    tag = vtk.mutable("")
+    vtkSegment.GetTag(vtkSegment.GetTerminologyEntryTagName(), tag)
+    return str(tag)
+
+  @staticmethod
+  def getTerminologyCodeSequences(vtkSegment):
+    """ Returns the code sequences of the segment's terminology keyed by SegmentedPropertyCategoryCodeSequence,
+    SegmentedPropertyTypeCodeSequence, SegmentedPropertyTypeModifierCodeSequence, AnatomicRegionSequence and
+    AnatomicRegionModifierSequence, None for unset or invalid codes.
+
+    Each distinct terminology is only deserialized once. The caller gets its own copy of the cached code sequences.
+    """
+    tag = DICOMSegmentationExporter.getTerminologyTag(vtkSegment)
+    cache = DICOMSegmentationExporter.terminologyCache
+    try:
+      cache.move_to_end(tag)
+      return copy.deepcopy(cache[tag])
+    except KeyError:
+      pass
+    terminologyEntry = slicer.vtkSlicerTerminologyEntry()
+    slicer.modules.terminologies.logic().DeserializeTerminologyEntry(tag, terminologyEntry)
+    try:
+      regionObject = terminologyEntry.GetRegionObject()
+      regionModifierObject = terminologyEntry.GetRegionModifierObject()
+    except AttributeError:
+      # backward compatibility with Slicer 5.8.1
+      regionObject = terminologyEntry.GetAnatomicRegionObject()
+      regionModifierObject = terminologyEntry.GetAnatomicRegionModifierObject()
+    termTypeObjects = {
+      "SegmentedPropertyCategoryCodeSequence": terminologyEntry.GetCategoryObject(),
+      "SegmentedPropertyTypeCodeSequence": terminologyEntry.GetTypeObject(),
+      "SegmentedPropertyTypeModifierCodeSequence": terminologyEntry.GetTypeModifierObject(),
+      "AnatomicRegionSequence": regionObject,
+      "AnatomicRegionModifierSequence": regionModifierObject
+    }
+    codeSequences = {name: DICOMSegmentationExporter.getJSONFromVtkSlicerTerminology(termTypeObject)
+                     for name, termTypeObject in termTypeObjects.items()}
+    cache[tag] = codeSequences
+    while len(cache) > DICOMSegmentationExporter.terminologyCacheSize:
+      cache.popitem(last=False)
+    return copy.deepcopy(codeSequences)
+
   @staticmethod
   def saveJSON(data, destination):
     with open(os.path.join(destination), 'w') as outfile:
@@ -450,15 +1000,32 @@ class DICOMSegmentationExporter(ModuleLogicMixin):
     slicer.mrmlScene.AddNode(labelNode)
     segmentationsLogic = slicer.modules.segmentations.logic()
 
-    mergedImageData = vtkSegmentationCore.vtkOrientedImageData()
-    segmentationNode.GenerateMergedLabelmapForAllSegments(mergedImageData, 0, None,
-                                                          DICOMSegmentationExporter.vtkStringArrayFromList([segmentID]))
+    mergedImageData = DICOMSegmentationExporter.getCroppedSegmentLabelmap(segmentationNode, segmentID)
     if not segmentationsLogic.CreateLabelmapVolumeFromOrientedImageData(mergedImageData, labelNode):
       slicer.mrmlScene.RemoveNode(labelNode)
       return None
     labelNode.SetName("{}_label".format(segmentID))
     return labelNode
 
+  @staticmethod
+  def getCroppedSegmentLabelmap(segmentationNode, segmentID, geometry=None, extents=None):
+    """ Returns the segment as labelmap with label value 1 in the lattice of geometry (the reference geometry of the
+    segmentation by default), cropped to the segment's effective extent. extents are the ones returned by
+    SegmentExtentAnalyzer.getEffectiveExtents for geometry, they get computed if not given. Empty segments cover
+    the full geometry.
+    """
+    geometry = geometry if geometry is not None else SegmentExtentAnalyzer.getSegmentationGeometry(segmentationNode)
+    mergedGeometry = None
+    if geometry is not None:
+      if extents is None:
+        extents = SegmentExtentAnalyzer.getEffectiveExtents(segmentationNode, [segmentID], geometry)
+      if extents[segmentID] is not None:
+        mergedGeometry = SegmentExtentAnalyzer.getCroppedGeometry(geometry, extents[segmentID])
+    mergedImageData = vtkSegmentationCore.vtkOrientedImageData()
+    segmentationNode.GenerateMergedLabelmapForAllSegments(mergedImageData, 0, mergedGeometry,
+                                                          DICOMSegmentationExporter.vtkStringArrayFromList([segmentID]))
+    return mergedImageData
+
   @staticmethod
   def getSegmentIDs(segmentationNode, visibleOnly=False):
     if not segmentationNode:
@@ -483,6 +1050,16 @@ class DICOMSegmentationExporter(ModuleLogicMixin):
     from datetime import datetime
     return datetime.now().strftime(outputFormat)
 
+  # encode SEG objects in memory with highdicom, itkimage2segimage is only used if this fails
+  useNativeEncoder = True
+
+  # number of threads writing labelmaps for itkimage2segimage, None for up to 8 depending on the CPU count
+  labelmapExportWorkers = None
+
+  # series level metadata that is copied to SEG objects encoded in memory
+  seriesAttributeKeywords = ["SeriesDescription", "ClinicalTrialSeriesID", "ClinicalTrialTimePointID",
+                             "ClinicalTrialCoordinatingCenterName", "BodyPartExamined"]
+
   def __init__(self, segmentationNode, contentCreatorName=None):
     self.segmentationNode = segmentationNode
     self.contentCreatorName = contentCreatorName if contentCreatorName else "Slicer"
@@ -543,9 +1120,6 @@ class DICOMSegmentationExporter(ModuleLogicMixin):
     logging.debug("DICOM SEG Metadata output:")
     logging.debug(data)
 
-    metaFilePath = self.saveJSON(data, os.path.join(self.tempDir, "seg_meta.json"))
-
-    segmentFiles = self.createAndGetLabelMapsFromSegments(segmentIDs)
     inputDICOMImageFileNames = self.getDICOMFileList(self.getReferencedVolumeFromSegmentationNode(self.segmentationNode),
                                                      absolutePaths=True)
 
@@ -560,13 +1134,30 @@ class DICOMSegmentationExporter(ModuleLogicMixin):
 
     segFilePath = os.path.join(outputDirectory, segFileName)
 
-    # copy files to a temp location, since otherwise the command line can easily exceed
+    if self.useNativeEncoder:
+      try:
+        self.encodeSegmentation(data, segmentIDs, inputDICOMImageFileNames, segFilePath)
+      except Exception as exc:
+        logging.warning("Encoding DICOM Segmentation in memory failed ({}), falling back to itkimage2segimage"
+                        .format(str(exc)))
+      else:
+        logging.debug("Saved DICOM Segmentation to {}".format(segFilePath))
+        return True
+
+    self.encodeSegmentationWithCLI(data, segmentIDs, inputDICOMImageFileNames, segFilePath)
+    logging.debug("Saved DICOM Segmentation to {}".format(segFilePath))
+    return True
+
+  def encodeSegmentationWithCLI(self, data, segmentIDs, inputDICOMImageFileNames, segFilePath):
+    metaFilePath = self.saveJSON(data, os.path.join(self.tempDir, "seg_meta.json"))
+
+    segmentFiles = self.createAndGetLabelMapsFromSegments(segmentIDs)
+
+    # stage files in a temp location, since otherwise the command line can easily exceed
     #  the maximum on Windows (~8k characters)
     import tempfile, shutil
     cliTempDir = os.path.join(tempfile.mkdtemp())
-    for inputFilePath in inputDICOMImageFileNames:
-      destFile = os.path.join(cliTempDir,os.path.split(inputFilePath)[1])
-      shutil.copyfile(inputFilePath, destFile)
+    self.stageFiles(inputDICOMImageFileNames, cliTempDir)
 
     params = {
       #"dicomImageFiles": ', '.join(inputDICOMImageFileNames).replace(', ', ","),
@@ -592,8 +1183,249 @@ class DICOMSegmentationExporter(ModuleLogicMixin):
     if not os.path.exists(segFilePath):
       raise RuntimeError("DICOM Segmentation was not created. Check Error Log for further information.")
 
-    logging.debug("Saved DICOM Segmentation to {}".format(segFilePath))
-    return True
+  @staticmethod
+  def stageFiles(fileNames, directory):
+    """ Makes the files available in directory without copying their content where possible. Hardlinks are
+    preferred, symlinks are used if the files are on another volume and copies only if neither is supported.
+    """
+    import shutil
+    stagingMethods = [os.link, os.symlink, shutil.copyfile]
+    for fileName in fileNames:
+      destFile = os.path.join(directory, os.path.basename(fileName))
+      while True:
+        try:
+          stagingMethods[0](fileName, destFile)
+          break
+        except (OSError, NotImplementedError):
+          if len(stagingMethods) == 1:
+            raise
+          # do not try a failing method again for the remaining files
+          stagingMethods.pop(0)
+    logging.debug("Staged {} files in {} using {}".format(len(fileNames), directory, stagingMethods[0].__name__))
+
+  def encodeSegmentation(self, data, segmentIDs, inputDICOMImageFileNames, segFilePath):
+    """ Encodes the segments as bit packed frames with highdicom, using the shared labelmap layers of the
+    segmentation and the headers of the referenced images only
+    """
+    import numpy
+    import highdicom as hd
+    volumeNode = self.getReferencedVolumeFromSegmentationNode(self.segmentationNode)
+    segmentNumbers = {segmentID: segmentNumber for segmentNumber, segmentID in enumerate(segmentIDs, start=1)}
+
+    # layers are only resampled within the extent of their segments and placed into the slices occupied by any
+    # segment, frames always cover the full image plane
+    layers = [layer for layer in self.getCroppedLabelmapLayerArrays(self.segmentationNode, segmentIDs, volumeNode)
+              if layer[2] is not None]
+    if not layers:
+      raise self.NoNonEmptySegmentsFoundError("No non empty segments found.")
+    unionExtent = SegmentExtentAnalyzer.getUnionExtent(extent for _, _, extent in layers)
+    firstSlice, lastSlice = unionExtent[4], unionExtent[5]
+    dimensions = volumeNode.GetImageData().GetDimensions()
+    slabShape = (lastSlice - firstSlice + 1, dimensions[1], dimensions[0])
+    slabOrigin = (0, 0, firstSlice)
+
+    labelArray = numpy.zeros(slabShape, dtype=numpy.uint16)
+    overlapping = False
+    for array, segmentLabelValues, extent in layers:
+      labelRegion = SegmentExtentAnalyzer.cropArray(labelArray, extent, slabOrigin)
+      for segmentID, labelValue in segmentLabelValues.items():
+        mask = array == labelValue
+        if not overlapping and labelRegion[mask].any():
+          overlapping = True
+        labelRegion[mask] = segmentNumbers[segmentID]
+
+    if overlapping:
+      # overlapping segments can not be expressed as a label map and need one binary mask per segment
+      pixelArray = numpy.zeros(slabShape + (len(segmentIDs),), dtype=bool)
+      for array, segmentLabelValues, extent in layers:
+        pixelRegion = SegmentExtentAnalyzer.cropArray(pixelArray, extent, slabOrigin)
+        for segmentID, labelValue in segmentLabelValues.items():
+          pixelRegion[..., segmentNumbers[segmentID] - 1] = array == labelValue
+    else:
+      pixelArray = labelArray
+    del layers, labelArray
+
+    sourceImages = self.getSourceImagesForSlices(inputDICOMImageFileNames, volumeNode, firstSlice, lastSlice)
+    if (sourceImages[0].Rows, sourceImages[0].Columns) != pixelArray.shape[1:3]:
+      raise ValueError("Referenced images do not match the dimensions of the referenced volume")
+
+    segmentDescriptions = [self.createSegmentDescription(segmentNumbers[segmentID], segmentData[0])
+                           for segmentID, segmentData in zip(segmentIDs, data["segmentAttributes"])]
+
+    segmentation = hd.seg.Segmentation(
+      source_images=sourceImages,
+      pixel_array=pixelArray,
+      segmentation_type=hd.seg.SegmentationTypeValues.BINARY,
+      segment_descriptions=segmentDescriptions,
+      series_instance_uid=hd.UID(),
+      series_number=int(data["SeriesNumber"]),
+      sop_instance_uid=hd.UID(),
+      instance_number=int(data["InstanceNumber"]),
+      manufacturer="QIICR",
+      manufacturer_model_name="QuantitativeReporting",
+      software_versions=slicer.app.applicationVersion,
+      device_serial_number="1",
+      content_creator_name=data["ContentCreatorName"],
+      omit_empty_frames=True)
+    for keyword in self.seriesAttributeKeywords:
+      if data.get(keyword):
+        setattr(segmentation, keyword, data[keyword])
+    segmentation.save_as(segFilePath)
+
+  @staticmethod
+  def getLabelmapLayerArrays(segmentationNode, segmentIDs, volumeNode):
+    """ Returns the labelmap layers holding the given segments resampled to the geometry of the volume, as a list
+    of (array in KJI order, {segmentID: labelValue}). Each layer is read once, regardless of its segment count.
+    Arrays may share memory with the layers if their geometry matches the volume.
+    """
+    segmentation = segmentationNode.GetSegmentation()
+    referenceGeometry = DICOMSegmentationExporter.getVolumeGeometry(volumeNode)
+    return [(DICOMSegmentationExporter._resampleLayer(segmentation, layerSegmentIDs[0], referenceGeometry),
+             {segmentID: segmentation.GetSegment(segmentID).GetLabelValue() for segmentID in layerSegmentIDs})
+            for layerSegmentIDs in SegmentExtentAnalyzer.getSegmentIDsByLayer(segmentation, segmentIDs)]
+
+  @staticmethod
+  def getCroppedLabelmapLayerArrays(segmentationNode, segmentIDs, volumeNode):
+    """ Same as getLabelmapLayerArrays, but each layer is only resampled within the union of the effective extents
+    of its segments. Returns a list of (array in KJI order, {segmentID: labelValue}, extent in IJK of the volume).
+    Layers without non-empty segments have an empty array and the extent None.
+    """
+    import numpy
+    segmentation = segmentationNode.GetSegmentation()
+    referenceGeometry = DICOMSegmentationExporter.getVolumeGeometry(volumeNode)
+    extents = SegmentExtentAnalyzer.getEffectiveExtents(segmentationNode, segmentIDs, referenceGeometry)
+    layers = []
+    for layerSegmentIDs in SegmentExtentAnalyzer.getSegmentIDsByLayer(segmentation, segmentIDs):
+      extent = SegmentExtentAnalyzer.getUnionExtent(extents[segmentID] for segmentID in layerSegmentIDs)
+      if extent is None:
+        array = numpy.zeros((0, 0, 0), dtype=numpy.uint8)
+      else:
+        array = DICOMSegmentationExporter._resampleLayer(
+          segmentation, layerSegmentIDs[0], SegmentExtentAnalyzer.getCroppedGeometry(referenceGeometry, extent))
+      layers.append((array, {segmentID: segmentation.GetSegment(segmentID).GetLabelValue()
+                             for segmentID in layerSegmentIDs}, extent))
+    return layers
+
+  @staticmethod
+  def getVolumeGeometry(volumeNode):
+    """ Returns the geometry of the volume as vtkOrientedImageData without scalars """
+    geometry = vtkSegmentationCore.vtkOrientedImageData()
+    geometry.SetExtent(volumeNode.GetImageData().GetExtent())
+    ijkToRAS = vtk.vtkMatrix4x4()
+    volumeNode.GetIJKToRASMatrix(ijkToRAS)
+    geometry.SetImageToWorldMatrix(ijkToRAS)
+    return geometry
+
+  @staticmethod
+  def _resampleLayer(segmentation, segmentID, geometry):
+    """ Returns the labelmap layer of the segment resampled to geometry as array in KJI order """
+    binaryLabelmapName = vtkSegmentationCore.vtkSegmentationConverter.GetSegmentationBinaryLabelmapRepresentationName()
+    layerImage = segmentation.GetSegment(segmentID).GetRepresentation(binaryLabelmapName)
+    resampledImage = vtkSegmentationCore.vtkOrientedImageData()
+    vtkSegmentationCore.vtkOrientedImageDataResample.ResampleOrientedImageToReferenceOrientedImage(
+      layerImage, geometry, resampledImage, False, False)
+    return DICOMSegmentationExporter._getArrayInExtent(resampledImage, geometry.GetExtent())
+
+  @staticmethod
+  def _getArrayInExtent(imageData, extent):
+    """ Returns the scalars of imageData as KJI array covering extent, zero padded where imageData does not
+    """
+    import numpy
+    from vtk.util import numpy_support
+    scalars = imageData.GetPointData().GetScalars()
+    dimensions = [extent[2 * axis + 1] - extent[2 * axis] + 1 for axis in range(3)]
+    imageExtent = imageData.GetExtent()
+    if scalars is None:
+      return numpy.zeros(dimensions[::-1], dtype=numpy.uint8)
+    imageArray = numpy_support.vtk_to_numpy(scalars).reshape([imageExtent[2 * axis + 1] - imageExtent[2 * axis] + 1
+                                                               for axis in (2, 1, 0)])
+    if list(imageExtent) == list(extent):
+      return imageArray
+    array = numpy.zeros(dimensions[::-1], dtype=imageArray.dtype)
+    lower = [max(extent[2 * axis], imageExtent[2 * axis]) for axis in range(3)]
+    upper = [min(extent[2 * axis + 1], imageExtent[2 * axis + 1]) for axis in range(3)]
+    if any(l > u for l, u in zip(lower, upper)):
+      return array
+    target = tuple(slice(lower[axis] - extent[2 * axis], upper[axis] - extent[2 * axis] + 1) for axis in (2, 1, 0))
+    source = tuple(slice(lower[axis] - imageExtent[2 * axis], upper[axis] - imageExtent[2 * axis] + 1)
+                   for axis in (2, 1, 0))
+    array[target] = imageArray[source]
+    return array
+
+  @staticmethod
+  def getSourceImagesForSlices(fileNames, volumeNode, firstSlice, lastSlice):
+    """ Returns the headers of the referenced images for the slices firstSlice to lastSlice of volumeNode
+    """
+    rasToIJK = vtk.vtkMatrix4x4()
+    volumeNode.GetRASToIJKMatrix(rasToIJK)
+    sourceImagesBySlice = {}
+    for fileName in fileNames:
+      dataset = DICOMPluginBase.readDICOMHeader(fileName)
+      if int(getattr(dataset, "NumberOfFrames", 1)) > 1:
+        raise ValueError("Multi-frame referenced images are not supported")
+      position = [float(v) for v in dataset.ImagePositionPatient]
+      ijk = rasToIJK.MultiplyPoint([-position[0], -position[1], position[2], 1.0])
+      if abs(ijk[0]) > 0.5 or abs(ijk[1]) > 0.5:
+        raise ValueError("Referenced image {} does not match the geometry of the referenced volume".format(fileName))
+      sourceImagesBySlice[int(round(ijk[2]))] = dataset
+    try:
+      return [sourceImagesBySlice[sliceIndex] for sliceIndex in range(firstSlice, lastSlice + 1)]
+    except KeyError as exc:
+      raise ValueError("No referenced image found for slice {}".format(exc))
+
+  @staticmethod
+  def getDICOMLabFromRGB(rgb255):
+    """ Converts 8 bit sRGB to a RecommendedDisplayCIELabValue (D65 white point, as dcmqi does)
+    """
+    def linearize(c):
+      c = float(c) / 255.
+      return ((c + 0.055) / 1.055) ** 2.4 if c > 0.04045 else c / 12.92
+
+    r, g, b = [linearize(c) for c in rgb255]
+    x = (0.4124 * r + 0.3576 * g + 0.1805 * b) / 0.950456
+    y = 0.2126 * r + 0.7152 * g + 0.0722 * b
+    z = (0.0193 * r + 0.1192 * g + 0.9505 * b) / 1.088754
+
+    def xyzToLab(t):
+      return t ** (1. / 3.) if t > 0.008856 else 7.787 * t + 16. / 116.
+
+    L = 116. * xyzToLab(y) - 16.
+    a = 500. * (xyzToLab(x) - xyzToLab(y))
+    b = 200. * (xyzToLab(y) - xyzToLab(z))
+    return [int(round(min(max(v, 0.), 65535.))) for v in [L * 65535. / 100.,
+                                                            (a + 128.) * 65535. / 255.,
+                                                            (b + 128.) * 65535. / 255.]]
+
+  def createSegmentDescription(self, segmentNumber, segmentData):
+    import highdicom as hd
+
+    def getCode(codeSequenceName):
+      code = segmentData[codeSequenceName]
+      return hd.sr.CodedConcept(code["CodeValue"], code["CodingSchemeDesignator"], code["CodeMeaning"])
+
+    description = hd.seg.SegmentDescription(
+      segment_number=segmentNumber,
+      segment_label=segmentData["SegmentLabel"],
+      segmented_property_category=getCode("SegmentedPropertyCategoryCodeSequence"),
+      segmented_property_type=getCode("SegmentedPropertyTypeCodeSequence"),
+      algorithm_type=hd.seg.SegmentAlgorithmTypeValues.MANUAL,
+      anatomic_regions=[getCode("AnatomicRegionSequence")] if "AnatomicRegionSequence" in segmentData else None)
+
+    # like dcmqi, only the algorithm type and name are encoded (highdicom would require a full
+    # AlgorithmIdentificationSequence for non manual segments)
+    description.SegmentAlgorithmType = segmentData["SegmentAlgorithmType"]
+    if "SegmentAlgorithmName" in segmentData:
+      description.SegmentAlgorithmName = segmentData["SegmentAlgorithmName"]
+    if segmentData.get("SegmentDescription"):
+      description.SegmentDescription = segmentData["SegmentDescription"]
+    description.RecommendedDisplayCIELabValue = self.getDICOMLabFromRGB(segmentData["recommendedDisplayRGBValue"])
+    if "SegmentedPropertyTypeModifierCodeSequence" in segmentData:
+      description.SegmentedPropertyTypeCodeSequence[0].SegmentedPropertyTypeModifierCodeSequence = \
+        [getCode("SegmentedPropertyTypeModifierCodeSequence")]
+    if "AnatomicRegionModifierSequence" in segmentData and "AnatomicRegionSequence" in description:
+      description.AnatomicRegionSequence[0].AnatomicRegionModifierSequence = \
+        [getCode("AnatomicRegionModifierSequence")]
+    return description
 
   def getSeriesAttributes(self):
     attributes = dict()
@@ -604,30 +1436,86 @@ class DICOMSegmentationExporter(ModuleLogicMixin):
     return attributes
 
   def getNonEmptySegmentIDs(self, segmentIDs):
-    segmentation = self.segmentationNode.GetSegmentation()
-    return [segmentID for segmentID in segmentIDs if not self.isSegmentEmpty(segmentation.GetSegment(segmentID))]
+    segmentExtents = SegmentExtentAnalyzer.getSegmentVoxelCountsAndExtents(self.segmentationNode, segmentIDs)
+    return [segmentID for segmentID in segmentIDs if segmentExtents[segmentID][0]]
 
   def isSegmentEmpty(self, segment):
-    import vtkSegmentationCorePython as vtkSegmentationCore
-    vtkSegConverter = vtkSegmentationCore.vtkSegmentationConverter
-    r = segment.GetRepresentation(vtkSegConverter.GetSegmentationBinaryLabelmapRepresentationName())
-    imagescalars = r.GetPointData().GetArray("ImageScalars")
+    segmentID = self.segmentationNode.GetSegmentation().GetSegmentIdBySegment(segment)
+    return not SegmentExtentAnalyzer.getSegmentVoxelCountsAndExtents(self.segmentationNode, [segmentID])[segmentID][0]
 
-    if imagescalars is None:
-      return True
-    else:
-      return imagescalars.GetValueRange() == (0,0)
+  def createAndGetLabelMapsFromSegments(self, segmentIDs, numberOfWorkers=None):
+    """ Writes one labelmap NRRD file per segment and returns the file names in the order of segmentIDs.
 
-  def createAndGetLabelMapsFromSegments(self, segmentIDs):
+    The labelmaps are extracted on the main thread, compressing and writing them is done by a pool of
+    numberOfWorkers threads. At most twice as many labelmaps as workers are held in memory at a time.
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    from vtk.util import numpy_support
+    numberOfWorkers = numberOfWorkers or self.labelmapExportWorkers or min(8, os.cpu_count() or 1)
+    geometry = SegmentExtentAnalyzer.getSegmentationGeometry(self.segmentationNode)
+    extents = None
+    if geometry is not None:
+      # itkimage2segimage requires the in-plane lattice of the reference images, labelmaps are therefore only
+      # cropped along the slice axis
+      geometryExtent = geometry.GetExtent()
+      extents = {segmentID: list(geometryExtent[:4]) + extent[4:] if extent is not None else None
+                 for segmentID, extent in SegmentExtentAnalyzer.getEffectiveExtents(self.segmentationNode, segmentIDs,
+                                                                                    geometry).items()}
     segmentFiles = []
-    for segmentID in segmentIDs:
-      segmentLabelmap = self.createLabelNodeFromSegment(self.segmentationNode, segmentID)
-      filename = os.path.join(self.tempDir, "{}.nrrd".format(segmentLabelmap.GetName()))
-      slicer.util.saveNode(segmentLabelmap, filename)
-      slicer.mrmlScene.RemoveNode(segmentLabelmap)
-      segmentFiles.append(filename)
+    pending = set()
+    with ThreadPoolExecutor(max_workers=numberOfWorkers) as executor:
+      for segmentID in segmentIDs:
+        # labelmaps only cover the slices of the segment, itkimage2segimage places them by their origin
+        mergedImageData = self.getCroppedSegmentLabelmap(self.segmentationNode, segmentID, geometry, extents)
+        dimensions = mergedImageData.GetDimensions()
+        array = numpy_support.vtk_to_numpy(mergedImageData.GetPointData().GetScalars())
+        array = array.reshape(dimensions[::-1]).copy()
+        ijkToRAS = vtk.vtkMatrix4x4()
+        mergedImageData.GetImageToWorldMatrix(ijkToRAS)
+        # the array starts at the first voxel of the extent, which becomes the origin of the file
+        origin = ijkToRAS.MultiplyPoint(list(mergedImageData.GetExtent()[::2]) + [1.0])
+        ijkToRAS = [[ijkToRAS.GetElement(row, column) for column in range(3)] + [origin[row]] for row in range(3)]
+
+        filename = os.path.join(self.tempDir, "{}_label.nrrd".format(segmentID))
+        if len(pending) >= 2 * numberOfWorkers:
+          done, pending = wait(pending, return_when=FIRST_COMPLETED)
+          for future in done:
+            future.result()
+        pending.add(executor.submit(self.writeLabelmapNRRD, filename, array, ijkToRAS))
+        segmentFiles.append(filename)
+      for future in pending:
+        future.result()
     return segmentFiles
 
+  @staticmethod
+  def writeLabelmapNRRD(fileName, array, ijkToRAS):
+    """ Writes a KJI ordered array as gzip compressed NRRD file in LPS space, ijkToRAS being the upper 3x4 part of
+    the IJK to RAS matrix
+    """
+    import gzip
+    nrrdTypes = {"int8": "signed char", "uint8": "unsigned char", "int16": "short", "uint16": "unsigned short",
+                 "int32": "int", "uint32": "unsigned int", "float32": "float", "float64": "double"}
+
+    def toLPS(vector):
+      return "({:.17g},{:.17g},{:.17g})".format(-vector[0], -vector[1], vector[2])
+
+    header = ["NRRD0004",
+              "type: {}".format(nrrdTypes[array.dtype.name]),
+              "dimension: 3",
+              "space: left-posterior-superior",
+              "sizes: {} {} {}".format(*array.shape[::-1]),
+              "space directions: {}".format(" ".join(toLPS([ijkToRAS[row][axis] for row in range(3)])
+                                                      for axis in range(3))),
+              "kinds: domain domain domain",
+              "endian: little",
+              "encoding: gzip",
+              "space origin: {}".format(toLPS([ijkToRAS[row][3] for row in range(3)]))]
+    data = gzip.compress(array.astype(array.dtype.newbyteorder("<"), copy=False).tobytes(), compresslevel=1)
+    with open(fileName, "wb") as nrrdFile:
+      nrrdFile.write(("\n".join(header) + "\n\n").encode("ascii"))
+      nrrdFile.write(data)
+    return fileName
+
   def getDICOMFileList(self, volumeNode, absolutePaths=False):
     # TODO: move to general class
     # duplicate in quantitative Reporting
@@ -664,10 +1552,10 @@ class DICOMSegmentationExporter(ModuleLogicMixin):
     segmentData = dict()
     segmentData["labelID"] = 1
     segment = self.segmentationNode.GetSegmentation().GetSegment(segmentID)
-    terminologyEntry = self.getDeserializedTerminologyEntry(segment)
-    category = terminologyEntry.GetCategoryObject()
+    codeSequences = self.getTerminologyCodeSequences(segment)
+    category = codeSequences["SegmentedPropertyCategoryCodeSequence"]
     segmentData["SegmentLabel"] = segment.GetName()
-    segmentData["SegmentDescription"] = category.GetCodeMeaning()
+    segmentData["SegmentDescription"] = category["CodeMeaning"] if category else ""
     algorithmType = vtk.mutable('')
     if not segment.GetTag("DICOM.SegmentAlgorithmType", algorithmType):
       algorithmType = "MANUAL"
@@ -685,75 +1573,53 @@ class DICOMSegmentationExporter(ModuleLogicMixin):
       segmentData["SegmentAlgorithmName"] = str(algorithmName)
     rgb = segment.GetColor()
     segmentData["recommendedDisplayRGBValue"] = [rgb[0] * 255, rgb[1] * 255, rgb[2] * 255]
-    segmentData.update(self.createJSONFromTerminologyContext(terminologyEntry))
-    segmentData.update(self.createJSONFromRegionContext(terminologyEntry))
+    segmentData.update(self.createJSONFromTerminologyContext(codeSequences))
+    segmentData.update(self.createJSONFromRegionContext(codeSequences))
     return segmentData
 
   def checkTerminologyOfSegments(self, segmentIDs):
     # TODO: not sure if this is still needed since there is always a terminology assigned by default
     for segmentID in segmentIDs:
       segment = self.segmentationNode.GetSegmentation().GetSegment(segmentID)
-      terminologyEntry = self.getDeserializedTerminologyEntry(segment)
-      category = terminologyEntry.GetCategoryObject()
-      propType = terminologyEntry.GetTypeObject()
-      if any(v is None for v in [category, propType]):
+      codeSequences = self.getTerminologyCodeSequences(segment)
+      if any(codeSequences[name] is None for name in ["SegmentedPropertyCategoryCodeSequence",
+                                                      "SegmentedPropertyTypeCodeSequence"]):
         raise ValueError("Segment {} has missing attributes. Make sure to set terminology.".format(segment.GetName()))
 
-  def createJSONFromTerminologyContext(self, terminologyEntry):
+  def createJSONFromTerminologyContext(self, codeSequences):
+    # category and type are set, segments without them are rejected by checkTerminologyOfSegments
     segmentData = dict()
-
-    categoryObject = terminologyEntry.GetCategoryObject()
-    categoryObject_invalid = categoryObject is None or not self.isTerminologyInformationValid(categoryObject)
-
-    typeObject = terminologyEntry.GetTypeObject()
-    typeObject_invalid = typeObject is None or not self.isTerminologyInformationValid(typeObject)
-
-    if categoryObject_invalid or typeObject_invalid:
-      logging.warning("Terminology information invalid or unset! This might lead to crashes during the conversion to "
-                      "SEG objects. Make sure to select a terminology class for all segments in the Slicer scene.")
-      return {}
-
-    segmentData["SegmentedPropertyCategoryCodeSequence"] = self.getJSONFromVtkSlicerTerminology(categoryObject)
-    segmentData["SegmentedPropertyTypeCodeSequence"] = self.getJSONFromVtkSlicerTerminology(typeObject)
-
-    modifierObject = terminologyEntry.GetTypeModifierObject()
-    if modifierObject is not None and self.isTerminologyInformationValid(modifierObject):
-      segmentData["SegmentedPropertyTypeModifierCodeSequence"] = self.getJSONFromVtkSlicerTerminology(modifierObject)
-
+    for name in ["SegmentedPropertyCategoryCodeSequence", "SegmentedPropertyTypeCodeSequence",
+                 "SegmentedPropertyTypeModifierCodeSequence"]:
+      if codeSequences[name] is not None:
+        segmentData[name] = codeSequences[name]
     return segmentData
 
-  def createJSONFromRegionContext(self, terminologyEntry):
+  def createJSONFromRegionContext(self, codeSequences):
     segmentData = dict()
 
-    try:
-      regionObject = terminologyEntry.GetRegionObject()
-    except AttributeError:
-      # backward compatibility with Slicer 5.8.1
-      regionObject = terminologyEntry.GetAnatomicRegionObject()
-
-    if regionObject is None or not self.isTerminologyInformationValid(regionObject):
+    if codeSequences["AnatomicRegionSequence"] is None:
       return {}
-    segmentData["AnatomicRegionSequence"] = self.getJSONFromVtkSlicerTerminology(regionObject)
-
-    try:
-      regionModifierObject = terminologyEntry.GetRegionModifierObject()
-    except AttributeError:
-      # backward compatibility with Slicer 5.8.1
-      regionModifierObject = terminologyEntry.GetAnatomicRegionModifierObject()
-
-    if regionModifierObject is not None and self.isTerminologyInformationValid(regionModifierObject):
-      segmentData["AnatomicRegionModifierSequence"] = self.getJSONFromVtkSlicerTerminology(regionModifierObject)
+    for name in ["AnatomicRegionSequence", "AnatomicRegionModifierSequence"]:
+      if codeSequences[name] is not None:
+        segmentData[name] = codeSequences[name]
     return segmentData
 
-  def isTerminologyInformationValid(self, termTypeObject):
+  @staticmethod
+  def isTerminologyInformationValid(termTypeObject):
     return all(t is not None for t in [termTypeObject.GetCodeValue(), termTypeObject.GetCodingSchemeDesignator(),
                                        termTypeObject.GetCodeMeaning()])
 
-  def getJSONFromVtkSlicerTerminology(self, termTypeObject):
-    return self.createCodeSequence(termTypeObject.GetCodeValue(), termTypeObject.GetCodingSchemeDesignator(),
-                                   termTypeObject.GetCodeMeaning())
+  @staticmethod
+  def getJSONFromVtkSlicerTerminology(termTypeObject):
+    if termTypeObject is None or not DICOMSegmentationExporter.isTerminologyInformationValid(termTypeObject):
+      return None
+    return DICOMSegmentationExporter.createCodeSequence(termTypeObject.GetCodeValue(),
+                                                        termTypeObject.GetCodingSchemeDesignator(),
+                                                        termTypeObject.GetCodeMeaning())
 
-  def createCodeSequence(self, value, designator, meaning):
+  @staticmethod
+  def createCodeSequence(value, designator, meaning):
     return {"CodeValue": value,
             "CodingSchemeDesignator": designator,
             "CodeMeaning": meaning}
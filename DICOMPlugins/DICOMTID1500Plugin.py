@@ -1,13 +1,15 @@
 import json
 import logging
 import os
+import sqlite3
 import vtk
 import datetime
-from collections import Counter
+from collections import OrderedDict
 import qt 
 
 import numpy
 import numpy as np 
+from vtk.util import numpy_support
 import random
 import pydicom 
 from pydicom.sr.codedict import codes
@@ -15,6 +17,7 @@ from pydicom.sr.codedict import codes
 import slicer
 from DICOMLib import DICOMLoadable
 from base.DICOMPluginBase import DICOMPluginBase
+from base.TID1500MeasurementReader import TID1500MeasurementReader
 from SlicerDevelopmentToolboxUtils.mixins import ModuleLogicMixin
 
 class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
@@ -33,6 +36,19 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
   UID_SegmentationStorage = pydicom.uid.SegmentationStorage
   UID_RealWorldValueMappingStorage = pydicom.uid.RealWorldValueMappingStorage
 
+  # tags needed to decide if a file is a TID1500 SR, see isDICOMTID1500
+  examineTags = ["SOPInstanceUID", "SOPClassUID", "Modality", "SeriesDescription", "ContentTemplateSequence"]
+
+  # tags stored in the TID1500 catalog, see getTID1500Reports
+  catalogTags = examineTags + ["StudyInstanceUID", "SeriesDate", "SeriesTime", "StudyDate", "StudyTime",
+                               "CurrentRequestedProcedureEvidenceSequence"]
+
+  # read measurements with TID1500MeasurementReader instead of the tid1500reader CLI
+  useNativeReader = True
+
+  # show all points of an SR as one markups node and create bounding boxes and lines in a scene batch
+  bulkMarkupsDisplay = True
+
   def __init__(self):
     DICOMPluginBase.__init__(self)
     self.loadType = "DICOM Structured Report TID1500"
@@ -63,13 +79,20 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
     self.tags["Rows"] = "0028,0010"
     self.tags["Columns"] = "0028,0011"
 
+    # SeriesInstanceUID -> {SOPInstanceUID -> geometry}, see getSeriesGeometry
+    self.seriesGeometry = {}
+
+    # file path -> (mtime, highdicom SR) of the documents parsed during the current examine or load, see getSRDocument
+    self.srDocuments = {}
+    # SOPInstanceUID -> SRContentIndex of the parsed documents, see getSRContentIndex
+    self.srContentIndices = {}
+
   def examineFiles(self, files):
 
-    import pydicom 
     loadables = []
 
     for cFile in files:
-      dataset = pydicom.dcmread(cFile)
+      dataset = self.readDICOMHeader(cFile, self.examineTags)
 
       uid = self.getDICOMValue(dataset, "SOPInstanceUID")
       if uid == "":
@@ -80,7 +103,7 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
       isDicomTID1500 = self.isDICOMTID1500(dataset)
 
       if isDicomTID1500:
-        loadable = self.createLoadableAndAddReferences([dataset])
+        loadable = self.createLoadableAndAddReferences([self.getSRDocument(cFile)])
         loadable.files = [cFile]
         loadable.name = seriesDescription + ' - as a DICOM SR TID1500 object'
         loadable.tooltip = loadable.name
@@ -94,7 +117,8 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
         loadables.append(loadable)
 
         logging.debug('DICOM SR TID1500 modality found')
-      
+
+    self.clearSRDocuments()
     return loadables
 
   def isDICOMTID1500(self, dataset):
@@ -120,6 +144,158 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
       isDicomTID1500 = False
     return isDicomTID1500
 
+  @staticmethod
+  def getDICOMValue(inputArg, tagName, default=""):
+    """
+    Same as ModuleLogicMixin.getDICOMValue but also accepts datasets which were not read as FileDataset,
+    e.g. the highdicom SR documents returned by getSRDocument.
+    """
+
+    if isinstance(inputArg, pydicom.dataset.Dataset):
+      return getattr(inputArg, tagName, default)
+    return ModuleLogicMixin.getDICOMValue(inputArg, tagName, default)
+
+  def getSRDocument(self, filePath):
+    """
+    Returns the SR of the given file as highdicom SR document. The file is read once and converted in place,
+    so the document is also the complete pydicom dataset of the file. Documents are kept until the end of the
+    current examine or load.
+    """
+
+    import highdicom as hd
+
+    mtime = os.path.getmtime(filePath)
+    try:
+      cachedMTime, sr = self.srDocuments[filePath]
+      if cachedMTime == mtime:
+        return sr
+    except KeyError:
+      pass
+
+    dataset = pydicom.dcmread(filePath)
+    srClasses = {
+      self.UID_EnhancedSRStorage: hd.sr.EnhancedSR,
+      self.UID_ComprehensiveSRStorage: hd.sr.ComprehensiveSR,
+      self.UID_Comprehensive3DSRStorage: hd.sr.Comprehensive3DSR,
+    }
+    srClass = srClasses.get(dataset.SOPClassUID)
+    if srClass is None:
+      raise ValueError(f"Cannot create SR from dataset. Unsupported SOP Class UID: {dataset.SOPClassUID}")
+    # the dataset is private to this cache, so highdicom does not need to copy it
+    sr = srClass.from_dataset(dataset, copy=False)
+    self.srDocuments[filePath] = (mtime, sr)
+    return sr
+
+  def getSRContentIndex(self, sr):
+    """
+    Returns the SRContentIndex of the given SR document, built once per document.
+    """
+
+    try:
+      return self.srContentIndices[sr.SOPInstanceUID]
+    except KeyError:
+      index = SRContentIndex(sr, self.getSRCode("Geometric purpose of region"), self.getSRCode("Bounded by"))
+      self.srContentIndices[sr.SOPInstanceUID] = index
+      return index
+
+  def clearSRDocuments(self):
+    self.srDocuments = {}
+    self.srContentIndices = {}
+
+  def getTID1500Reports(self, patient):
+    """
+    Returns all TID1500 reports of the given patient ordered by series date and time as dictionaries with the
+    catalog columns. The catalog is stored next to the loadable cache and only SR series which are new or whose
+    file changed since the last call are read.
+    """
+
+    connection = self._openTID1500Catalog()
+    try:
+      self._updateTID1500Catalog(connection, patient)
+      cursor = connection.execute("SELECT * FROM TID1500Catalog WHERE PatientUID = ? AND IsTID1500 = 1 "
+                                  "ORDER BY DateTime", (patient,))
+      columns = [description[0] for description in cursor.description]
+      reports = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    except sqlite3.Error as exc:
+      logging.warning("Querying the TID1500 catalog failed: %s" % str(exc))
+      return []
+    finally:
+      connection.close()
+    for report in reports:
+      report["ReferencedSegmentationSeriesUIDs"] = json.loads(report["ReferencedSegmentationSeriesUIDs"])
+      report["ReferencedRWVMSeriesUIDs"] = json.loads(report["ReferencedRWVMSeriesUIDs"])
+    return reports
+
+  def _openTID1500Catalog(self):
+    """ Returns a connection to the catalog of SR series, stored next to the persistent loadable cache if that is
+    enabled and kept in memory otherwise
+    """
+    connection = self._openLoadableCache() if self.usePersistentLoadableCache else None
+    if connection is None:
+      connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE IF NOT EXISTS TID1500Catalog (SeriesInstanceUID TEXT PRIMARY KEY, "
+                       "PatientUID TEXT, StudyInstanceUID TEXT, SOPInstanceUID TEXT, SOPClassUID TEXT, "
+                       "FileName TEXT, MTime REAL, IsTID1500 INTEGER, DateTime TEXT, "
+                       "ReferencedSegmentationSeriesUIDs TEXT, ReferencedRWVMSeriesUIDs TEXT)")
+    connection.execute("CREATE INDEX IF NOT EXISTS TID1500CatalogPatient ON TID1500Catalog (PatientUID)")
+    return connection
+
+  def _updateTID1500Catalog(self, connection, patient):
+    seriesStudies = {}
+    for study in slicer.dicomDatabase.studiesForPatient(patient):
+      for series in slicer.dicomDatabase.seriesForStudy(study):
+        seriesStudies[series] = study
+    modalities = self.getSeriesValues(list(seriesStudies.keys()), [self.tags["Modality"]])
+    cataloged = {row[0]: (row[1], row[2]) for row in
+                 connection.execute("SELECT SeriesInstanceUID, FileName, MTime FROM TID1500Catalog "
+                                    "WHERE PatientUID = ?", (patient,))}
+
+    entries = []
+    for series, study in seriesStudies.items():
+      if modalities[series][self.tags["Modality"]] not in ("SR", ""):
+        continue
+      fileName = self.fileForSeries(series)
+      if not fileName or not os.path.exists(fileName):
+        continue
+      mtime = os.path.getmtime(fileName)
+      if cataloged.get(series) == (fileName, mtime):
+        continue
+      entries.append((series, patient, study) + self._getTID1500CatalogEntry(fileName) + (fileName, mtime))
+
+    removedSeries = [(series,) for series in cataloged.keys() if series not in seriesStudies]
+    if entries or removedSeries:
+      connection.executemany("INSERT OR REPLACE INTO TID1500Catalog (SeriesInstanceUID, PatientUID, "
+                             "StudyInstanceUID, SOPInstanceUID, SOPClassUID, IsTID1500, DateTime, "
+                             "ReferencedSegmentationSeriesUIDs, ReferencedRWVMSeriesUIDs, FileName, MTime) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", entries)
+      connection.executemany("DELETE FROM TID1500Catalog WHERE SeriesInstanceUID = ?", removedSeries)
+      connection.commit()
+
+  def _getTID1500CatalogEntry(self, fileName):
+    """
+    Returns SOPInstanceUID, SOPClassUID, TID1500 flag, date time and the JSON lists of referenced SEG and RWVM
+    series of the given SR file.
+    """
+
+    dataset = self.readDICOMHeader(fileName, self.catalogTags)
+    segmentationSeriesUIDs = []
+    rwvmSeriesUIDs = []
+    for evidence in getattr(dataset, "CurrentRequestedProcedureEvidenceSequence", []):
+      for referencedSeries in getattr(evidence, "ReferencedSeriesSequence", []):
+        for referencedSOP in getattr(referencedSeries, "ReferencedSOPSequence", []):
+          if referencedSOP.ReferencedSOPClassUID == self.UID_SegmentationStorage:
+            segmentationSeriesUIDs.append(str(referencedSeries.SeriesInstanceUID))
+          elif referencedSOP.ReferencedSOPClassUID == self.UID_RealWorldValueMappingStorage:
+            rwvmSeriesUIDs.append(str(referencedSeries.SeriesInstanceUID))
+    if self.getDICOMValue(dataset, "SeriesDate"):
+      dateTime = self.getDICOMValue(dataset, "SeriesDate") + self.getDICOMValue(dataset, "SeriesTime")
+    else:
+      dateTime = self.getDICOMValue(dataset, "StudyDate") + self.getDICOMValue(dataset, "StudyTime")
+    return (self.getDICOMValue(dataset, "SOPInstanceUID"), self.getDICOMValue(dataset, "SOPClassUID"),
+            int(self.isDICOMTID1500(dataset)), dateTime,
+            json.dumps(list(OrderedDict.fromkeys(segmentationSeriesUIDs))),
+            json.dumps(list(OrderedDict.fromkeys(rwvmSeriesUIDs))))
+
   def referencedSeriesName(self, loadable):
     """
     Returns the default series name for the given loadable.
@@ -163,18 +339,12 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
     Gets the list of SOPInstanceUIDs from a SeriesInstanceUID. 
     """
 
-    db = slicer.dicomDatabase
-    SOPInstanceUIDs = [] 
-    fileList = db.filesForSeries(SeriesInstanceUID) 
-    for file in fileList: 
-      SOPInstanceUID = db.fileValue(file, self.tags["SOPInstanceUID"])
-      SOPInstanceUIDs.append(SOPInstanceUID) 
-
-    return SOPInstanceUIDs
+    return list(self.getSeriesInstanceUIDs(SeriesInstanceUID))
   
   def createLoadableAndAddReferences(self, datasets):
     """
     Main function to create the loadable and add the necessary references. 
+    The datasets are highdicom SR documents as returned by getSRDocument.
     """
 
     import highdicom as hd
@@ -196,21 +366,8 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
 
     for dataset in datasets:
 
-      ### First we convert from dataset to sr ###
-      sr_class_map = {
-          pydicom.uid.EnhancedSRStorage: hd.sr.EnhancedSR,
-          pydicom.uid.ComprehensiveSRStorage: hd.sr.ComprehensiveSR,
-          pydicom.uid.Comprehensive3DSRStorage: hd.sr.Comprehensive3DSR,
-      }
-      # Get the SOP Class UID from the dataset
-      sop_class_uid = dataset.SOPClassUID
-      # Retrieve the correct SR class from the dictionary
-      sr_class = sr_class_map.get(sop_class_uid)
-      # Instantiate the correct SR object
-      if sr_class is not None:
-        sr = sr_class.from_dataset(dataset, copy=True)
-      else:
-        logging.error(f"Cannot create SR from dataset. Unsupported SOP Class UID: {sop_class_uid}")
+      # the SR document is a pydicom dataset as well
+      sr = dataset
 
       ### First we check if the SR contains planar annotations ###
       containsPlanarAnnotations = self.containsPlanarAnnotations(sr) 
@@ -266,13 +423,8 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
         if checkIfSRContains3DPoint: 
 
           # print('In checkIfSRContains3DPoint - check for FrameOfReferenceUID')     
-          # get the ImageRegion code 
-          image_region_code = self.getSRCode("Image Region")
           # First get the planar roi measurement groups 
-          groups = sr.content.get_planar_roi_measurement_groups(
-                    graphic_type=hd.sr.GraphicTypeValues3D.POINT,
-                    reference_type=codes.DCM.ImageRegion,
-          )
+          groups = self.getSRContentIndex(sr).getGroups(codes.DCM.ImageRegion, hd.sr.GraphicTypeValues3D.POINT)
 
           # Iterate through the groups, and get unique list of FrameOfReferenceUIDs 
           FrameOfReferenceUIDs = [] 
@@ -288,12 +440,11 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
 
           # Now make sure that the modality of these possible_SeriesInstanceUIDs are not SR or SEG.  
           # Don't want them included in the list 
+          # Modality and FrameOfReferenceUID of all series are fetched at once 
+          seriesValues = self.getSeriesValues(SeriesInstanceUIDs, [self.tags["Modality"], self.tags["FrameOfReferenceUID"]])
           possible_SeriesInstanceUIDs = [] 
-          db = slicer.dicomDatabase 
           for series in SeriesInstanceUIDs: 
-            modality = slicer.dicomDatabase.fileValue(  
-              slicer.dicomDatabase.filesForSeries(series)[0], self.tags["Modality"]
-            )
+            modality = seriesValues[series][self.tags["Modality"]]
             if (modality != "SR") and (modality != "SEG"): 
               possible_SeriesInstanceUIDs.append(series)
 
@@ -310,8 +461,7 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
             # Now get the FrameOfReferenceUIDs for these SeriesInstanceUIDs 
             FrameOfReferenceUIDs_forSeries = [] 
             for SeriesInstanceUID in possible_SeriesInstanceUIDs: 
-              FrameOfReferenceUID_forSeries = slicer.dicomDatabase.fileValue(
-                                                        slicer.dicomDatabase.filesForSeries(SeriesInstanceUID)[0], self.tags["FrameOfReferenceUID"]) 
+              FrameOfReferenceUID_forSeries = seriesValues[SeriesInstanceUID][self.tags["FrameOfReferenceUID"]] 
               FrameOfReferenceUIDs_forSeries.append(FrameOfReferenceUID_forSeries)
               
             # iterate over the list of FrameOfReferenceUIDs_forSeries and see if any are in the actual SR. 
@@ -338,15 +488,12 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
           # Get the referenced SeriesInstanceUID 
           referenced_series_instance_uid = str(sr.CurrentRequestedProcedureEvidenceSequence[0].ReferencedSeriesSequence[0].SeriesInstanceUID)
           # Now we get all of the SOPInstanceUIDs of this series 
-          db = slicer.dicomDatabase
-          fileList = db.filesForSeries(referenced_series_instance_uid)
-          if not fileList: 
+          SOPInstanceUIDs = self.getSOPInstanceUIDsForSeries(referenced_series_instance_uid)
+          if not SOPInstanceUIDs: 
             logging.error("ERROR: no referenced series found in the DICOM database, cannot load any associated image data")
             slicer.util.errorDisplay("No referenced series found in the DICOM database, cannot load any associated image data")
           else: 
-            SOPInstanceUIDs = [db.fileValue(file, self.tags["SOPInstanceUID"]) for file in fileList]
-            if (SOPInstanceUIDs):
-              loadable.referencedInstanceUIDs += SOPInstanceUIDs 
+            loadable.referencedInstanceUIDs += SOPInstanceUIDs 
 
 
     return loadable
@@ -355,9 +502,8 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
     return sorted(uids, key=lambda uid: self.getDateTime(uid))
 
   def getDateTime(self, uid):
-    import pydicom 
     filename = slicer.dicomDatabase.fileForInstance(uid)
-    dataset = pydicom.dcmread(filename)
+    dataset = self.getSRDocument(filename)
     if hasattr(dataset, 'SeriesDate') and hasattr(dataset, "SeriesTime"):
       date = dataset.SeriesDate
       time = dataset.SeriesTime
@@ -380,19 +526,11 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
     bounding box, etc. 
     """
 
-    # default to use the plugin 
-    containsPlanarAnnotations = False
-
     # get the image region code 
     image_region_code = self.getSRCode("Image Region")
 
-    planar_roi_measurement_groups = sr.content.get_planar_roi_measurement_groups()
-    for planar_roi_measurement_group in planar_roi_measurement_groups: 
-      # Here we check if it is an Image Region 
-      if (planar_roi_measurement_group.reference_type == image_region_code):
-          containsPlanarAnnotations = True
-
-    return containsPlanarAnnotations
+    # Here we check if any group references an Image Region 
+    return len(self.getSRContentIndex(sr).getGroups(image_region_code)) > 0
   
   def checkIfSRContainsGeometry(self, sr, geometry_type='bbox'):
     """ 
@@ -402,27 +540,20 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
     import highdicom as hd 
     from pydicom.sr.codedict import codes
 
+    index = self.getSRContentIndex(sr)
+
     # If SR contains a bounding box 
     if (geometry_type == "bbox2D"):
-      for group in sr.content.get_planar_roi_measurement_groups(reference_type=codes.DCM.ImageRegion, graphic_type=hd.sr.GraphicTypeValues.POLYLINE):
-        for eval in group.get_qualitative_evaluations(
-              name=self.getSRCode("Geometric purpose of region"),
-        ):
-            if eval.value == self.getSRCode("Bounded by"): 
-                return True
-      return False
+      return len(index.boundingBoxGroups) >= 1
 
     # If SR contains a POLYLINE
     elif (geometry_type == "polyline2D"):
-      groups = sr.content.get_planar_roi_measurement_groups(
-        reference_type=self.getSRCode("Image Region"),
-        graphic_type=hd.sr.GraphicTypeValues.POLYLINE, 
-      )  
+      groups = index.getGroups(self.getSRCode("Image Region"), hd.sr.GraphicTypeValues.POLYLINE)
       return len(groups) >= 1
 
     # If SR contains SCOORD3D 
     elif (geometry_type == "point3D"):
-      groups = sr.content.get_planar_roi_measurement_groups(reference_type=codes.DCM.ImageRegion,graphic_type=hd.sr.GraphicTypeValues3D.POINT)
+      groups = index.getGroups(codes.DCM.ImageRegion, hd.sr.GraphicTypeValues3D.POINT)
       return len(groups) >= 1
     
     # If SR contains unknown geometry 
@@ -431,36 +562,45 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
 
     return False
   
-  def getIPPFromSOP(self, referenced_sop_instance_uid, referenced_series_instance_uid):
+  def getSeriesGeometry(self, referenced_series_instance_uid):
     """
-    In order to display the bounding box markups in Slicer, we need the IPP corresponding 
-    to the referenced SOPInstanceUID. We get this from the Slicer DICOM database. 
+    Returns a dictionary mapping every SOPInstanceUID of the series to its ImagePositionPatient,
+    ImageOrientationPatient, PixelSpacing, Rows and Columns. The index is built once per series
+    by reading the file headers only (pixel data is never loaded) and then reused for all lookups.
     """
 
-    import pydicom 
-
-    # Get the dicom database 
-    db = slicer.dicomDatabase 
-
-    # Get the files for the series 
-    fileList = db.filesForSeries(referenced_series_instance_uid)
-
-    # Use pydicom to read the files, get the SOPInstanceUID and the IPP for each 
-    num_files = len(fileList)
-    SOPInstanceUID_list = [] 
-    IPP_list = [] 
-    for file in fileList: 
-      ds = pydicom.dcmread(file)
-      SOPInstanceUID_list.append(ds.SOPInstanceUID)
-      IPP_list.append(ds.ImagePositionPatient)
+    try:
+      return self.seriesGeometry[referenced_series_instance_uid]
+    except KeyError:
+      pass
+
+    geometryTags = ["SOPInstanceUID", "ImagePositionPatient", "ImageOrientationPatient",
+                    "PixelSpacing", "Rows", "Columns"]
+
+    def toFloats(value):
+      return [float(v) for v in value] if value is not None else None
+
+    geometry = {}
+    for file in slicer.dicomDatabase.filesForSeries(referenced_series_instance_uid): 
+      ds = self.readDICOMHeader(file, geometryTags)
+      geometry[ds.SOPInstanceUID] = {
+        "ImagePositionPatient": toFloats(getattr(ds, "ImagePositionPatient", None)),
+        "ImageOrientationPatient": toFloats(getattr(ds, "ImageOrientationPatient", None)),
+        "PixelSpacing": toFloats(getattr(ds, "PixelSpacing", None)),
+        "Rows": getattr(ds, "Rows", None),
+        "Columns": getattr(ds, "Columns", None)
+      }
 
-    # Get the index of the SOPInstanceUID we want 
-    index = SOPInstanceUID_list.index(referenced_sop_instance_uid)
+    self.seriesGeometry[referenced_series_instance_uid] = geometry
+    return geometry
 
-    # Now get the IPP for the corresponding SOPInstanceUID 
-    ipp = IPP_list[index]
+  def getIPPFromSOP(self, referenced_sop_instance_uid, referenced_series_instance_uid):
+    """
+    In order to display the bounding box markups in Slicer, we need the IPP corresponding 
+    to the referenced SOPInstanceUID. We get this from the series geometry index. 
+    """
 
-    return ipp 
+    return self.getSeriesGeometry(referenced_series_instance_uid)[referenced_sop_instance_uid]["ImagePositionPatient"]
   
   def showTable(self, table):
     """
@@ -485,39 +625,17 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
     tableNode.SetAttribute("readonly", "Yes") 
     tableNode.SetName(table_name)
 
-    # Add columns 
-    col = tableNode.AddColumn()
-    col.SetName("Tracking Identifier")
-    col = tableNode.AddColumn()
-    col.SetName("FindingType")
-    col = tableNode.AddColumn()
-    col.SetName("FindingSite")
-    col = tableNode.AddColumn()
-    col.SetName("Bounding box points")
-
     # Order by IPP2 
     poly_infos = sorted(poly_infos, key=lambda x: x['center_z'])
 
-    for i,p in enumerate(poly_infos):
-      # get values 
-      tracking_identifier = p['TrackingIdentifier']
-      finding_type = p['FindingType']
-      finding_site = p['FindingSite'][0] # check this later. 
-      polyline = p['polyline']
-      polyline_str = ', '.join(f"({np.round(a,2)}, {np.round(b,2)})" for a, b in polyline)
-      width = np.round(p['width'],2)
-      height = np.round(p['height'],2)
-      center_x = np.round(p['center_x'],2)
-      center_y = np.round(p['center_y'],2)
-      center_z = np.round(p['center_z'],2)
-      center = list([str(center_x), str(center_y), str(center_z)])
-      # add tracking info and finding site info 
-      rowIndex = tableNode.AddEmptyRow()
-      tableNode.SetCellText(rowIndex, 0, tracking_identifier)
-      tableNode.SetCellText(rowIndex, 1, finding_type[2])
-      tableNode.SetCellText(rowIndex, 2, finding_site[2])
-      # add bbox points 
-      tableNode.SetCellText(rowIndex, 3, polyline_str)
+    builder = TableColumnsBuilder()
+    builder.addColumn("Tracking Identifier", [p['TrackingIdentifier'] for p in poly_infos])
+    builder.addColumn("FindingType", [p['FindingType'][2] for p in poly_infos])
+    builder.addColumn("FindingSite", [p['FindingSite'][0][2] for p in poly_infos]) # check this later. 
+    # add bbox points 
+    builder.addColumn("Bounding box points",
+                      [', '.join(f"({np.round(a,2)}, {np.round(b,2)})" for a, b in p['polyline']) for p in poly_infos])
+    builder.build(tableNode)
 
     return tableNode 
   
@@ -531,53 +649,23 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
     tableNode.SetAttribute("readonly", "Yes") 
     tableNode.SetName(table_name)
 
-    # Add columns 
-    col = tableNode.AddColumn()
-    col.SetName("Tracking Identifier")
-    col = tableNode.AddColumn()
-    col.SetName("FindingType")
-    col = tableNode.AddColumn()
-    col.SetName("FindingSite")
-    col = tableNode.AddColumn()
-    col.SetName("Point")
-
     # Order by IPP2 
     point_infos = sorted(point_infos, key=lambda x: x['point'][2])
 
-    for i,p in enumerate(point_infos):
-      # get values 
-      tracking_identifier = p['TrackingIdentifier']
-      tracking_uid = p['TrackingUID']
-      finding_type = p['FindingType']
-      finding_site = p['FindingSite'][0] # check this later. 
-      point = p["point"]
-      point = [str(np.round(f,2)) for f in point]
-      point_str = f"({', '.join(point)})"
-      content_sequence_names = p['ContentSequenceNames']
-      content_sequence_values = p['ContentSequenceValues']
-      # add tracking info and finding site info 
-      rowIndex = tableNode.AddEmptyRow()
-      tableNode.SetCellText(rowIndex, 0, tracking_identifier)
-      tableNode.SetCellText(rowIndex, 1, finding_type[2]) # CodeMeaning
-      tableNode.SetCellText(rowIndex, 2, finding_site[2]) # CodeMeaning
-      # add point
-      tableNode.SetCellText(rowIndex, 3, point_str) 
-      # now add the names CodeMeaning as the column name, and the values CodeMeaning as the actual value 
-      # first do for qualitative evaluations 
-      num_rows = 4
-      # then add for content sequence
-      # num_rows = num_rows + len(qual_eval_names)
-      for j, content_sequence_name in enumerate(content_sequence_names): 
-        rowIndexValue = num_rows + j
-        colName = str(content_sequence_name[2])
-        colValue = str(content_sequence_values[j][2])
-        # can't add column each time - if there is more than 1 point. 
-        # therefore, only add column when on first point_info. 
-        if (i==0):
-          col = tableNode.AddColumn() 
-          col.SetName(colName) 
-        tableNode.SetCellText(rowIndex, rowIndexValue, colValue) 
-
+    builder = TableColumnsBuilder()
+    builder.addColumn("Tracking Identifier", [p['TrackingIdentifier'] for p in point_infos])
+    builder.addColumn("FindingType", [p['FindingType'][2] for p in point_infos]) # CodeMeaning
+    builder.addColumn("FindingSite", [p['FindingSite'][0][2] for p in point_infos]) # CodeMeaning
+    # add point
+    builder.addColumn("Point", [f"({', '.join(str(np.round(f,2)) for f in p['point'])})" for p in point_infos])
+    # now add the names CodeMeaning as the column name, and the values CodeMeaning as the actual value 
+    # columns are defined by the content sequence of the first point
+    if point_infos:
+      for j, content_sequence_name in enumerate(point_infos[0]['ContentSequenceNames']):
+        values = [str(p['ContentSequenceValues'][j][2]) if j < len(p['ContentSequenceValues']) else ""
+                  for p in point_infos]
+        builder.addColumn(str(content_sequence_name[2]), values)
+    builder.build(tableNode)
 
     return tableNode 
   
@@ -590,32 +678,13 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
     tableNode.SetAttribute("readonly", "Yes") 
     tableNode.SetName(table_name)
 
-    # Add columns 
-    col = tableNode.AddColumn()
-    col.SetName("Tracking Identifier")
-    col = tableNode.AddColumn()
-    col.SetName("FindingType")
-    col = tableNode.AddColumn()
-    col.SetName("FindingSite")
-    col = tableNode.AddColumn()
-    col.SetName("PolyLine")
-
-    for i,p in enumerate(point_infos):
-      # get values 
-      tracking_identifier = p['TrackingIdentifier']
-      tracking_uid = p['TrackingUID']
-      finding_type = p['FindingType']
-      finding_site = p['FindingSite'][0] # check this later. 
-      polyline = p["polyline"]
-      polyline = [str(np.round(f,2)) for f in polyline]
-      polyline_str = f"({', '.join(polyline)})"
-      # add tracking info and finding site info 
-      rowIndex = tableNode.AddEmptyRow()
-      tableNode.SetCellText(rowIndex, 0, tracking_identifier)
-      tableNode.SetCellText(rowIndex, 1, finding_type[2]) # CodeMeaning
-      tableNode.SetCellText(rowIndex, 2, finding_site[2]) # CodeMeaning
-      # add polyline
-      tableNode.SetCellText(rowIndex, 3, polyline_str) 
+    builder = TableColumnsBuilder()
+    builder.addColumn("Tracking Identifier", [p['TrackingIdentifier'] for p in point_infos])
+    builder.addColumn("FindingType", [p['FindingType'][2] for p in point_infos]) # CodeMeaning
+    builder.addColumn("FindingSite", [p['FindingSite'][0][2] for p in point_infos]) # CodeMeaning
+    # add polyline
+    builder.addColumn("PolyLine", [f"({', '.join(str(np.round(f,2)) for f in p['polyline'])})" for p in point_infos])
+    builder.build(tableNode)
 
     return tableNode 
   
@@ -640,7 +709,7 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
     poly_infos = [] 
 
     # First get the planar roi measurement gorups 
-    groups = sr.content.get_planar_roi_measurement_groups()
+    groups = self.getSRContentIndex(sr).groups
 
     for group in groups: 
 
@@ -690,8 +759,8 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
                          "center_z": center_z
                         })
 
-      # create and display tableNode 
-      tableNode = self.createBboxTable(poly_infos, table_name)
+    # create and display tableNode 
+    tableNode = self.createBboxTable(poly_infos, table_name)
 
     return poly_infos, tableNode 
   
@@ -716,7 +785,7 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
     point_infos = [] 
 
     # First get the planar roi measurement groups 
-    groups = sr.content.get_planar_roi_measurement_groups(graphic_type=hd.sr.GraphicTypeValues3D.POINT,reference_type=codes.DCM.ImageRegion)
+    groups = self.getSRContentIndex(sr).getGroups(codes.DCM.ImageRegion, hd.sr.GraphicTypeValues3D.POINT)
   
     # Iterate through each group 
     for group in groups: 
@@ -794,10 +863,7 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
     line_infos = [] 
 
     # First get the planar roi measurement gorups 
-    groups = sr.content.get_planar_roi_measurement_groups(
-        reference_type=self.getSRCode("Image Region"),
-        graphic_type=hd.sr.GraphicTypeValues.POLYLINE, 
-      )  
+    groups = self.getSRContentIndex(sr).getGroups(self.getSRCode("Image Region"), hd.sr.GraphicTypeValues.POLYLINE)
 
     for group in groups: 
 
@@ -819,12 +885,12 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
       polyline = group.roi.value
       # get the points 
       num_points = np.int32(len(polyline))
+      pointz = self.getIPPFromSOP(referenced_sop_instance_uid,
+                                  referenced_series_instance_uid)[2] # mm space 
       point_line = [] 
       for n in range(0,num_points): 
         pointx = polyline[n,0] # pixel coord space
         pointy = polyline[n,1] # pixel coord space
-        pointz = self.getIPPFromSOP(referenced_sop_instance_uid,
-                                    referenced_series_instance_uid)[2] # mm space 
         point_line.append([pointx, pointy, pointz])
       # append to poly_infos
       line_infos.append({
@@ -926,14 +992,27 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
 
     # We need the pixel spacing, in order to convert the coordinates from pixel space to mm space
     referenced_series_instance_uid = str(sr.CurrentRequestedProcedureEvidenceSequence[0].ReferencedSeriesSequence[0].SeriesInstanceUID)
-    db = slicer.dicomDatabase
-    fileList = db.filesForSeries(referenced_series_instance_uid)
-    pixel_spacing = db.fileValue(fileList[0], self.tags["PixelSpacing"])
-    pixel_spacing_x = np.float32(pixel_spacing.split("\\")[0])
-    pixel_spacing_y = np.float32(pixel_spacing.split("\\")[1])
-    num_rows = np.float32(db.fileValue(fileList[0], self.tags["Rows"]))
-    num_columns = np.float32(db.fileValue(fileList[0], self.tags["Columns"]))
+    series_geometry = self.getSeriesGeometry(referenced_series_instance_uid)
+
+    # (node, center) of the created bounding boxes
+    bboxNodes = []
+    if self.bulkMarkupsDisplay:
+      slicer.mrmlScene.StartState(slicer.vtkMRMLScene.BatchProcessState)
+    try:
+      self._createBboxMarkups(loadable, poly_infos, series_geometry, bboxNodes)
+    finally:
+      if self.bulkMarkupsDisplay:
+        slicer.mrmlScene.EndState(slicer.vtkMRMLScene.BatchProcessState)
+
+    # Set the parent to the folder
+    for bboxNode, _ in bboxNodes:
+      shNode.SetItemParent(shNode.GetItemByDataNode(bboxNode), bboxFolderID)
+    if bboxNodes:
+      slicer.modules.markups.logic().JumpSlicesToLocation(*bboxNodes[0][1], True)
+
+    return 
 
+  def _createBboxMarkups(self, loadable, poly_infos, series_geometry, bboxNodes):
     for i,p in enumerate(poly_infos):
       # get values 
       polyline = p['polyline']
@@ -945,8 +1024,10 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
       center_z = p['center_z'] # in mm 
       # convert pixel coordinates to mm 
       referenced_sop_instance_uid = p['SOPInstanceUID']
-      ipp = self.getIPPFromSOP(referenced_sop_instance_uid, 
-                               referenced_series_instance_uid)
+      geometry = series_geometry[referenced_sop_instance_uid]
+      pixel_spacing_x = np.float32(geometry["PixelSpacing"][0])
+      pixel_spacing_y = np.float32(geometry["PixelSpacing"][1])
+      ipp = geometry["ImagePositionPatient"]
       ipp_0 = ipp[0] 
       ipp_1 = ipp[1] 
       center_x_mm = -((center_x * pixel_spacing_x) + ipp_0)
@@ -957,13 +1038,7 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
       bbox_name = tracking_identifier # for now 
       # create roi 
       bboxNode = self.create_2d_roi(loadable, center_ras, width_mm, height_mm, slice_normal=(0, 0, 1), thickness=0.01, bbox_name=bbox_name) 
-      markupItemID = shNode.GetItemByDataNode(bboxNode)
-      # Set the parent to the folder
-      shNode.SetItemParent(markupItemID, bboxFolderID)
-      if (i==0):
-        slicer.modules.markups.logic().JumpSlicesToLocation(center_x_mm, center_y_mm, center_z, True)
-
-    return 
+      bboxNodes.append((bboxNode, center_ras))
   
   
   def create_3d_point(self, loadable, point_index, point_x, point_y, point_z, point_text): 
@@ -1007,6 +1082,10 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
     # Now create the folder and set the name 
     pointsFolderID = shNode.CreateFolderItem(studyNode, str(SeriesNumber) + ': ' + SeriesDescription)
 
+    if self.bulkMarkupsDisplay:
+      self.displayPointMarkupsInOneNode(point_infos, str(SeriesNumber) + ': ' + SeriesDescription, pointsFolderID)
+      return
+
     for i,p in enumerate(point_infos):
       point_text = p['TrackingIdentifier']
       point_x = -p['point'][0]
@@ -1028,6 +1107,37 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
     
     return 
   
+  def displayPointMarkupsInOneNode(self, point_infos, name, folderID):
+    """
+    Displays all points as control points of a single markups node labeled with their tracking identifiers.
+    """
+
+    if not point_infos:
+      return
+
+    shNode = slicer.modules.subjecthierarchy.logic().GetSubjectHierarchyNode()
+    points = np.array([[-p['point'][0], -p['point'][1], p['point'][2]] for p in point_infos], dtype=np.float64)
+
+    pointsNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsFiducialNode", name)
+    pointsNode.CreateDefaultDisplayNodes()
+    pointsNode.SetLocked(False)
+    wasModified = pointsNode.StartModify()
+    slicer.util.updateMarkupsControlPointsFromArray(pointsNode, points)
+    for index, p in enumerate(point_infos):
+      pointsNode.SetNthControlPointLabel(index, p['TrackingIdentifier'])
+    # Make sure control points are locked and cannot be moved 
+    slicer.modules.markups.logic().SetAllControlPointsLocked(pointsNode, True)
+    pointsNode.EndModify(wasModified)
+
+    display_node = pointsNode.GetDisplayNode()
+    if (display_node):
+      display_node.SetHandlesInteractive(False)
+      display_node.SetGlyphScale(0.75)
+
+    shNode.SetItemParent(shNode.GetItemByDataNode(pointsNode), folderID)
+    # jump to the first point 
+    slicer.modules.markups.logic().JumpSlicesToLocation(*points[0], True)
+
   def displayLineMarkups(self, sr, loadable, line_infos):
     """
     Display the line markups. 
@@ -1049,14 +1159,29 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
     linesFolderID = shNode.CreateFolderItem(studyNode, str(SeriesNumber) + ': ' + SeriesDescription)
 
     # Get the referenced series instance uid 
-    # Needed for later getting the IPP 
+    # Needed for later getting the IPP and the pixel spacing 
     referenced_series_instance_uid = str(sr.CurrentRequestedProcedureEvidenceSequence[0].ReferencedSeriesSequence[0].SeriesInstanceUID)
-    db = slicer.dicomDatabase
-    fileList = db.filesForSeries(referenced_series_instance_uid)
-    pixel_spacing = db.fileValue(fileList[0], self.tags["PixelSpacing"])
-    pixel_spacing_x = np.float32(pixel_spacing.split("\\")[0])
-    pixel_spacing_y = np.float32(pixel_spacing.split("\\")[1])
+    series_geometry = self.getSeriesGeometry(referenced_series_instance_uid)
+
+    lineNodes = []
+    if self.bulkMarkupsDisplay:
+      slicer.mrmlScene.StartState(slicer.vtkMRMLScene.BatchProcessState)
+    try:
+      self._createLineMarkups(line_infos, series_geometry, lineNodes)
+    finally:
+      if self.bulkMarkupsDisplay:
+        slicer.mrmlScene.EndState(slicer.vtkMRMLScene.BatchProcessState)
+
+    # Add to subject hierarchy
+    for lineNode in lineNodes:
+      shNode.SetItemParent(shNode.GetItemByDataNode(lineNode), linesFolderID)
+    # jump to the first line 
+    if lineNodes and lineNodes[0].GetNumberOfControlPoints():
+      slicer.modules.markups.logic().JumpSlicesToLocation(*lineNodes[0].GetNthControlPointPosition(0), True)
+
+    return 
 
+  def _createLineMarkups(self, line_infos, series_geometry, lineNodes):
     # Create all the line nodes 
     for i,p in enumerate(line_infos):
       line_text = p['TrackingIdentifier']
@@ -1067,23 +1192,21 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
       lineNode.SetLocked(False)
       # get number of points 
       num_points = len(polyline)
+      # geometry of the referenced image, needed to convert pixel coordinates to mm 
+      geometry = series_geometry[p['SOPInstanceUID']]
+      pixel_spacing_x = np.float32(geometry["PixelSpacing"][0])
+      pixel_spacing_y = np.float32(geometry["PixelSpacing"][1])
+      ipp_0 = geometry["ImagePositionPatient"][0] 
+      ipp_1 = geometry["ImagePositionPatient"][1] 
       # add each as a control point 
       for n in range(0,num_points): 
         point_x = polyline[n][0] # pixel coord space 
         point_y = polyline[n][1] # pixel coord space
         # convert pixel coordinates to mm 
-        referenced_sop_instance_uid = p['SOPInstanceUID']
-        ipp = self.getIPPFromSOP(referenced_sop_instance_uid, 
-                                 referenced_series_instance_uid)
-        ipp_0 = ipp[0] 
-        ipp_1 = ipp[1] 
         point_x_mm = -((point_x * pixel_spacing_x) + ipp_0)
         point_y_mm = -((point_y * pixel_spacing_y) + ipp_1)
         point_z = polyline[n][2]
         lineNode.AddControlPoint(point_x_mm, point_y_mm, point_z)
-        # jump to the first line 
-        if (i==0 and n==0):
-          slicer.modules.markups.logic().JumpSlicesToLocation(point_x_mm, point_y_mm, point_z, True)
       # do not display the length measurement 
       lineNode.GetMeasurement('length').SetEnabled(False)
       # change size of glyph 
@@ -1095,22 +1218,22 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
 
       if (display_node):
         display_node.SetGlyphScale(0.75)
-      # Add to subject hierarchy
-      # Get the Subject Hierarchy item ID for the markup node
-      markupItemID = shNode.GetItemByDataNode(lineNode)
-      # Set the parent to the folder
-      shNode.SetItemParent(markupItemID, linesFolderID)
-
-    return 
+      lineNodes.append(lineNode)
   
   def load(self, loadable):
     """
     Loads the SR and checks for planar annotations. 
     """
 
-    import highdicom as hd
     logging.debug('DICOM SR TID1500 load()')
 
+    self.clearSRDocuments()
+    try:
+      return self._loadReports(loadable)
+    finally:
+      self.clearSRDocuments()
+
+  def _loadReports(self, loadable):
     logging.debug("before sorting: %s" % loadable.uids)
     sortedUIDs = self.sortReportsByDateTime(loadable.uids)
     logging.debug("after sorting: %s" % sortedUIDs)
@@ -1129,8 +1252,8 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
         logging.debug('Failed to get the filename from the DICOM database for ', uid)
         return False
       
-      # Read the SR once
-      sr = hd.sr.srread(srFileName)
+      # Read the SR once, it is shared with sorting and loadAdditionalMeasurements
+      sr = self.getSRDocument(srFileName)
         
       # Check if the plugin (tid1500reader) should be used or specialized highdicom code
       # to read the planar annotations 
@@ -1144,6 +1267,7 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
         tables = []
 
         for segSeriesInstanceUID in loadable.ReferencedSegmentationInstanceUIDs[uid]:
+          # loadables examined while creating the SR loadable are taken from the shared loadable registry
           segLoadables = segPlugin.examine([slicer.dicomDatabase.filesForSeries(segSeriesInstanceUID)])
           for segLoadable in segLoadables:
             if hasattr(segLoadable, "referencedSegInstanceUIDs"):
@@ -1153,38 +1277,22 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
             if hasattr(segLoadable, "referencedSeriesUID") and len(loadable.ReferencedRWVMSeriesInstanceUIDs) > 0:
               self.determineAndApplyRWVMToReferencedSeries(loadable, segLoadable)
 
-        self.tempDir = os.path.join(slicer.app.temporaryPath, "QIICR", "SR", self.currentDateTime, uid)
-        try:
-          os.makedirs(self.tempDir)
-        except OSError:
-          pass
-
-        outputFile = os.path.join(self.tempDir, uid+".json")
-
-        param = {
-          "inputSRFileName": srFileName,
-          "metaDataFileName": outputFile,
-          }
-
-        try:
-          tid1500reader = slicer.modules.tid1500reader
-        except AttributeError as exc:
-          logging.debug('Unable to find CLI module tid1500reader, unable to load SR TID1500 object: %s ' % str(exc))
-          self.cleanup()
-          return False
-
-        cliNode = slicer.cli.run(tid1500reader, None, param, wait_for_completion=True)
-        if cliNode.GetStatusString() != 'Completed':
-          logging.debug('tid1500reader did not complete successfully, unable to load DICOM SR TID1500')
-          self.cleanup()
-          return False
-
-        table = self.metadata2vtkTableNode(outputFile)
+        srMetadata = None
+        if self.useNativeReader:
+          try:
+            srMetadata = TID1500MeasurementReader(sr).getMetadata()
+          except Exception as exc:
+            logging.warning("Reading DICOM SR TID1500 in memory failed ({}), falling back to tid1500reader"
+                            .format(str(exc)))
+        if srMetadata is None:
+          srMetadata = self._readMetadataWithCLI(uid, srFileName)
+          if srMetadata is None:
+            return False
+
+        table = self.metadata2vtkTableNode(srMetadata)
         if table:
           self.addSeriesInSubjectHierarchy(loadable, table)
-          with open(outputFile, 'r') as srMetadataFile:
-            srMetadataJSON = json.loads(srMetadataFile.read())
-            table.SetName(srMetadataJSON["SeriesDescription"])
+          table.SetName(srMetadata["SeriesDescription"])
 
           # TODO: think about the following...
           if len(slicer.util.getNodesByClass('vtkMRMLSegmentationNode')) > 0:
@@ -1197,14 +1305,12 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
               table.SetAttribute("PriorReportUID", sortedUIDs[idx-1])
               tables[idx-1].SetAttribute("FollowUpReportUID", uid)
             table.SetAttribute("SOPInstanceUID", uid)
-            self.assignTrackingUniqueIdentifier(outputFile, segmentationNode)
+            self.assignTrackingUniqueIdentifier(srMetadata, segmentationNode)
 
         tables.append(table)
 
         self.loadAdditionalMeasurements(uid, loadable)
 
-        self.cleanup()
-
       ### If it does contains planar annotations - use highdicom code to read the SR ###
       else: 
 
@@ -1244,26 +1350,55 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
 
     return len(tables) > 0
 
+  def _readMetadataWithCLI(self, uid, srFileName):
+    """ Returns the measurement metadata of the SR written by the tid1500reader CLI or None on failure """
+    self.tempDir = os.path.join(slicer.app.temporaryPath, "QIICR", "SR", self.currentDateTime, uid)
+    try:
+      os.makedirs(self.tempDir)
+    except OSError:
+      pass
+
+    outputFile = os.path.join(self.tempDir, uid+".json")
+
+    param = {
+      "inputSRFileName": srFileName,
+      "metaDataFileName": outputFile,
+      }
+
+    try:
+      tid1500reader = slicer.modules.tid1500reader
+    except AttributeError as exc:
+      logging.debug('Unable to find CLI module tid1500reader, unable to load SR TID1500 object: %s ' % str(exc))
+      self.cleanup()
+      return None
+
+    cliNode = slicer.cli.run(tid1500reader, None, param, wait_for_completion=True)
+    if cliNode.GetStatusString() != 'Completed':
+      logging.debug('tid1500reader did not complete successfully, unable to load DICOM SR TID1500')
+      self.cleanup()
+      return None
+
+    with open(outputFile) as datafile:
+      data = json.load(datafile)
+    self.cleanup()
+    return data
+
   def getSegmentIDs(self, segmentationNode):
     segmentIDs = vtk.vtkStringArray()
     segmentation = segmentationNode.GetSegmentation()
     segmentation.GetSegmentIDs(segmentIDs)
     return [segmentIDs.GetValue(idx) for idx in range(segmentIDs.GetNumberOfValues())]
 
-  def assignTrackingUniqueIdentifier(self, metafile, segmentationNode):
-
-    with open(metafile) as datafile:
-      data = json.load(datafile)
-
-      segmentation = segmentationNode.GetSegmentation()
-      segments = [segmentation.GetSegment(segmentID) for segmentID in self.getSegmentIDs(segmentationNode)]
+  def assignTrackingUniqueIdentifier(self, data, segmentationNode):
+    segmentation = segmentationNode.GetSegmentation()
+    segments = [segmentation.GetSegment(segmentID) for segmentID in self.getSegmentIDs(segmentationNode)]
 
-      for idx, measurement in enumerate(data["Measurements"]):
-        tagName = "TrackingUniqueIdentifier"
-        trackingUID = measurement[tagName]
-        segment = segments[idx]
-        segment.SetTag(tagName, trackingUID)
-        logging.debug("Setting tag '{}' to {} for segment with name {}".format(tagName, trackingUID, segment.GetName()))
+    for idx, measurement in enumerate(data["Measurements"]):
+      tagName = "TrackingUniqueIdentifier"
+      trackingUID = measurement[tagName]
+      segment = segments[idx]
+      segment.SetTag(tagName, trackingUID)
+      logging.debug("Setting tag '{}' to {} for segment with name {}".format(tagName, trackingUID, segment.GetName()))
 
   def determineAndApplyRWVMToReferencedSeries(self, loadable, segLoadable):
     rwvmUID = loadable.ReferencedRWVMSeriesInstanceUIDs[0]
@@ -1275,7 +1410,7 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
       rwvmPlugin = slicer.modules.dicomPlugins["DICOMRWVMPlugin"]()
       rwvmFile = rwvmFiles[0]
       logging.debug("Reading RWVM from " + rwvmFile)
-      rwvmDataset = pydicom.dcmread(rwvmFile)
+      rwvmDataset = self.readDICOMHeader(rwvmFile, ["ReferencedSeriesSequence"])
       if hasattr(rwvmDataset, "ReferencedSeriesSequence"):
         if hasattr(rwvmDataset.ReferencedSeriesSequence[0], "SeriesInstanceUID"):
           if rwvmDataset.ReferencedSeriesSequence[0].SeriesInstanceUID == segLoadable.referencedSeriesUID:
@@ -1287,34 +1422,36 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
     else:
       logging.warning("RWVM is referenced from SR, but is not found in the DICOM database!")
 
-  def metadata2vtkTableNode(self, metafile):
-    with open(metafile) as datafile:
-      data = json.load(datafile)
-      if "Measurements" not in data:
-        # Invalid file, just return instead of throw an exception to allow loading
-        # other data.
-        return None
-
-      measurement = data["Measurements"][0]
+  def metadata2vtkTableNode(self, data):
+    """ Creates the measurements table from the metadata as read by TID1500MeasurementReader or tid1500reader """
+    if "Measurements" not in data:
+      # Invalid file, just return instead of throw an exception to allow loading
+      # other data.
+      return None
 
-      table = self.createAndConfigureTable()
+    # columns are defined by the measurement items of the first measurement
+    measurement = data["Measurements"][0]
 
-      tableWasModified = table.StartModify()
-      self.setupTableInformation(measurement, table)
-      self.addMeasurementsToTable(data, table)
-      table.EndModify(tableWasModified)
+    table = self.createAndConfigureTable()
+    self.addMeasurementsToTable(data, table, measurement)
 
-      slicer.app.applicationLogic().GetSelectionNode().SetReferenceActiveTableID(table.GetID())
-      slicer.app.applicationLogic().PropagateTableSelection()
+    slicer.app.applicationLogic().GetSelectionNode().SetReferenceActiveTableID(table.GetID())
+    slicer.app.applicationLogic().PropagateTableSelection()
     return table
 
-  def addMeasurementsToTable(self, data, table):
-    for measurement in data["Measurements"]:
-      name = measurement["TrackingIdentifier"]
-      rowIndex = table.AddEmptyRow()
-      table.SetCellText(rowIndex, 0, name)
-      for columnIndex, measurementItem in enumerate(measurement["measurementItems"]):
-        table.SetCellText(rowIndex, columnIndex + 1, measurementItem["value"])
+  def addMeasurementsToTable(self, data, table, measurement):
+    measurements = data["Measurements"]
+    builder = TableColumnsBuilder()
+    builder.addColumn("Tracking Identifier", [m["TrackingIdentifier"] for m in measurements])
+
+    infoItems = self.enumerateDuplicateNames(self.generateMeasurementInformation(measurement["measurementItems"]))
+
+    for columnIndex, info in enumerate(infoItems):
+      values = [m["measurementItems"][columnIndex]["value"] if columnIndex < len(m["measurementItems"]) else ""
+                for m in measurements]
+      builder.addColumn(info["name"], values, numeric=TableColumnsBuilder.isNumeric(values), longName=info["name"],
+                        unitLabel=info["unit"], description=info["description"])
+    builder.build(table)
 
   def createAndConfigureTable(self):
     table = slicer.vtkMRMLTableNode()
@@ -1324,53 +1461,11 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
     table.SetUseColumnNameAsColumnHeader(True)
     return table
 
-  def setupTableInformation(self, measurement, table):
-    col = table.AddColumn()
-    col.SetName("Tracking Identifier")
-
-    infoItems = self.enumerateDuplicateNames(self.generateMeasurementInformation(measurement["measurementItems"]))
-
-    for info in infoItems:
-      col = table.AddColumn()
-      col.SetName(info["name"])
-      table.SetColumnLongName(info["name"], info["name"])
-      table.SetColumnUnitLabel(info["name"], info["unit"])
-      table.SetColumnDescription(info["name"], info["description"])
-
   def generateMeasurementInformation(self, measurementItems):
-    infoItems = []
-    for measurementItem in measurementItems:
-
-      crntInfo = dict()
-
-      unit = measurementItem["units"]["CodeValue"]
-      crntInfo["unit"] = measurementItem["units"]["CodeMeaning"]
-
-      if "derivationModifier" in measurementItem.keys():
-        description = crntInfo["name"] = measurementItem["derivationModifier"]["CodeMeaning"]
-      else:
-        description = measurementItem["quantity"]["CodeMeaning"]
-
-      crntInfo["name"] = "%s [%s]" % (description, unit.replace("[", "").replace("]", ""))
-      crntInfo["description"] = description
-
-      infoItems.append(crntInfo)
-    return infoItems
+    return TID1500MeasurementReader.generateMeasurementInformation(measurementItems)
 
   def enumerateDuplicateNames(self, items):
-    names = [item["name"] for item in items]
-    counts = {k: v for k, v in Counter(names).items() if v > 1}
-    nameListCopy = names[:]
-
-    for i in reversed(range(len(names))):
-      item = names[i]
-      if item in counts and counts[item]:
-        nameListCopy[i] += " (%s)" % str(counts[item])
-        counts[item] -= 1
-
-    for idx, item in enumerate(nameListCopy):
-      items[idx]["name"] = item
-    return items
+    return TID1500MeasurementReader.enumerateDuplicateNames(items)
 
   def isConcept(self, item, coding):
     code = item.ConceptNameCodeSequence[0]
@@ -1381,9 +1476,8 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
     Loads length measements as annotation rulers
     TODO: need to generalize to other report contents
     """
-    import pydicom 
     srFilePath = slicer.dicomDatabase.fileForInstance(srUID)
-    sr = pydicom.dcmread(srFilePath)
+    sr = self.getSRDocument(srFilePath)
 
     if not self.isConcept(sr, "imagingMeasurementReport"):
       return sr
@@ -1439,12 +1533,13 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
       if not referenceFilePath:
         raise Exception(f"Referenced image is not found in the database (referencedSOPInstanceUID={measurement['referencedSOPInstanceUID']}). Polyline point positions cannot be determined in 3D.")
 
-      reference = pydicom.dcmread(referenceFilePath)
-      origin = numpy.array(reference.ImagePositionPatient)
-      alongColumnVector = numpy.array(reference.ImageOrientationPatient[:3])
-      alongRowVector = numpy.array(reference.ImageOrientationPatient[3:])
-      alongColumnVector *= reference.PixelSpacing[1]
-      alongRowVector *= reference.PixelSpacing[0]
+      referenceSeriesUID = slicer.dicomDatabase.seriesForFile(referenceFilePath)
+      reference = self.getSeriesGeometry(referenceSeriesUID)[measurement['referencedSOPInstanceUID']]
+      origin = numpy.array(reference["ImagePositionPatient"])
+      alongColumnVector = numpy.array(reference["ImageOrientationPatient"][:3])
+      alongRowVector = numpy.array(reference["ImageOrientationPatient"][3:])
+      alongColumnVector *= reference["PixelSpacing"][1]
+      alongRowVector *= reference["PixelSpacing"][0]
       col1,row1,col2,row2 = measurement['polyline']
       lpsToRAS = numpy.array([-1,-1,1])
       p1 = (origin + col1 * alongColumnVector + row1 * alongRowVector) * lpsToRAS
@@ -1454,22 +1549,25 @@ class DICOMTID1500PluginClass(DICOMPluginBase, ModuleLogicMixin):
 
 class DICOMLongitudinalTID1500PluginClass(DICOMTID1500PluginClass):
 
+  # related SRs are looked up in other studies of the patient
+  loadableCacheDependsOnDatabase = True
+
   def __init__(self):
     super(DICOMLongitudinalTID1500PluginClass, self).__init__()
     self.loadType = "Longitudinal DICOM Structured Report TID1500"
 
   def examineFiles(self, files):
-    import pydicom 
     loadables = []
 
     for cFile in files:
-      dataset = pydicom.dcmread(cFile)
+      dataset = self.readDICOMHeader(cFile, self.examineTags)
 
       uid = self.getDICOMValue(dataset, "SOPInstanceUID")
       if uid == "":
         return []
 
       if self.isDICOMTID1500(dataset):
+        dataset = self.getSRDocument(cFile)
         otherSRDatasets, otherSRFiles = self.getRelatedSRs(dataset)
 
         if len(otherSRFiles):
@@ -1490,27 +1588,22 @@ class DICOMLongitudinalTID1500PluginClass(DICOMTID1500PluginClass):
 
           logging.debug('DICOM SR Longitudinal TID1500 modality found')
 
+    self.clearSRDocuments()
     return loadables
 
   def getRelatedSRs(self, dataset):
-    import pydicom 
     otherSRFiles = []
     otherSRDatasets = []
     studyInstanceUID = self.getDICOMValue(dataset, "StudyInstanceUID")
     patient = slicer.dicomDatabase.patientForStudy(studyInstanceUID)
-    studies = [s for s in slicer.dicomDatabase.studiesForPatient(patient) if studyInstanceUID not in s]
-    for study in studies:
-      series = slicer.dicomDatabase.seriesForStudy(study)
-      foundSRs = []
-      for s in series:
-        srFile = self.fileForSeries(s)
-        tempDCM = pydicom.dcmread(srFile)
-        if self.isDICOMTID1500(tempDCM):
-          foundSRs.append(srFile)
-          otherSRDatasets.append(tempDCM)
-
+    studySRFiles = OrderedDict()
+    for report in self.getTID1500Reports(patient):
+      if report["StudyInstanceUID"] != studyInstanceUID:
+        studySRFiles.setdefault(report["StudyInstanceUID"], []).append(report["FileName"])
+    for foundSRs in studySRFiles.values():
       if len(foundSRs) > 1:
         logging.warn("Found more than one SR per study!! This is not supported right now")
+      otherSRDatasets += [self.getSRDocument(srFile) for srFile in foundSRs]
       otherSRFiles += foundSRs
     return otherSRDatasets, otherSRFiles
 
@@ -1519,6 +1612,86 @@ class DICOMLongitudinalTID1500PluginClass(DICOMTID1500PluginClass):
     return slicer.dicomDatabase.fileForInstance(instance[0])
 
 
+class TableColumnsBuilder(object):
+  """
+  Collects whole table columns and assigns them to a vtkMRMLTableNode within a single modification instead of
+  setting cells one by one. Numeric columns are stored as vtkDoubleArray, all others as vtkStringArray.
+  """
+
+  def __init__(self):
+    self.columns = []
+
+  @staticmethod
+  def isNumeric(values):
+    try:
+      numpy.asarray(values, dtype=numpy.float64)
+    except (TypeError, ValueError):
+      return False
+    return len(values) > 0
+
+  def addColumn(self, name, values, numeric=False, longName=None, unitLabel=None, description=None):
+    self.columns.append((name, values, numeric, longName, unitLabel, description))
+
+  def build(self, tableNode):
+    tableWasModified = tableNode.StartModify()
+    for name, values, numeric, longName, unitLabel, description in self.columns:
+      if numeric:
+        array = numpy_support.numpy_to_vtk(numpy.asarray(values, dtype=numpy.float64), deep=True,
+                                           array_type=vtk.VTK_DOUBLE)
+      else:
+        array = vtk.vtkStringArray()
+        array.SetNumberOfValues(len(values))
+        for index, value in enumerate(values):
+          array.SetValue(index, str(value))
+      array.SetName(name)
+      tableNode.AddColumn(array)
+      if longName is not None:
+        tableNode.SetColumnLongName(name, longName)
+      if unitLabel is not None:
+        tableNode.SetColumnUnitLabel(name, unitLabel)
+      if description is not None:
+        tableNode.SetColumnDescription(name, description)
+    tableNode.EndModify(tableWasModified)
+
+
+class SRContentIndex(object):
+  """
+  Planar ROI measurement groups of an SR document, collected with one pass over the content tree and bucketed
+  by reference type, graphic type and geometric purpose of region.
+  """
+
+  def __init__(self, sr, geometricPurposeCode, boundedByCode):
+    import highdicom as hd
+    from pydicom.sr.codedict import codes
+
+    imageRegion = self._getCodeKey(codes.DCM.ImageRegion)
+    self.groups = sr.content.get_planar_roi_measurement_groups()
+    self.groupsByReferenceType = {}
+    self.groupsByGraphicType = {}
+    # 2D polylines in an image region whose geometric purpose is "Bounded by"
+    self.boundingBoxGroups = []
+    for group in self.groups:
+      referenceType = self._getCodeKey(group.reference_type)
+      graphicType = group.roi.graphic_type if group.roi is not None else None
+      self.groupsByReferenceType.setdefault(referenceType, []).append(group)
+      self.groupsByGraphicType.setdefault((referenceType, graphicType), []).append(group)
+      if referenceType == imageRegion and graphicType == hd.sr.GraphicTypeValues.POLYLINE and \
+          any(evaluation.value == boundedByCode for evaluation in
+              group.get_qualitative_evaluations(name=geometricPurposeCode)):
+        self.boundingBoxGroups.append(group)
+
+  @staticmethod
+  def _getCodeKey(code):
+    return (code.value, code.scheme_designator) if code is not None else None
+
+  def getGroups(self, referenceType, graphicType=None):
+    """ Returns the groups of the given reference type and, if given, graphic type """
+    referenceType = self._getCodeKey(referenceType)
+    if graphicType is None:
+      return self.groupsByReferenceType.get(referenceType, [])
+    return self.groupsByGraphicType.get((referenceType, graphicType), [])
+
+
 class DICOMTID1500Plugin:
   """
   This class is the 'hook' for slicer to detect and recognize the plugin
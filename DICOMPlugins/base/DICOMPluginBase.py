@@ -1,8 +1,14 @@
+import os
+import json
+import hashlib
+import pathlib
+import sqlite3
 import slicer
 import pydicom
 import logging
+from collections import OrderedDict
 from datetime import datetime
-from DICOMLib import DICOMPlugin
+from DICOMLib import DICOMPlugin, DICOMLoadable
 import shutil
 
 
@@ -11,6 +17,47 @@ class DICOMPluginBase(DICOMPlugin):
   It would probably make sense to propose this common functionality to the Slicer core itself.
   """
 
+  # parsed headers shared by all plugin instances: (filePath, tags) -> (mtime, dataset)
+  headerCache = OrderedDict()
+  headerCacheSize = 10000
+
+  # memoized tag values shared by all plugin instances: (filePath, tag) -> value and (seriesUID, tag) -> value.
+  # Both are cleared once the DICOM database is modified, see _validateValueCaches
+  fileValueCache = OrderedDict()
+  seriesValueCache = OrderedDict()
+  valueCacheSize = 100000
+  valueCacheDatabaseMTime = None
+
+  # SOPInstanceUIDs shared by all plugin instances: seriesUID -> instanceUIDs. Cleared together with the value
+  # caches and bounded by seriesInstanceUIDCacheSize
+  seriesInstanceUIDCache = OrderedDict()
+  seriesInstanceUIDCacheSize = 10000
+
+  # loadables examined by any plugin instance: (plugin class name, files) -> (database mtime, loadables). Stale
+  # entries are purged on lookup and the least recently used ones beyond loadableRegistrySize are evicted
+  loadableRegistry = OrderedDict()
+  loadableRegistrySize = 1000
+
+  # tags which are stored as columns of the DICOM database and can be fetched for many files with one query
+  databaseColumns = {
+    "0008,0018": "Images.SOPInstanceUID",
+    "0020,000E": "Images.SeriesInstanceUID",
+    "0020,000D": "Series.StudyInstanceUID",
+    "0008,0060": "Series.Modality",
+    "0008,103E": "Series.SeriesDescription",
+    "0020,0011": "Series.SeriesNumber"
+  }
+  databaseQueryChunkSize = 500
+
+  # examine results persisted next to the DICOM database, keyed by plugin, file list, file size and mtime.
+  # Bump loadableCacheVersion whenever examineFiles changes the loadables it creates.
+  usePersistentLoadableCache = True
+  loadableCacheFileName = "QuantitativeReportingLoadables.sql"
+  loadableCacheVersion = 1
+  # loadables referencing other series depend on the database content and are re-examined once the set of series
+  # in the database changed. Plugins looking beyond the given files set this to do so for empty results too.
+  loadableCacheDependsOnDatabase = False
+
   @property
   def currentDateTime(self):
     try:
@@ -27,6 +74,196 @@ class DICOMPluginBase(DICOMPlugin):
     self.tags['classUID'] = "0008,0016"
     self.tempDir = None
 
+  @classmethod
+  def readDICOMHeader(cls, filePath, tags=None):
+    """ Returns the header of the given file as pydicom dataset. Parsing stops before the pixel data,
+    large values (e.g. encapsulated documents) are only read on access and, if a list of tag keywords
+    is given, only those tags are parsed. Headers are cached per file path and modification time.
+    The returned dataset is shared and must not be modified.
+    """
+    key = (filePath, tuple(tags) if tags else None)
+    mtime = os.path.getmtime(filePath)
+    try:
+      cachedMTime, dataset = cls.headerCache[key]
+      if cachedMTime == mtime:
+        cls.headerCache.move_to_end(key)
+        return dataset
+    except KeyError:
+      pass
+    dataset = pydicom.dcmread(filePath, stop_before_pixels=True, defer_size="64 KB", specific_tags=tags)
+    cls.headerCache[key] = (mtime, dataset)
+    if len(cls.headerCache) > cls.headerCacheSize:
+      cls.headerCache.popitem(last=False)
+    return dataset
+
+  @classmethod
+  def getFileValues(cls, files, tags):
+    """ Returns a dictionary {file: {tag: value}} for the given files and tags ("gggg,eeee"). Tags stored in the
+    DICOM database tables are fetched for all files at once, others fall back to slicer.dicomDatabase.fileValue.
+    Results are memoized.
+    """
+    cls._validateValueCaches()
+    normalizedTags = {tag: tag.upper() for tag in tags}
+    missingFiles = [f for f in files if any((f, tag) not in cls.fileValueCache for tag in normalizedTags.values())]
+    columnTags = [tag for tag in set(normalizedTags.values()) if tag in cls.databaseColumns]
+    if missingFiles and columnTags:
+      internalPaths = {cls._internalPathFromAbsolute(f): f for f in missingFiles}
+      rows = cls._queryDatabase([cls.databaseColumns[tag] for tag in columnTags], "Images.Filename",
+                                list(internalPaths.keys()))
+      for row in rows or []:
+        filePath = internalPaths.get(row[0])
+        if filePath is None:
+          continue
+        for tag, value in zip(columnTags, row[1:]):
+          cls.fileValueCache[(filePath, tag)] = "" if value is None else str(value)
+    values = {}
+    for f in files:
+      values[f] = {}
+      for tag, normalizedTag in normalizedTags.items():
+        if (f, normalizedTag) not in cls.fileValueCache:
+          cls.fileValueCache[(f, normalizedTag)] = slicer.dicomDatabase.fileValue(f, tag)
+        values[f][tag] = cls.fileValueCache[(f, normalizedTag)]
+    cls._trimValueCache(cls.fileValueCache)
+    return values
+
+  @classmethod
+  def getSeriesFileValues(cls, seriesInstanceUID, tags):
+    """ Same as getFileValues for all files of the given series """
+    return cls.getFileValues(slicer.dicomDatabase.filesForSeries(seriesInstanceUID), tags)
+
+  @classmethod
+  def getSeriesValues(cls, seriesInstanceUIDs, tags):
+    """ Returns a dictionary {seriesUID: {tag: value}} with the series level values of the given tags. Values are
+    fetched for all series at once if stored in the DICOM database tables, otherwise they are read from the first
+    file of each series. Results are memoized.
+    """
+    cls._validateValueCaches()
+    normalizedTags = {tag: tag.upper() for tag in tags}
+    missingSeries = [s for s in seriesInstanceUIDs
+                     if any((s, tag) not in cls.seriesValueCache for tag in normalizedTags.values())]
+    columnTags = [tag for tag in set(normalizedTags.values())
+                  if cls.databaseColumns.get(tag, "").startswith("Series.")]
+    if missingSeries and columnTags:
+      rows = cls._queryDatabase([cls.databaseColumns[tag] for tag in columnTags], "Series.SeriesInstanceUID",
+                                missingSeries, fromClause="Series")
+      for row in rows or []:
+        for tag, value in zip(columnTags, row[1:]):
+          cls.seriesValueCache[(row[0], tag)] = "" if value is None else str(value)
+    values = {}
+    for seriesInstanceUID in seriesInstanceUIDs:
+      values[seriesInstanceUID] = {}
+      for tag, normalizedTag in normalizedTags.items():
+        if (seriesInstanceUID, normalizedTag) not in cls.seriesValueCache:
+          files = slicer.dicomDatabase.filesForSeries(seriesInstanceUID)
+          cls.seriesValueCache[(seriesInstanceUID, normalizedTag)] = \
+            cls.getFileValues(files[:1], [tag])[files[0]][tag] if files else ""
+        values[seriesInstanceUID][tag] = cls.seriesValueCache[(seriesInstanceUID, normalizedTag)]
+    cls._trimValueCache(cls.seriesValueCache)
+    return values
+
+  @classmethod
+  def _validateValueCaches(cls):
+    """ Clears the memoized tag values if the DICOM database was modified since they were fetched, or always if
+    its modification time is unknown
+    """
+    databaseMTime = cls._getDatabaseModifiedTime()
+    if databaseMTime is None or databaseMTime != DICOMPluginBase.valueCacheDatabaseMTime:
+      cls.fileValueCache.clear()
+      cls.seriesValueCache.clear()
+      cls.seriesInstanceUIDCache.clear()
+      DICOMPluginBase.valueCacheDatabaseMTime = databaseMTime
+
+  @classmethod
+  def _trimValueCache(cls, cache):
+    while len(cache) > cls.valueCacheSize:
+      cache.popitem(last=False)
+
+  @classmethod
+  def getSeriesInstanceUIDs(cls, seriesInstanceUID):
+    """ Returns the SOPInstanceUIDs of the given series as listed in the DICOM database, without reading any file.
+    Results are shared by all plugins until the database is modified. The returned list must not be modified.
+    """
+    cls._validateValueCaches()
+    try:
+      cls.seriesInstanceUIDCache.move_to_end(seriesInstanceUID)
+      return cls.seriesInstanceUIDCache[seriesInstanceUID]
+    except KeyError:
+      pass
+    instanceUIDs = list(slicer.dicomDatabase.instancesForSeries(seriesInstanceUID))
+    cls.seriesInstanceUIDCache[seriesInstanceUID] = instanceUIDs
+    while len(cls.seriesInstanceUIDCache) > cls.seriesInstanceUIDCacheSize:
+      cls.seriesInstanceUIDCache.popitem(last=False)
+    return instanceUIDs
+
+  @classmethod
+  def _queryDatabase(cls, columns, keyColumn, keys, fromClause=None):
+    """ Selects keyColumn and columns for all rows whose keyColumn is one of keys, using one query per chunk of
+    databaseQueryChunkSize keys. Returns None if the DICOM database cannot be queried directly.
+    """
+    if fromClause is None:
+      fromClause = "Images LEFT JOIN Series ON Images.SeriesInstanceUID = Series.SeriesInstanceUID"
+    connection = cls._openDatabase()
+    if connection is None:
+      return None
+    rows = []
+    try:
+      for start in range(0, len(keys), cls.databaseQueryChunkSize):
+        chunk = keys[start:start + cls.databaseQueryChunkSize]
+        query = "SELECT {} FROM {} WHERE {} IN ({})".format(", ".join([keyColumn] + columns), fromClause, keyColumn,
+                                                            ", ".join("?" * len(chunk)))
+        rows += connection.execute(query, chunk).fetchall()
+    except sqlite3.Error as exc:
+      logging.debug("Bulk query of DICOM database failed: %s" % str(exc))
+      return None
+    finally:
+      connection.close()
+    return rows
+
+  @staticmethod
+  def _getDatabaseModifiedTime():
+    try:
+      return os.path.getmtime(slicer.dicomDatabase.databaseFilename)
+    except (OSError, TypeError):
+      return None
+
+  @staticmethod
+  def _openDatabase():
+    """ Returns a read-only connection to the DICOM database or None if it cannot be opened """
+    try:
+      databaseURI = pathlib.Path(slicer.dicomDatabase.databaseFilename).resolve().as_uri() + "?mode=ro"
+      return sqlite3.connect(databaseURI, uri=True)
+    except (ValueError, OSError, sqlite3.Error) as exc:
+      logging.debug("Cannot open DICOM database for bulk queries: %s" % str(exc))
+      return None
+
+  @classmethod
+  def _getDatabaseSeriesState(cls):
+    """ Returns a hash of the SeriesInstanceUIDs in the DICOM database, which changes whenever a series is added or
+    removed, or None if the database cannot be queried
+    """
+    connection = cls._openDatabase()
+    if connection is None:
+      return None
+    try:
+      seriesHash = hashlib.sha1()
+      for (seriesInstanceUID,) in connection.execute("SELECT SeriesInstanceUID FROM Series "
+                                                     "ORDER BY SeriesInstanceUID"):
+        seriesHash.update((seriesInstanceUID or "").encode("utf-8") + b"\n")
+      return seriesHash.hexdigest()
+    except sqlite3.Error as exc:
+      logging.debug("Listing series of DICOM database failed: %s" % str(exc))
+      return None
+    finally:
+      connection.close()
+
+  @staticmethod
+  def _internalPathFromAbsolute(filePath):
+    """ Files inside the database directory are stored with a '%/' prefix instead of the directory path """
+    databaseDirectory = slicer.dicomDatabase.databaseDirectory
+    if databaseDirectory and filePath.startswith(databaseDirectory + "/"):
+      return "%/" + filePath[len(databaseDirectory) + 1:]
+    return filePath
+
   def cleanup(self):
     if not self.tempDir:
       return
@@ -37,29 +274,143 @@ class DICOMPluginBase(DICOMPlugin):
     except OSError:
       pass
 
+  def getCachedLoadables(self, files):
+    """ Returns the loadables examined for the given files by any instance of this plugin since the last
+    modification of the DICOM database, e.g. SEG loadables examined for an SR are reused when the SR is loaded.
+    Returns None if the files were not examined yet.
+    """
+    key = (self.__class__.__name__, tuple(files))
+    try:
+      cachedMTime, loadables = self.loadableRegistry[key]
+    except KeyError:
+      return None
+    databaseMTime = self._getDatabaseModifiedTime()
+    if databaseMTime is None or cachedMTime != databaseMTime:
+      del self.loadableRegistry[key]
+      return None
+    self.loadableRegistry.move_to_end(key)
+    return loadables
+
+  def cacheLoadables(self, files, loadables):
+    key = (self.__class__.__name__, tuple(files))
+    self.loadableRegistry[key] = (self._getDatabaseModifiedTime(), loadables)
+    self.loadableRegistry.move_to_end(key)
+    while len(self.loadableRegistry) > self.loadableRegistrySize:
+      self.loadableRegistry.popitem(last=False)
+
   def examineForImport(self, fileLists):
     """ Returns a sorted list of DICOMLoadable instances
     corresponding to ways of interpreting the
     fileLists parameter (list of file lists).
     """
     loadables = []
+    persistentCache = self._openLoadableCache() if self.usePersistentLoadableCache else None
+    seriesState = self._getDatabaseSeriesState() if persistentCache else None
+    persistentHits = 0
+    # written at the end, so that no write lock is held on the cache while examining
+    newCacheEntries = []
     for files in fileLists:
       cachedLoadables = self.getCachedLoadables(files)
       if cachedLoadables is not None:
         logging.debug("%s : Using cached files" % self.__class__.__name__)
         loadables += cachedLoadables
+        continue
+      loadablesForFiles = self._getPersistentLoadables(persistentCache, files, seriesState) if persistentCache else None
+      if loadablesForFiles is not None:
+        persistentHits += 1
       else:
         logging.debug("%s : Caching files" % self.__class__.__name__)
         loadablesForFiles = self.examineFiles(files)
-        loadables += loadablesForFiles
-        self.cacheLoadables(files, loadablesForFiles)
+        if persistentCache:
+          newCacheEntries.append(self._getPersistentLoadablesEntry(files, seriesState, loadablesForFiles))
+      loadables += loadablesForFiles
+      self.cacheLoadables(files, loadablesForFiles)
+    if persistentCache:
+      try:
+        persistentCache.executemany("INSERT OR REPLACE INTO Loadables VALUES (?, ?, ?, ?, ?)",
+                                    [entry for entry in newCacheEntries if entry is not None])
+        persistentCache.commit()
+      except sqlite3.Error as exc:
+        logging.warning("%s : Updating the loadable cache failed: %s" % (self.__class__.__name__, str(exc)))
+      persistentCache.close()
+    if persistentCache and fileLists:
+      logging.debug("%s : %d of %d file lists loaded from the loadable cache (%.0f%% hit rate)"
+                   % (self.__class__.__name__, persistentHits, len(fileLists), 100. * persistentHits / len(fileLists)))
 
     return loadables
 
+  def _openLoadableCache(self):
+    """ Returns a connection to the loadable cache next to the DICOM database or None if it cannot be used """
+    databaseDirectory = slicer.dicomDatabase.databaseDirectory
+    if not databaseDirectory:
+      return None
+    try:
+      connection = sqlite3.connect(os.path.join(databaseDirectory, self.loadableCacheFileName), timeout=10)
+      columns = [row[1] for row in connection.execute("PRAGMA table_info(Loadables)")]
+      if columns and "SeriesState" not in columns:
+        # written by a version validating entries on the number of series only
+        connection.execute("DROP TABLE Loadables")
+      connection.execute("CREATE TABLE IF NOT EXISTS Loadables (Plugin TEXT, FilesHash TEXT, Signature TEXT, "
+                         "SeriesState TEXT, Loadables TEXT, PRIMARY KEY (Plugin, FilesHash))")
+      return connection
+    except sqlite3.Error as exc:
+      logging.debug("Cannot open loadable cache: %s" % str(exc))
+      return None
+
+  def _getLoadableCacheKey(self, files):
+    """ Returns the hash of the file list and the signature of plugin version, file sizes and modification times.
+    Returns (None, None) if a file cannot be accessed.
+    """
+    try:
+      stats = [os.stat(f) for f in files]
+    except OSError:
+      return None, None
+    key = hashlib.sha1("\n".join(files).encode("utf-8")).hexdigest()
+    signature = json.dumps([self.loadableCacheVersion] + [[s.st_size, s.st_mtime] for s in stats])
+    return key, hashlib.sha1(signature.encode("utf-8")).hexdigest()
+
+  def _getPersistentLoadables(self, connection, files, seriesState):
+    """ Returns the cached loadables for the given files or None if there is no valid cache entry """
+    key, signature = self._getLoadableCacheKey(files)
+    if key is None:
+      return None
+    try:
+      row = connection.execute("SELECT Signature, SeriesState, Loadables FROM Loadables WHERE Plugin = ? AND "
+                               "FilesHash = ?", (self.__class__.__name__, key)).fetchone()
+    except sqlite3.Error as exc:
+      logging.debug("Reading loadable cache failed: %s" % str(exc))
+      return None
+    if row is None or row[0] != signature:
+      return None
+    loadableAttributes = json.loads(row[2])
+    if (loadableAttributes or self.loadableCacheDependsOnDatabase) and (seriesState is None or row[1] != seriesState):
+      return None
+    loadables = []
+    for attributes in loadableAttributes:
+      loadable = DICOMLoadable()
+      for name, value in attributes.items():
+        setattr(loadable, name, value)
+      loadables.append(loadable)
+    return loadables
+
+  def _getPersistentLoadablesEntry(self, files, seriesState, loadables):
+    """ Returns the cache row storing the attributes of the given loadables or None if an attribute cannot be
+    serialized.
+    """
+    key, signature = self._getLoadableCacheKey(files)
+    if key is None:
+      return None
+    try:
+      serializedLoadables = json.dumps([vars(loadable) for loadable in loadables])
+    except (TypeError, ValueError) as exc:
+      logging.debug("%s : Loadables cannot be cached: %s" % (self.__class__.__name__, str(exc)))
+      return None
+    return self.__class__.__name__, key, signature, seriesState, serializedLoadables
+
   def addReferences(self, loadable):
     """Puts a list of the referenced UID into the loadable for use
     in the node if this is loaded."""
-    dcm = pydicom.dcmread(loadable.files[0])
+    dcm = self.readDICOMHeader(loadable.files[0], ["ReferencedSeriesSequence", "ReferencedImageSequence"])
     loadable.referencedInstanceUIDs = []
     self._addReferencedSeries(loadable, dcm)
     self._addReferencedImages(loadable, dcm)
@@ -68,10 +419,9 @@ class DICOMPluginBase(DICOMPlugin):
   def _addReferencedSeries(self, loadable, dcm):
     if hasattr(dcm, "ReferencedSeriesSequence"):
       if hasattr(dcm.ReferencedSeriesSequence[0], "SeriesInstanceUID"):
-        for f in slicer.dicomDatabase.filesForSeries(dcm.ReferencedSeriesSequence[0].SeriesInstanceUID):
-          refDCM = pydicom.dcmread(f)
-          loadable.referencedInstanceUIDs.append(refDCM.SOPInstanceUID)
-        loadable.referencedSeriesUID = dcm.ReferencedSeriesSequence[0].SeriesInstanceUID
+        referencedSeriesUID = dcm.ReferencedSeriesSequence[0].SeriesInstanceUID
+        loadable.referencedInstanceUIDs += self.getSeriesInstanceUIDs(referencedSeriesUID)
+        loadable.referencedSeriesUID = referencedSeriesUID
 
   def _addReferencedImages(self, loadable, dcm):
     if hasattr(dcm, "ReferencedImageSequence"):
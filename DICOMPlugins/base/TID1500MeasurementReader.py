@@ -0,0 +1,134 @@
+from collections import Counter
+
+
+class TID1500MeasurementReader(object):
+  """
+  Reads the volumetric ROI measurement groups of a TID1500 SR into the structure written by the tid1500reader
+  CLI, without spawning a process or writing files. Works on any pydicom dataset and does not depend on Slicer,
+  so it can also be used in worker processes.
+  """
+
+  codings = {
+    "imagingMeasurements": [("DCM", "126010")],
+    "measurementGroup": [("DCM", "125007")],
+    "trackingIdentifier": [("DCM", "112039")],
+    "trackingUniqueIdentifier": [("DCM", "112040")],
+    "referencedSegment": [("DCM", "121191")],
+    "sourceSeriesForSegmentation": [("DCM", "121232")],
+    "finding": [("DCM", "121071")],
+    "findingSite": [("SRT", "G-C0E3"), ("SCT", "363698007")],
+    "derivation": [("DCM", "121401")]
+  }
+
+  def __init__(self, dataset):
+    self.dataset = dataset
+
+  @staticmethod
+  def getCodeSequenceAsDict(codeSequence):
+    item = codeSequence[0]
+    return {
+      "CodeValue": str(getattr(item, "CodeValue", None) or getattr(item, "LongCodeValue", None) or
+                       getattr(item, "URNCodeValue", "")),
+      "CodingSchemeDesignator": str(getattr(item, "CodingSchemeDesignator", "")),
+      "CodeMeaning": str(getattr(item, "CodeMeaning", ""))
+    }
+
+  @staticmethod
+  def generateMeasurementInformation(measurementItems):
+    """ Returns name, unit and description of the table column for each of the given measurement items """
+    infoItems = []
+    for measurementItem in measurementItems:
+
+      crntInfo = dict()
+
+      unit = measurementItem["units"]["CodeValue"]
+      crntInfo["unit"] = measurementItem["units"]["CodeMeaning"]
+
+      if "derivationModifier" in measurementItem.keys():
+        description = crntInfo["name"] = measurementItem["derivationModifier"]["CodeMeaning"]
+      else:
+        description = measurementItem["quantity"]["CodeMeaning"]
+
+      crntInfo["name"] = "%s [%s]" % (description, unit.replace("[", "").replace("]", ""))
+      crntInfo["description"] = description
+
+      infoItems.append(crntInfo)
+    return infoItems
+
+  @staticmethod
+  def enumerateDuplicateNames(items):
+    names = [item["name"] for item in items]
+    counts = {k: v for k, v in Counter(names).items() if v > 1}
+    nameListCopy = names[:]
+
+    for i in reversed(range(len(names))):
+      item = names[i]
+      if item in counts and counts[item]:
+        nameListCopy[i] += " (%s)" % str(counts[item])
+        counts[item] -= 1
+
+    for idx, item in enumerate(nameListCopy):
+      items[idx]["name"] = item
+    return items
+
+  def getMetadata(self):
+    data = {
+      "SeriesDescription": str(getattr(self.dataset, "SeriesDescription", "")),
+      "SeriesNumber": str(getattr(self.dataset, "SeriesNumber", "")),
+      "InstanceNumber": str(getattr(self.dataset, "InstanceNumber", ""))
+    }
+    measurements = []
+    for item in getattr(self.dataset, "ContentSequence", []):
+      if self.isConcept(item, "imagingMeasurements"):
+        for group in getattr(item, "ContentSequence", []):
+          if self.isConcept(group, "measurementGroup"):
+            measurements.append(self.getMeasurement(group))
+    if measurements:
+      data["Measurements"] = measurements
+    return data
+
+  def getMeasurement(self, group):
+    measurement = {}
+    measurementItems = []
+    for item in getattr(group, "ContentSequence", []):
+      if item.ValueType == "NUM":
+        if getattr(item, "MeasuredValueSequence", None):
+          measurementItems.append(self.getMeasurementItem(item))
+      elif self.isConcept(item, "trackingIdentifier"):
+        measurement["TrackingIdentifier"] = str(item.TextValue)
+      elif self.isConcept(item, "trackingUniqueIdentifier"):
+        measurement["TrackingUniqueIdentifier"] = str(item.UID)
+      elif self.isConcept(item, "referencedSegment"):
+        reference = item.ReferencedSOPSequence[0]
+        measurement["segmentationSOPInstanceUID"] = str(reference.ReferencedSOPInstanceUID)
+        if hasattr(reference, "ReferencedSegmentNumber"):
+          measurement["ReferencedSegment"] = int(reference.ReferencedSegmentNumber)
+      elif self.isConcept(item, "sourceSeriesForSegmentation"):
+        measurement["SourceSeriesForImageSegmentation"] = str(item.UID)
+      elif self.isConcept(item, "finding"):
+        measurement["Finding"] = self.getCodeSequenceAsDict(item.ConceptCodeSequence)
+      elif self.isConcept(item, "findingSite"):
+        measurement["FindingSite"] = self.getCodeSequenceAsDict(item.ConceptCodeSequence)
+    measurement["measurementItems"] = measurementItems
+    return measurement
+
+  def getMeasurementItem(self, item):
+    measuredValue = item.MeasuredValueSequence[0]
+    measurementItem = {
+      "value": str(measuredValue.NumericValue),
+      "quantity": self.getCodeSequenceAsDict(item.ConceptNameCodeSequence),
+      "units": self.getCodeSequenceAsDict(measuredValue.MeasurementUnitsCodeSequence)
+    }
+    for modifier in getattr(item, "ContentSequence", []):
+      if self.isConcept(modifier, "derivation"):
+        measurementItem["derivationModifier"] = \
+          self.getCodeSequenceAsDict(modifier.ConceptCodeSequence)
+    return measurementItem
+
+  @classmethod
+  def isConcept(cls, item, coding):
+    try:
+      code = cls.getCodeSequenceAsDict(item.ConceptNameCodeSequence)
+    except (AttributeError, IndexError):
+      return False
+    return (code["CodingSchemeDesignator"], code["CodeValue"]) in cls.codings[coding]
@@ -104,6 +104,13 @@ class CustomSegmentEditorWidget(SegmentEditorWidget, ModuleWidgetMixin):
       return None
     return self.logic.calculateSegmentStatistics(self.segmentationNode, self.masterVolumeNode, visibleOnly, tableNode)
 
+  def calculateSegmentStatisticsInBackground(self, tableNode, visibleOnly, onFinished):
+    if not self.segmentationNode or not self.masterVolumeNode:
+      onFinished(None)
+      return
+    self.logic.calculateSegmentStatisticsInBackground(self.segmentationNode, self.masterVolumeNode, visibleOnly,
+                                                      tableNode, onFinished)
+
   def hiddenSegmentsAvailable(self):
     return len(self.logic.getAllSegments(self.segmentationNode)) \
            != len(self.logic.getVisibleSegments(self.segmentationNode))
@@ -170,12 +177,23 @@ class CustomSegmentEditorLogic(ScriptedLoadableModuleLogic):
     labelNode.SetAndObserveImageData(thresh.GetOutput())
 
   def calculateSegmentStatistics(self, segNode, grayscaleNode, visibleSegmentsOnly, tableNode=None):
+    self._setStatisticsParameters(segNode, grayscaleNode, visibleSegmentsOnly)
+    updatedSegmentIDs = self.segmentStatisticsLogic.updateStatistics()
+    tableNode = self.segmentStatisticsLogic.exportToTable(tableNode, segmentIDs=updatedSegmentIDs)
+    return tableNode
+
+  def calculateSegmentStatisticsInBackground(self, segNode, grayscaleNode, visibleSegmentsOnly, tableNode, onFinished):
+    self._setStatisticsParameters(segNode, grayscaleNode, visibleSegmentsOnly)
+
+    def onStatisticsUpdated(updatedSegmentIDs):
+      onFinished(self.segmentStatisticsLogic.exportToTable(tableNode, segmentIDs=updatedSegmentIDs))
+
+    self.segmentStatisticsLogic.updateStatisticsInBackground(onStatisticsUpdated)
+
+  def _setStatisticsParameters(self, segNode, grayscaleNode, visibleSegmentsOnly):
     self.segmentStatisticsLogic.getParameterNode().SetParameter("visibleSegmentsOnly", str(visibleSegmentsOnly))
     self.segmentStatisticsLogic.getParameterNode().SetParameter("Segmentation", segNode.GetID())
     if grayscaleNode:
       self.segmentStatisticsLogic.getParameterNode().SetParameter("ScalarVolume", grayscaleNode.GetID())
     else:
       self.segmentStatisticsLogic.getParameterNode().UnsetParameter("ScalarVolume")
-    self.segmentStatisticsLogic.computeStatistics()
-    tableNode = self.segmentStatisticsLogic.exportToTable(tableNode)
-    return tableNode
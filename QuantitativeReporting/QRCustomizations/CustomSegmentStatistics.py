@@ -1,12 +1,16 @@
 from __future__ import absolute_import
 import logging
+import threading
+import time
 import slicer
 import qt
+import vtk
+import vtkSegmentationCorePython as vtkSegmentationCore
 
 from SlicerDevelopmentToolboxUtils.mixins import ModuleLogicMixin
 from SegmentStatistics import SegmentStatisticsLogic, SegmentStatisticsParameterEditorDialog
-from SegmentStatisticsPlugins import LabelmapSegmentStatisticsPlugin
-from DICOMSegmentationPlugin import DICOMSegmentationExporter
+from SegmentStatisticsPlugins import LabelmapSegmentStatisticsPlugin, ScalarVolumeSegmentStatisticsPlugin
+from DICOMSegmentationPlugin import DICOMSegmentationExporter, SegmentExtentAnalyzer
 
 
 class CustomSegmentStatisticsParameterEditorDialog(SegmentStatisticsParameterEditorDialog):
@@ -20,6 +24,96 @@ class CustomSegmentStatisticsParameterEditorDialog(SegmentStatisticsParameterEdi
     self.setup()
 
 
+class GroupedSegmentStatistics(object):
+  """ Computes the scalar volume statistics of all segments of a labelmap layer at once, using grouped numpy
+  reductions over the segmented voxels instead of extracting a mask per segment. Keys and values are the ones of the
+  ScalarVolumeSegmentStatisticsPlugin.
+  """
+
+  supportedKeys = ["voxel_count", "volume_mm3", "volume_cm3", "min", "max", "mean", "median", "stdev"]
+
+  @staticmethod
+  def compute(scalarArray, labelArray, labelValues, voxelVolume, keys):
+    """ Returns {segmentID: {key: value}} for labelValues given as {segmentID: labelValue}
+    """
+    import numpy
+    segmentIDs = list(labelValues.keys())
+    numberOfSegments = len(segmentIDs)
+    voxelIndices, groups, counts = SegmentExtentAnalyzer.groupVoxels(labelArray, labelValues)
+
+    columns = {}
+    if any(key in keys for key in ["min", "max", "mean", "median", "stdev"]):
+      values = scalarArray.reshape(-1)[voxelIndices].astype(numpy.float64)
+      nonEmpty = counts > 0
+      safeCounts = numpy.maximum(counts, 1)
+      means = numpy.bincount(groups, weights=values, minlength=numberOfSegments) / safeCounts
+      columns["mean"] = numpy.where(nonEmpty, means, 0)
+      if "stdev" in keys:
+        # sample standard deviation (N-1) as computed by vtkImageAccumulate, 0 for a single voxel
+        squaredDeviations = (values - means[groups]) ** 2
+        sumsOfSquares = numpy.bincount(groups, weights=squaredDeviations, minlength=numberOfSegments)
+        columns["stdev"] = numpy.where(counts > 1, numpy.sqrt(sumsOfSquares / numpy.maximum(counts - 1, 1)), 0)
+      if any(key in keys for key in ["min", "max", "median"]):
+        # sorted by segment first and by value second, so that each segment is a contiguous sorted run
+        sortedValues = values[numpy.lexsort((values, groups))] if values.size else values
+        starts = numpy.cumsum(counts) - counts
+        ends = starts + numpy.maximum(counts - 1, 0)
+        if sortedValues.size:
+          lastIndex = sortedValues.size - 1
+          columns["min"] = numpy.where(nonEmpty, sortedValues[numpy.minimum(starts, lastIndex)], 0)
+          columns["max"] = numpy.where(nonEmpty, sortedValues[numpy.minimum(ends, lastIndex)], 0)
+          lowerMedian = sortedValues[numpy.minimum(starts + (safeCounts - 1) // 2, lastIndex)]
+          upperMedian = sortedValues[numpy.minimum(starts + safeCounts // 2, lastIndex)]
+          columns["median"] = numpy.where(nonEmpty, (lowerMedian + upperMedian) / 2., 0)
+        else:
+          columns["min"] = columns["max"] = columns["median"] = numpy.zeros(numberOfSegments)
+
+    results = {}
+    for index, segmentID in enumerate(segmentIDs):
+      stats = {}
+      for key in keys:
+        if key == "voxel_count":
+          stats[key] = int(counts[index])
+        elif key == "volume_mm3":
+          stats[key] = counts[index] * voxelVolume
+        elif key == "volume_cm3":
+          stats[key] = counts[index] * voxelVolume / 1000.
+        elif key in columns:
+          stats[key] = float(columns[key][index])
+      results[segmentID] = stats
+    return results
+
+
+class SegmentStatisticsJob(threading.Thread):
+  """ Computes scalar volume statistics of segments from numpy snapshots of the labelmap layers and the scalar volume
+  regions they cover in a worker thread. layers are given as (scalarArray, labelArray, {segmentID: labelValue}).
+  Results are stored in results as {segmentID: {key: value}}.
+  """
+
+  def __init__(self, layers, voxelVolume, keys):
+    threading.Thread.__init__(self)
+    self.daemon = True
+    self.layers = layers
+    self.voxelVolume = voxelVolume
+    self.keys = keys
+    self.results = {}
+    self.error = None
+    self.cancelled = threading.Event()
+
+  def cancel(self):
+    self.cancelled.set()
+
+  def run(self):
+    try:
+      for scalarArray, array, labelValues in self.layers:
+        if self.cancelled.is_set():
+          return
+        self.results.update(GroupedSegmentStatistics.compute(scalarArray, array, labelValues,
+                                                             self.voxelVolume, self.keys))
+    except Exception as exc:
+      self.error = exc
+
+
 class CustomSegmentStatisticsLogic(SegmentStatisticsLogic):
 
   @staticmethod
@@ -28,6 +122,9 @@ class CustomSegmentStatisticsLogic(SegmentStatisticsLogic):
             'CodingSchemeDesignator': codingSchemeDesignator,
             'CodeMeaning': codeMeaning}
 
+  # parsed measurement codes by their stringified representation
+  codeSequenceCache = {}
+
   @property
   def statistics(self):
     return self.getStatistics()
@@ -37,20 +134,292 @@ class CustomSegmentStatisticsLogic(SegmentStatisticsLogic):
     return slicer.mrmlScene.GetNodeByID(self.getParameterNode().GetParameter("Segmentation"))
 
   def __init__(self):
+    self.modifiedSegmentIDs = set()
+    self.statisticsInputs = None
+    self.tableLayout = None
+    self.backgroundJob = None
+    self.backgroundTimer = qt.QTimer()
+    self.backgroundTimer.setInterval(50)
+    self.backgroundTimer.timeout.connect(self._onBackgroundTimerTimeout)
+    # seconds from requesting a background update until its results were applied and the time the main thread
+    # was blocked by it
+    self.lastUpdateLatency = None
+    self.lastMainThreadDuration = None
     SegmentStatisticsLogic.__init__(self)
     self.plugins = [p for p in self.plugins if not isinstance(p,LabelmapSegmentStatisticsPlugin)]
     self.reset()
     self.terminologyLogic = slicer.modules.terminologies.logic()
 
-  def exportToTable(self, table=None, nonEmptyKeysOnly=True):
+  def reset(self):
+    SegmentStatisticsLogic.reset(self)
+    # labelmap MTime of each segment at the time its statistics were computed
+    self.labelmapModifiedTimes = {}
+
+  def setSegmentModified(self, segmentID):
+    """ Marks the segment for being recomputed by the next call of updateStatistics
+    """
+    self.modifiedSegmentIDs.add(segmentID)
+
+  def updateStatistics(self):
+    """ Computes statistics for new segments and for segments which were marked as modified and whose labelmap
+    changed since their statistics were computed. All statistics are recomputed if the segmentation, scalar volume
+    or parameters changed.
+
+    Returns the IDs of the updated segments or None if all statistics were recomputed.
+    """
+    self.cancelBackgroundUpdate()
+    statisticsInputs = self._getStatisticsInputs()
+    if statisticsInputs != self.statisticsInputs:
+      self.computeStatistics()
+      self.statisticsInputs = statisticsInputs
+      self.modifiedSegmentIDs.clear()
+      return None
+
+    segmentIDsToCompute, renamedSegmentIDs = self._getSegmentIDsToUpdate()
+    self._computeStatisticsForSegments(segmentIDsToCompute)
+    return segmentIDsToCompute + renamedSegmentIDs
+
+  def computeStatistics(self):
+    """ Computes statistics of all (visible) segments. Scalar volume statistics are computed for all segments of a
+    labelmap layer at once.
+    """
+    self.reset()
+    segmentIDs = self._getSegmentIDsForStatistics()
+    self.statistics["SegmentIDs"] = list(segmentIDs)
+    self._computeStatisticsForSegments(segmentIDs)
+
+  def _computeStatisticsForSegments(self, segmentIDs):
+    scalarVolumePlugin, scalarVolumeNode, requestedKeys = self._getGroupedStatisticsInputs()
+    otherPlugins = [plugin for plugin in self._getEnabledPlugins() if plugin is not scalarVolumePlugin]
+    for segmentID in segmentIDs:
+      self.labelmapModifiedTimes[segmentID] = self._getLabelmapModifiedTime(segmentID)
+      self._updateStatisticsForSegmentWithPlugins(segmentID, otherPlugins)
+    if not segmentIDs or not requestedKeys:
+      return
+    scalarArray = slicer.util.arrayFromVolume(scalarVolumeNode)
+    voxelVolume = self._getVoxelVolume(scalarVolumeNode)
+    results = {}
+    for array, labelValues, extent in DICOMSegmentationExporter.getCroppedLabelmapLayerArrays(self.segmentationNode,
+                                                                                            segmentIDs,
+                                                                                            scalarVolumeNode):
+      results.update(GroupedSegmentStatistics.compute(SegmentExtentAnalyzer.cropArray(scalarArray, extent), array,
+                                                      labelValues, voxelVolume, requestedKeys))
+    self._applyScalarVolumeStatistics(scalarVolumePlugin, results)
+
+  def _getGroupedStatisticsInputs(self):
+    """ Returns the scalar volume plugin, scalar volume and requested keys if the scalar volume plugin is enabled and
+    its statistics can be computed by GroupedSegmentStatistics, otherwise the plugin is None and, if enabled, gets
+    applied per segment
+    """
+    scalarVolumePlugin = self._getScalarVolumePlugin()
+    scalarVolumeNode = slicer.mrmlScene.GetNodeByID(self.getParameterNode().GetParameter("ScalarVolume"))
+    if not scalarVolumePlugin or not scalarVolumeNode:
+      return None, None, []
+    requestedKeys = scalarVolumePlugin.getRequestedKeys()
+    if not set(requestedKeys).issubset(GroupedSegmentStatistics.supportedKeys):
+      return None, None, []
+    return scalarVolumePlugin, scalarVolumeNode, requestedKeys
+
+  @staticmethod
+  def _getVoxelVolume(volumeNode):
+    spacing = volumeNode.GetSpacing()
+    return spacing[0] * spacing[1] * spacing[2]
+
+  def _applyScalarVolumeStatistics(self, scalarVolumePlugin, results):
+    for segmentID, stats in results.items():
+      for key, value in stats.items():
+        self.statistics[segmentID, scalarVolumePlugin.toLongKey(key)] = value
+        self.statistics["MeasurementInfo"][scalarVolumePlugin.toLongKey(key)] = scalarVolumePlugin.getMeasurementInfo(key)
+
+  def _getSegmentIDsToUpdate(self):
+    """ Returns the segments whose statistics need to be computed and the ones which were only renamed. Names of
+    renamed segments are updated, segments which are no longer part of the statistics are dropped.
+    """
+    segmentIDs = self._getSegmentIDsForStatistics()
+    segmentation = self.segmentationNode.GetSegmentation()
+    segmentIDsToCompute = []
+    renamedSegmentIDs = []
+    for segmentID in segmentIDs:
+      if segmentID not in self.labelmapModifiedTimes or (segmentID in self.modifiedSegmentIDs and
+          self.labelmapModifiedTimes[segmentID] != self._getLabelmapModifiedTime(segmentID)):
+        segmentIDsToCompute.append(segmentID)
+      elif self.statistics[segmentID, "Segment"] != segmentation.GetSegment(segmentID).GetName():
+        self.statistics[segmentID, "Segment"] = segmentation.GetSegment(segmentID).GetName()
+        renamedSegmentIDs.append(segmentID)
+    for segmentID in set(self.labelmapModifiedTimes) - set(segmentIDs):
+      del self.labelmapModifiedTimes[segmentID]
+    self.statistics["SegmentIDs"] = segmentIDs
+    self.modifiedSegmentIDs.clear()
+    return segmentIDsToCompute, renamedSegmentIDs
+
+  def updateStatisticsInBackground(self, onFinished):
+    """ Same as updateStatistics, but the scalar volume statistics are computed from a snapshot of the labelmaps in
+    a worker thread. onFinished is called on the main thread with the IDs of the updated segments (None if all
+    statistics were recomputed) once the results are available. A job which is still running gets cancelled.
+    """
+    self.cancelBackgroundUpdate()
+    requestTime = time.time()
+    statisticsInputs = self._getStatisticsInputs()
+    if statisticsInputs != self.statisticsInputs:
+      self.reset()
+      self.statisticsInputs = statisticsInputs
+      self.modifiedSegmentIDs.clear()
+      segmentIDsToCompute, updatedSegmentIDs = self._getSegmentIDsForStatistics(), None
+      self.statistics["SegmentIDs"] = list(segmentIDsToCompute)
+    else:
+      segmentIDsToCompute, renamedSegmentIDs = self._getSegmentIDsToUpdate()
+      updatedSegmentIDs = segmentIDsToCompute + renamedSegmentIDs
+
+    scalarVolumePlugin, scalarVolumeNode, requestedKeys = self._getGroupedStatisticsInputs()
+    otherPlugins = [plugin for plugin in self._getEnabledPlugins() if plugin is not scalarVolumePlugin]
+    labelmapModifiedTimes = {}
+    for segmentID in segmentIDsToCompute:
+      labelmapModifiedTimes[segmentID] = self._getLabelmapModifiedTime(segmentID)
+      self._updateStatisticsForSegmentWithPlugins(segmentID, otherPlugins)
+
+    if not segmentIDsToCompute or not requestedKeys:
+      self.labelmapModifiedTimes.update(labelmapModifiedTimes)
+      onFinished(updatedSegmentIDs)
+      return
+
+    # the arrays may share memory with the scene, which could be modified while the job is running, only the
+    # regions covered by the segments are copied
+    scalarArray = slicer.util.arrayFromVolume(scalarVolumeNode)
+    layers = [(SegmentExtentAnalyzer.cropArray(scalarArray, extent).copy(), array.copy(), labelValues)
+              for array, labelValues, extent in
+              DICOMSegmentationExporter.getCroppedLabelmapLayerArrays(self.segmentationNode, segmentIDsToCompute,
+                                                                      scalarVolumeNode)]
+    job = SegmentStatisticsJob(layers, self._getVoxelVolume(scalarVolumeNode), requestedKeys)
+    job.scalarVolumePlugin = scalarVolumePlugin
+    job.requestTime = requestTime
+    job.fullUpdate = updatedSegmentIDs is None
+    job.updatedSegmentIDs = updatedSegmentIDs
+    job.labelmapModifiedTimes = labelmapModifiedTimes
+    job.onFinished = onFinished
+    job.mainThreadDuration = time.time() - requestTime
+    self.backgroundJob = job
+    job.start()
+    self.backgroundTimer.start()
+
+  def cancelBackgroundUpdate(self):
+    """ Cancels a running background job. Its segments get computed by the next update.
+    """
+    job = self.backgroundJob
+    if job is None:
+      return
+    self.backgroundJob = None
+    self.backgroundTimer.stop()
+    job.cancel()
+    if job.fullUpdate:
+      self.statisticsInputs = None
+    self.modifiedSegmentIDs.update(job.labelmapModifiedTimes.keys())
+    for segmentID in job.labelmapModifiedTimes.keys():
+      self.labelmapModifiedTimes.pop(segmentID, None)
+
+  def _onBackgroundTimerTimeout(self):
+    job = self.backgroundJob
+    if job is None:
+      self.backgroundTimer.stop()
+      return
+    if job.is_alive():
+      return
+    self.backgroundJob = None
+    self.backgroundTimer.stop()
+    applyStartTime = time.time()
+    if job.error is not None:
+      logging.error("Computing segment statistics in background failed, recomputing them: {}".format(job.error))
+      self.statisticsInputs = None
+      self.updateStatistics()
+      job.onFinished(None)
+      return
+
+    # segments may have been removed while the job was running
+    segmentation = self.segmentationNode.GetSegmentation()
+    results = {segmentID: stats for segmentID, stats in job.results.items()
+               if segmentID in self.statistics["SegmentIDs"] and segmentation.GetSegment(segmentID)}
+    self._applyScalarVolumeStatistics(job.scalarVolumePlugin, results)
+    self.labelmapModifiedTimes.update(job.labelmapModifiedTimes)
+    job.onFinished(job.updatedSegmentIDs)
+
+    self.lastUpdateLatency = time.time() - job.requestTime
+    self.lastMainThreadDuration = job.mainThreadDuration + time.time() - applyStartTime
+    logging.debug("Segment statistics updated in background for {} segments: latency {:.3f}s, main thread {:.3f}s"
+                  .format(len(results), self.lastUpdateLatency, self.lastMainThreadDuration))
+
+  def _getEnabledPlugins(self):
+    """ Returns the plugins which are enabled by their <PluginName>.enabled parameter """
+    parameterNode = self.getParameterNode()
+    return [plugin for plugin in self.plugins if parameterNode.GetParameter(plugin.toLongKey("enabled")) == "True"]
+
+  def _getScalarVolumePlugin(self):
+    for plugin in self._getEnabledPlugins():
+      if isinstance(plugin, ScalarVolumeSegmentStatisticsPlugin):
+        return plugin
+    return None
+
+  def _updateStatisticsForSegmentWithPlugins(self, segmentID, plugins):
+    segment = self.segmentationNode.GetSegmentation().GetSegment(segmentID)
+    if segmentID not in self.statistics["SegmentIDs"]:
+      self.statistics["SegmentIDs"].append(segmentID)
+    self.statistics[segmentID, "Segment"] = segment.GetName()
+    for plugin in plugins:
+      stats = plugin.computeStatistics(segmentID)
+      for key in stats:
+        self.statistics[segmentID, plugin.toLongKey(key)] = stats[key]
+        self.statistics["MeasurementInfo"][plugin.toLongKey(key)] = plugin.getMeasurementInfo(key)
+
+  def _getStatisticsInputs(self):
+    parameterNode = self.getParameterNode()
+    parameters = tuple((name, parameterNode.GetParameter(name)) for name in parameterNode.GetParameterNames())
+    scalarVolumeNode = slicer.mrmlScene.GetNodeByID(parameterNode.GetParameter("ScalarVolume"))
+    imageData = scalarVolumeNode.GetImageData() if scalarVolumeNode else None
+    return parameters, imageData.GetMTime() if imageData else None
+
+  def _getSegmentIDsForStatistics(self):
+    segmentIDs = vtk.vtkStringArray()
+    if self.getParameterNode().GetParameter("visibleSegmentsOnly") == "True":
+      self.segmentationNode.GetDisplayNode().GetVisibleSegmentIDs(segmentIDs)
+    else:
+      self.segmentationNode.GetSegmentation().GetSegmentIDs(segmentIDs)
+    return [segmentIDs.GetValue(idx) for idx in range(segmentIDs.GetNumberOfValues())]
+
+  def _getLabelmapModifiedTime(self, segmentID):
+    segment = self.segmentationNode.GetSegmentation().GetSegment(segmentID)
+    labelmap = segment.GetRepresentation(
+      vtkSegmentationCore.vtkSegmentationConverter.GetSegmentationBinaryLabelmapRepresentationName())
+    return labelmap.GetMTime() if labelmap else 0
+
+  def exportToTable(self, table=None, nonEmptyKeysOnly=True, segmentIDs=None):
+    """ Exports the statistics to table. If segmentIDs are given and the table still has the rows and columns of the
+    previous export, only the rows of these segments are updated.
+    """
     if not table:
       table = slicer.vtkMRMLTableNode()
       table.SetName(slicer.mrmlScene.GenerateUniqueName(self.grayscaleNode.GetName() + ' statistics'))
       slicer.mrmlScene.AddNode(table)
     table.SetUseColumnNameAsColumnHeader(True)
-    SegmentStatisticsLogic.exportToTable(self, table, nonEmptyKeysOnly)
+    keys = self.getNonEmptyKeys() if nonEmptyKeysOnly else self.keys
+    tableLayout = (table.GetID(), tuple(self.statistics["SegmentIDs"]), tuple(keys))
+    if segmentIDs is not None and tableLayout == self.tableLayout and \
+        table.GetNumberOfRows() == len(self.statistics["SegmentIDs"]):
+      self._updateTableRows(table, keys, segmentIDs)
+    else:
+      SegmentStatisticsLogic.exportToTable(self, table, nonEmptyKeysOnly)
+      self.tableLayout = tableLayout
     return table
 
+  def _updateTableRows(self, table, keys, segmentIDs):
+    if not segmentIDs:
+      return
+    wasModified = table.StartModify()
+    for segmentID in segmentIDs:
+      rowIndex = self.statistics["SegmentIDs"].index(segmentID)
+      for columnIndex, key in enumerate(keys):
+        value = self.statistics.get((segmentID, key))
+        table.GetTable().GetColumn(columnIndex).SetValue(rowIndex, value if value is not None else '')
+    table.GetTable().Modified()
+    table.EndModify(wasModified)
+
   def isSegmentValid(self, segmentID):
     for key in self.getNonEmptyKeys():
       if isinstance(self.statistics[segmentID, key], str):
@@ -59,56 +428,6 @@ class CustomSegmentStatisticsLogic(SegmentStatisticsLogic):
         return True
     return False
 
-  def createJSONFromTerminologyContext(self, terminologyEntry):
-    segmentData = dict()
-
-    categoryObject = terminologyEntry.GetCategoryObject()
-    if categoryObject is None or not self.isTerminologyInformationValid(categoryObject):
-      return {}
-    segmentData["SegmentedPropertyCategoryCodeSequence"] = self.getJSONFromVTKSlicerTerminology(categoryObject)
-
-    typeObject = terminologyEntry.GetTypeObject()
-    if typeObject is None or not self.isTerminologyInformationValid(typeObject):
-      return {}
-    segmentData["SegmentedPropertyTypeCodeSequence"] = self.getJSONFromVTKSlicerTerminology(typeObject)
-
-    modifierObject = terminologyEntry.GetTypeModifierObject()
-    if modifierObject is not None and self.isTerminologyInformationValid(modifierObject):
-      segmentData["SegmentedPropertyTypeModifierCodeSequence"] = self.getJSONFromVTKSlicerTerminology(modifierObject)
-
-    return segmentData
-
-  def createJSONFromAnatomicContext(self, terminologyEntry):
-    segmentData = dict()
-
-    try:
-      regionObject = terminologyEntry.GetRegionObject()
-    except AttributeError:
-      # backward compatibility with Slicer 5.8.1
-      regionObject = terminologyEntry.GetAnatomicRegionObject()
-
-    if regionObject is None or not self.isTerminologyInformationValid(regionObject):
-      return {}
-    segmentData["AnatomicRegionSequence"] = self.getJSONFromVTKSlicerTerminology(regionObject)
-
-    try:
-      regionModifierObject = terminologyEntry.GetRegionModifierObject()
-    except AttributeError:
-      # backward compatibility with Slicer 5.8.1
-      regionModifierObject = terminologyEntry.GetAnatomicRegionModifierObject()
-
-    if regionModifierObject is not None and self.isTerminologyInformationValid(regionModifierObject):
-      segmentData["AnatomicRegionModifierSequence"] = self.getJSONFromVTKSlicerTerminology(regionModifierObject)
-    return segmentData
-
-  def isTerminologyInformationValid(self, termTypeObject):
-    return all(t is not None for t in [termTypeObject.GetCodeValue(), termTypeObject.GetCodingSchemeDesignator(),
-                                       termTypeObject.GetCodeMeaning()])
-
-  def getJSONFromVTKSlicerTerminology(self, termTypeObject):
-    return self.getDICOMTriplet(termTypeObject.GetCodeValue(), termTypeObject.GetCodingSchemeDesignator(),
-                                termTypeObject.GetCodeMeaning())
-
   def generateJSON4DcmSR(self, dcmSegmentationFile, sourceVolumeNode):
     measurements = []
 
@@ -128,12 +447,11 @@ class CustomSegmentStatisticsLogic(SegmentStatisticsLogic):
       data["segmentationSOPInstanceUID"] = segmentationSOPInstanceUID
       segment = self.segmentationNode.GetSegmentation().GetSegment(segmentID)
 
-      terminologyEntry = DICOMSegmentationExporter.getDeserializedTerminologyEntry(segment)
+      codeSequences = DICOMSegmentationExporter.getTerminologyCodeSequences(segment)
 
-      data["Finding"] = self.createJSONFromTerminologyContext(terminologyEntry)["SegmentedPropertyTypeCodeSequence"]
-      anatomicContext = self.createJSONFromAnatomicContext(terminologyEntry)
-      if "AnatomicRegionSequence" in anatomicContext:
-        data["FindingSite"] = anatomicContext["AnatomicRegionSequence"]
+      data["Finding"] = codeSequences["SegmentedPropertyTypeCodeSequence"]
+      if codeSequences["AnatomicRegionSequence"] is not None:
+        data["FindingSite"] = codeSequences["AnatomicRegionSequence"]
       data["measurementItems"] = self.createMeasurementItemsForLabelValue(segmentID)
       measurements.append(data)
 
@@ -154,8 +472,13 @@ class CustomSegmentStatisticsLogic(SegmentStatisticsLogic):
     return measurementItems
 
   def _createCodeSequence(self, vtkStringifiedCodedEntry):
+    try:
+      return dict(self.codeSequenceCache[vtkStringifiedCodedEntry])
+    except KeyError:
+      pass
     codeSequence = dict()
     for each in vtkStringifiedCodedEntry.split('|'):
       key, value = each.split(":")
       codeSequence[key] = value
-    return codeSequence
\ No newline at end of file
+    self.codeSequenceCache[vtkStringifiedCodedEntry] = codeSequence
+    return dict(codeSequence)
\ No newline at end of file
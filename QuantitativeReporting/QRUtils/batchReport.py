@@ -0,0 +1,329 @@
+"""Creates DICOM SEG and SR TID1500 reports for many cases without user interaction.
+
+Each case is a reference series (a directory holding its DICOM files or the SeriesInstanceUID of a series in the
+DICOM database of the application), one .seg.nrrd segmentation or one or more labelmap files and dcmqi style
+metadata. The metadata holds the series attributes of the general content schema
+(ContentCreatorName, SeriesDescription, ClinicalTrialTimePointID, ...) and, for labelmaps, the segmentAttributes
+describing each label.
+
+Run with:
+  Slicer --no-splash --no-main-window --python-script QRUtils/batchReport.py --cases cases.json --output <directory>
+    [--workers 4] [--completed] [--skip-empty]
+
+where cases.json is a list of {"id": ..., "referenceSeries": ..., "segmentations": [...], "metadata": file or dict}.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import argparse
+import contextlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import ctk
+import slicer
+from DICOMLib import DICOMUtils
+from slicer.ScriptedLoadableModule import ScriptedLoadableModuleLogic
+
+from DICOMSegmentationPlugin import DICOMSegmentationExporter, DICOMSegmentationPluginClass
+from QRCustomizations.CustomSegmentStatistics import CustomSegmentStatisticsLogic
+
+
+class BatchReportLogic(ScriptedLoadableModuleLogic):
+
+  # cases handed to one worker process, which amortizes the application startup over several cases
+  casesPerProcess = 10
+
+  @staticmethod
+  def getAdditionalSRInformation(metadata, completed=False):
+    data = dict()
+    data["observerContext"] = {"ObserverType": "PERSON",
+                               "PersonObserverName": metadata["ContentCreatorName"]}
+    data["VerificationFlag"] = "VERIFIED" if completed else "UNVERIFIED"
+    data["CompletionFlag"] = "COMPLETE" if completed else "PARTIAL"
+    data["activitySession"] = "1"
+    data["timePoint"] = metadata["ClinicalTrialTimePointID"]
+    return data
+
+  @staticmethod
+  def createDICOMSR(exporter, segFilePath, volumeNode, measurements, additionalInformation, outputSRPath):
+    """ Writes the measurements of the segments in segFilePath as DICOM SR TID1500 to outputSRPath using the
+    tid1500writer CLI
+    """
+    data = exporter.getSeriesAttributes()
+    data["SeriesDescription"] = "Measurement Report"
+
+    compositeContextDataDir, data["compositeContext"] = os.path.dirname(segFilePath), [os.path.basename(segFilePath)]
+    imageLibraryDataDir, data["imageLibrary"] = exporter.getDICOMFileList(volumeNode)
+    data.update(additionalInformation)
+    data["Measurements"] = measurements
+    logging.debug("DICOM SR Metadata output:")
+    logging.debug(json.dumps(data, indent=2, separators=(',', ': ')))
+
+    metaFilePath = exporter.saveJSON(data, os.path.join(exporter.tempDir, "sr_meta.json"))
+    params = {"metaDataFileName": metaFilePath,
+              "compositeContextDataDir": compositeContextDataDir,
+              "imageLibraryDataDir": imageLibraryDataDir,
+              "outputFileName": outputSRPath}
+    logging.debug(params)
+    cliNode = slicer.cli.run(slicer.modules.tid1500writer, None, params, wait_for_completion=True)
+    try:
+      if cliNode.GetStatusString() != 'Completed':
+        raise RuntimeError("tid1500writer CLI did not complete cleanly")
+    finally:
+      slicer.mrmlScene.RemoveNode(cliNode)
+    return outputSRPath
+
+  def run(self, cases, outputDirectory, numberOfWorkers=None, completed=False, skipEmpty=False):
+    """ Creates the reports of all cases using numberOfWorkers Slicer processes (0 for the current process) and
+    returns one result per case in the order of cases. Each result holds the case id, its status ("succeeded" or
+    "failed"), the error message, the duration of the case and its steps and the created SEG and SR files.
+    """
+    startTime = time.time()
+    if not os.path.exists(outputDirectory):
+      os.makedirs(outputDirectory)
+    if numberOfWorkers == 0:
+      results = self.createReports(cases, outputDirectory, completed, skipEmpty)
+    else:
+      numberOfWorkers = numberOfWorkers or max(1, (os.cpu_count() or 1) // 2)
+      casesPerProcess = max(1, min(self.casesPerProcess, len(cases) // numberOfWorkers))
+      batches = [cases[index:index + casesPerProcess] for index in range(0, len(cases), casesPerProcess)]
+      with ThreadPoolExecutor(max_workers=numberOfWorkers) as executor:
+        batchResults = executor.map(lambda batch: self._runWorkerProcess(batch, outputDirectory, completed,
+                                                                         skipEmpty), batches)
+        results = [result for batchResult in batchResults for result in batchResult]
+
+    duration = time.time() - startTime
+    failures = [result for result in results if result["status"] != "succeeded"]
+    for result in failures:
+      logging.error("Creating the report of case {} failed: {}".format(result["id"], result["error"]))
+    logging.info("Created {} of {} reports in {:.1f}s ({:.0f} cases per hour)"
+                 .format(len(results) - len(failures), len(results), duration,
+                         len(results) * 3600. / duration if duration else 0))
+    return results
+
+  def _runWorkerProcess(self, cases, outputDirectory, completed, skipEmpty):
+    workerDirectory = tempfile.mkdtemp(prefix="QRBatchReport")
+    casesFileName = os.path.join(workerDirectory, "cases.json")
+    resultsFileName = os.path.join(workerDirectory, "results.jsonl")
+    logFileName = os.path.join(outputDirectory, "worker_{}.log".format(os.path.basename(workerDirectory)))
+    try:
+      try:
+        with open(casesFileName, "w") as casesFile:
+          json.dump(cases, casesFile)
+        command = [slicer.app.applicationFilePath(), "--no-splash", "--no-main-window",
+                   "--python-script", os.path.abspath(__file__),
+                   "--worker", casesFileName, "--results", resultsFileName, "--output", outputDirectory]
+        if completed:
+          command.append("--completed")
+        if skipEmpty:
+          command.append("--skip-empty")
+        with open(logFileName, "w") as logFile:
+          returnCode = subprocess.call(command, stdout=logFile, stderr=subprocess.STDOUT)
+        error = "Worker process exited with code {}, see {}".format(returnCode, logFileName)
+      except Exception as exc:
+        logging.exception("Running a worker process failed")
+        error = "Worker process could not be run: {}".format(exc)
+      resultsByID = self.readResults(resultsFileName)
+    finally:
+      shutil.rmtree(workerDirectory, ignore_errors=True)
+    return [resultsByID.get(str(case["id"]), {"id": str(case["id"]), "status": "failed", "error": error,
+                                              "durations": {}, "files": {}})
+            for case in cases]
+
+  @staticmethod
+  def readResults(resultsFileName):
+    """ Returns {case id: result} of the results written by createReports to resultsFileName. An incomplete last
+    line, written by a worker process that crashed, is ignored.
+    """
+    resultsByID = {}
+    if not os.path.exists(resultsFileName):
+      return resultsByID
+    with open(resultsFileName) as resultsFile:
+      for line in resultsFile:
+        try:
+          result = json.loads(line)
+        except ValueError:
+          continue
+        resultsByID[result["id"]] = result
+    return resultsByID
+
+  def createReports(self, cases, outputDirectory, completed=False, skipEmpty=False, resultsFileName=None):
+    """ Creates the reports of all cases in the current process. If all reference series are directories, they are
+    indexed into a temporary DICOM database, otherwise into the DICOM database of the application. If
+    resultsFileName is given, the result of each case is appended to it as a line of JSON as soon as the case is
+    finished, so the results of finished cases are kept even if the process crashes.
+    """
+    results = []
+    if all(os.path.isdir(case["referenceSeries"]) for case in cases):
+      databaseContext = DICOMUtils.TemporaryDICOMDatabase()
+    else:
+      databaseContext = contextlib.nullcontext()
+    with databaseContext:
+      for case in cases:
+        result = {"id": str(case["id"]), "status": "failed", "error": None, "durations": {}, "files": {}}
+        startTime = time.time()
+        try:
+          result["files"] = self.createReport(case, os.path.join(outputDirectory, result["id"]), completed,
+                                              skipEmpty, result["durations"])
+          result["status"] = "succeeded"
+        except Exception as exc:
+          logging.exception("Creating the report of case {} failed".format(result["id"]))
+          result["error"] = str(exc)
+        result["durations"]["total"] = time.time() - startTime
+        results.append(result)
+        if resultsFileName:
+          with open(resultsFileName, "a") as resultsFile:
+            resultsFile.write(json.dumps(result) + "\n")
+    return results
+
+  def createReport(self, case, outputDirectory, completed=False, skipEmpty=False, durations=None):
+    """ Creates the DICOM SEG and SR of one case in outputDirectory and returns their file names. The duration of
+    each step is added to durations.
+    """
+    durations = durations if durations is not None else {}
+    metadata = case["metadata"]
+    if not isinstance(metadata, dict):
+      with open(metadata) as metadataFile:
+        metadata = json.load(metadataFile)
+    metadata = dict(metadata)
+    segmentAttributes = metadata.pop("segmentAttributes", None)
+    if not os.path.exists(outputDirectory):
+      os.makedirs(outputDirectory)
+
+    nodes = []
+    exporter = None
+    try:
+      stepStartTime = time.time()
+      volumeNode = self.loadReferenceSeries(case["referenceSeries"], nodes)
+      segmentationNode = self.loadSegmentation(case["segmentations"], segmentAttributes, volumeNode, nodes)
+      durations["load"] = time.time() - stepStartTime
+
+      stepStartTime = time.time()
+      exporter = DICOMSegmentationExporter(segmentationNode, metadata.get("ContentCreatorName"))
+      segFileName = "{}_SEG.dcm".format(case["id"])
+      exporter.export(outputDirectory, segFileName, dict(metadata), skipEmpty=skipEmpty)
+      segFilePath = os.path.join(outputDirectory, segFileName)
+      durations["seg"] = time.time() - stepStartTime
+
+      stepStartTime = time.time()
+      measurements = self.computeMeasurements(segmentationNode, volumeNode, segFilePath)
+      durations["statistics"] = time.time() - stepStartTime
+
+      stepStartTime = time.time()
+      srFilePath = self.createDICOMSR(exporter, segFilePath, volumeNode, measurements,
+                                     self.getAdditionalSRInformation(metadata, completed),
+                                     os.path.join(outputDirectory, "{}_SR.dcm".format(case["id"])))
+      durations["sr"] = time.time() - stepStartTime
+    finally:
+      if exporter:
+        exporter.cleanup()
+      for node in nodes:
+        slicer.mrmlScene.RemoveNode(node)
+    return {"seg": segFilePath, "sr": srFilePath}
+
+  @staticmethod
+  def loadReferenceSeries(referenceSeries, nodes):
+    """ Indexes the DICOM files of the directory referenceSeries (without copying them) and loads them as
+    scalar volume. referenceSeries can also be the SeriesInstanceUID of a series in the DICOM database.
+    """
+    seriesUID = referenceSeries
+    if os.path.isdir(referenceSeries):
+      indexer = ctk.ctkDICOMIndexer()
+      indexer.addDirectory(slicer.dicomDatabase, referenceSeries, None)
+      indexer.waitForImportFinished()
+      seriesUIDs = set()
+      for root, _, fileNames in os.walk(referenceSeries):
+        seriesUIDs.update(slicer.dicomDatabase.seriesForFile(os.path.join(root, fileName)) for fileName in fileNames)
+      seriesUIDs.discard("")
+      if len(seriesUIDs) != 1:
+        raise ValueError("Expected a single series in {}, found {}".format(referenceSeries, len(seriesUIDs)))
+      seriesUID = seriesUIDs.pop()
+    loadedNodes = [slicer.mrmlScene.GetNodeByID(nodeID) for nodeID in DICOMUtils.loadSeriesByUID([seriesUID])]
+    nodes.extend(loadedNodes)
+    volumeNodes = [node for node in loadedNodes if node.IsA("vtkMRMLScalarVolumeNode")]
+    if not volumeNodes:
+      raise ValueError("Reference series {} could not be loaded as volume".format(referenceSeries))
+    return volumeNodes[0]
+
+  @staticmethod
+  def loadSegmentation(fileNames, segmentAttributes, volumeNode, nodes):
+    """ Returns a segmentation node holding the segments of one .seg.nrrd file or of labelmap files. The
+    segmentAttributes list the dcmqi segment attributes of each labelmap file, in the order of fileNames.
+    """
+    if len(fileNames) == 1 and fileNames[0].lower().endswith(".seg.nrrd"):
+      segmentationNode = slicer.util.loadSegmentation(fileNames[0])
+      nodes.append(segmentationNode)
+    else:
+      if not segmentAttributes or len(segmentAttributes) != len(fileNames):
+        raise ValueError("Metadata needs segmentAttributes for each of the {} labelmap files".format(len(fileNames)))
+      segmentationNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSegmentationNode")
+      nodes.append(segmentationNode)
+      segmentationNode.SetReferenceImageGeometryParameterFromVolumeNode(volumeNode)
+      plugin = DICOMSegmentationPluginClass()
+      terminologiesLogic = slicer.modules.terminologies.logic()
+      for fileName, fileSegmentAttributes in zip(fileNames, segmentAttributes):
+        labelNode = slicer.util.loadLabelVolume(fileName)
+        # segments are imported in the order of their label values
+        labelNode.labelAttributes = [
+          plugin._getLabelAttributes(attributes, terminologiesLogic,
+                                     "Segmentation category and type - DICOM master list",
+                                     "Anatomic codes - DICOM master list")
+          for attributes in sorted(fileSegmentAttributes, key=lambda attributes: attributes["labelID"])]
+        numberOfSegments = segmentationNode.GetSegmentation().GetNumberOfSegments()
+        plugin._importSegmentAndRemoveLabel(labelNode, segmentationNode)
+        numberOfImportedSegments = segmentationNode.GetSegmentation().GetNumberOfSegments() - numberOfSegments
+        if numberOfImportedSegments != len(fileSegmentAttributes):
+          raise ValueError("{} holds {} labels, but {} are described by segmentAttributes"
+                           .format(fileName, numberOfImportedSegments, len(fileSegmentAttributes)))
+    segmentationNode.SetReferenceImageGeometryParameterFromVolumeNode(volumeNode)
+    segmentationNode.CreateDefaultDisplayNodes()
+    return segmentationNode
+
+  @staticmethod
+  def computeMeasurements(segmentationNode, volumeNode, segFilePath):
+    statisticsLogic = CustomSegmentStatisticsLogic()
+    parameterNode = statisticsLogic.getParameterNode()
+    try:
+      parameterNode.SetParameter("visibleSegmentsOnly", "False")
+      parameterNode.SetParameter("Segmentation", segmentationNode.GetID())
+      parameterNode.SetParameter("ScalarVolume", volumeNode.GetID())
+      statisticsLogic.computeStatistics()
+      return statisticsLogic.generateJSON4DcmSR(segFilePath, volumeNode)
+    finally:
+      slicer.mrmlScene.RemoveNode(parameterNode)
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  inputGroup = parser.add_mutually_exclusive_group(required=True)
+  inputGroup.add_argument("--cases", help="JSON file listing the cases")
+  inputGroup.add_argument("--worker", help=argparse.SUPPRESS)
+  parser.add_argument("--results", help=argparse.SUPPRESS)
+  parser.add_argument("--output", required=True, help="directory receiving one sub directory per case")
+  parser.add_argument("--workers", type=int, default=None, help="number of Slicer processes, 0 for none")
+  parser.add_argument("--completed", action="store_true", help="mark the reports as completed and verified")
+  parser.add_argument("--skip-empty", action="store_true", help="skip empty segments instead of failing the case")
+  args = parser.parse_args(argv)
+
+  logic = BatchReportLogic()
+  with open(args.cases or args.worker) as casesFile:
+    cases = json.load(casesFile)
+  if args.worker:
+    # results are written per case by createReports
+    results = logic.createReports(cases, args.output, args.completed, args.skip_empty, args.results)
+  else:
+    results = logic.run(cases, args.output, args.workers, args.completed, args.skip_empty)
+    with open(os.path.join(args.output, "batch_report.json"), "w") as resultsFile:
+      json.dump(results, resultsFile, indent=2)
+  return 0 if all(result["status"] == "succeeded" for result in results) else 1
+
+
+if __name__ == "__main__":
+  slicer.util.exit(main(sys.argv[1:]))
@@ -0,0 +1,218 @@
+"""Exports the measurements of many DICOM SR TID1500 reports as one long-format table, with one row per measurement
+item. Reports are read in worker processes and never loaded into the MRML scene.
+
+Run with:
+  PythonSlicer QRUtils/cohortExport.py --input <directory> [<directory> ...] --output measurements.csv [--workers 8]
+  PythonSlicer QRUtils/cohortExport.py --database <ctkDICOM.sql> --output measurements.parquet
+
+Writing Parquet files requires the pyarrow package.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import argparse
+import csv
+import logging
+import os
+import pathlib
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import pydicom
+import pydicom.errors
+
+if __name__ in ("__main__", "__mp_main__"):
+  # the DICOM plugins are installed next to the QuantitativeReporting module
+  sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from base.TID1500MeasurementReader import TID1500MeasurementReader
+
+
+COLUMNS = ["PatientID", "StudyInstanceUID", "StudyDate", "SeriesInstanceUID", "SOPInstanceUID", "TrackingIdentifier",
+           "TrackingUniqueIdentifier", "Finding", "FindingSite", "Measurement", "Quantity", "Units", "Derivation",
+           "Value"]
+
+SR_STORAGE_CLASSES = [pydicom.uid.EnhancedSRStorage, pydicom.uid.ComprehensiveSRStorage,
+                      pydicom.uid.Comprehensive3DSRStorage]
+
+
+def isDICOMTID1500(dataset):
+  try:
+    return dataset.Modality == "SR" and dataset.SOPClassUID in SR_STORAGE_CLASSES and \
+           dataset.ContentTemplateSequence[0].TemplateIdentifier == "1500"
+  except (AttributeError, IndexError):
+    return False
+
+
+def extractMeasurementRows(fileName):
+  """ Returns one row (list of COLUMNS values) per measurement item of the given file, which is empty if the file
+  is not a TID1500 SR.
+  """
+  try:
+    dataset = pydicom.dcmread(fileName, stop_before_pixels=True)
+  except pydicom.errors.InvalidDicomError:
+    return []
+  if not isDICOMTID1500(dataset):
+    return []
+
+  def codeMeaning(code):
+    return code["CodeMeaning"] if code else ""
+
+  reportValues = [str(getattr(dataset, keyword, "")) for keyword in
+                  ["PatientID", "StudyInstanceUID", "StudyDate", "SeriesInstanceUID", "SOPInstanceUID"]]
+  rows = []
+  for measurement in TID1500MeasurementReader(dataset).getMetadata().get("Measurements", []):
+    measurementItems = measurement["measurementItems"]
+    infoItems = TID1500MeasurementReader.enumerateDuplicateNames(
+      TID1500MeasurementReader.generateMeasurementInformation(measurementItems))
+    measurementValues = [measurement.get("TrackingIdentifier", ""), measurement.get("TrackingUniqueIdentifier", ""),
+                         codeMeaning(measurement.get("Finding")), codeMeaning(measurement.get("FindingSite"))]
+    for info, measurementItem in zip(infoItems, measurementItems):
+      rows.append(reportValues + measurementValues +
+                  [info["name"], codeMeaning(measurementItem["quantity"]), info["unit"],
+                   codeMeaning(measurementItem.get("derivationModifier")), measurementItem["value"]])
+  return rows
+
+
+def _extractMeasurementRows(fileName):
+  try:
+    return fileName, extractMeasurementRows(fileName), None
+  except Exception as exc:
+    return fileName, [], str(exc)
+
+
+def findFiles(directories):
+  """ Yields all files below the given directories """
+  for directory in directories:
+    for root, _, fileNames in os.walk(directory):
+      for fileName in fileNames:
+        yield os.path.join(root, fileName)
+
+
+def findDatabaseSRFiles(databaseFileName):
+  """ Yields the files of all SR series of the given ctkDICOMDatabase file without requiring Slicer """
+  databaseDirectory = os.path.dirname(os.path.abspath(databaseFileName))
+  databaseURI = pathlib.Path(databaseFileName).resolve().as_uri() + "?mode=ro"
+  connection = sqlite3.connect(databaseURI, uri=True)
+  try:
+    rows = connection.execute("SELECT Images.Filename FROM Images JOIN Series ON "
+                              "Images.SeriesInstanceUID = Series.SeriesInstanceUID WHERE Series.Modality = 'SR'")
+    for (fileName,) in rows:
+      # files inside the database directory are stored with a '%/' prefix
+      yield os.path.join(databaseDirectory, fileName[2:]) if fileName.startswith("%/") else fileName
+  finally:
+    connection.close()
+
+
+class MeasurementTableWriter(object):
+  """ Appends rows to a CSV file or, with pyarrow, to a Parquet file in batches of batchSize rows """
+
+  def __init__(self, fileName, batchSize=10000):
+    self.fileName = fileName
+    self.batchSize = batchSize
+    self.rows = []
+    self.parquetWriter = None
+    self.csvFile = None
+    if fileName.lower().endswith(".parquet"):
+      try:
+        import pyarrow
+        import pyarrow.parquet
+      except ImportError:
+        raise ValueError("Writing Parquet files requires the 'pyarrow' Python package")
+      self.schema = pyarrow.schema([(column, pyarrow.string()) for column in COLUMNS])
+      self.parquetWriter = pyarrow.parquet.ParquetWriter(fileName, self.schema)
+    else:
+      self.csvFile = open(fileName, "w", newline="")
+      self.csvWriter = csv.writer(self.csvFile)
+      self.csvWriter.writerow(COLUMNS)
+
+  def addRows(self, rows):
+    if self.csvFile:
+      self.csvWriter.writerows(rows)
+      return
+    self.rows += rows
+    if len(self.rows) >= self.batchSize:
+      self._writeParquetBatch()
+
+  def _writeParquetBatch(self):
+    import pyarrow
+    if not self.rows:
+      return
+    columns = list(zip(*self.rows))
+    self.parquetWriter.write_table(pyarrow.Table.from_arrays([pyarrow.array(column, pyarrow.string())
+                                                              for column in columns], schema=self.schema))
+    self.rows = []
+
+  def close(self):
+    if self.csvFile:
+      self.csvFile.close()
+    else:
+      self._writeParquetBatch()
+      self.parquetWriter.close()
+
+
+def exportCohortMeasurements(files, outputFileName, numberOfWorkers=None):
+  """ Writes the measurement rows of all TID1500 reports among files (any iterable) to outputFileName (.csv or
+  .parquet). Files are read by numberOfWorkers processes, 0 reads them in the calling process. At most twice as
+  many files as workers are pending at any time and rows are written as soon as a file is read, so memory stays
+  bounded for any number of files. Returns a summary dictionary.
+  """
+  startTime = time.time()
+  summary = {"files": 0, "reports": 0, "rows": 0, "failures": []}
+  writer = MeasurementTableWriter(outputFileName)
+
+  def addResult(result):
+    fileName, rows, error = result
+    summary["files"] += 1
+    if error:
+      logging.warning("Reading measurements from %s failed: %s" % (fileName, error))
+      summary["failures"].append((fileName, error))
+    elif rows:
+      summary["reports"] += 1
+      summary["rows"] += len(rows)
+      writer.addRows(rows)
+
+  try:
+    if numberOfWorkers == 0:
+      for fileName in files:
+        addResult(_extractMeasurementRows(fileName))
+    else:
+      numberOfWorkers = numberOfWorkers or os.cpu_count() or 1
+      with ProcessPoolExecutor(max_workers=numberOfWorkers) as executor:
+        pending = set()
+        for fileName in files:
+          if len(pending) >= 2 * numberOfWorkers:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+              addResult(future.result())
+          pending.add(executor.submit(_extractMeasurementRows, fileName))
+        for future in wait(pending).done:
+          addResult(future.result())
+  finally:
+    writer.close()
+
+  summary["duration"] = time.time() - startTime
+  logging.info("Exported %d measurements of %d reports from %d files in %.1fs (%d failures)"
+               % (summary["rows"], summary["reports"], summary["files"], summary["duration"],
+                  len(summary["failures"])))
+  return summary
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  inputGroup = parser.add_mutually_exclusive_group(required=True)
+  inputGroup.add_argument("--input", nargs="+", help="directories to search for DICOM SR files")
+  inputGroup.add_argument("--database", help="ctkDICOM.sql file of a Slicer DICOM database")
+  parser.add_argument("--output", required=True, help="output .csv or .parquet file")
+  parser.add_argument("--workers", type=int, default=None, help="number of worker processes, 0 for none")
+  args = parser.parse_args(argv)
+
+  logging.basicConfig(level=logging.INFO)
+  files = findDatabaseSRFiles(args.database) if args.database else findFiles(args.input)
+  summary = exportCohortMeasurements(files, args.output, numberOfWorkers=args.workers)
+  return 1 if summary["failures"] else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main(sys.argv[1:]))
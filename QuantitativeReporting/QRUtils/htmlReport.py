@@ -6,13 +6,12 @@ import ctk
 import slicer
 import vtk
 from QRCustomizations.CustomSegmentEditor import CustomSegmentEditorLogic
-from DICOMSegmentationPlugin import DICOMSegmentationExporter
+from DICOMSegmentationPlugin import DICOMSegmentationExporter, SegmentExtentAnalyzer
 
 from SlicerDevelopmentToolboxUtils.buttons import CrosshairButton
 from SlicerDevelopmentToolboxUtils.constants import DICOMTAGS
 from SlicerDevelopmentToolboxUtils.mixins import ModuleWidgetMixin, ModuleLogicMixin
 
-import vtkSegmentationCorePython as vtkSegmentationCore
 from six.moves import range
 
 
@@ -58,28 +57,37 @@ class ScreenShotHelper(ModuleWidgetMixin):
 
   @staticmethod
   def findLargest2DRegion(segmentationNode):
+    """ Returns a labelmap volume node (not added to the scene) covering the segment with the largest in-plane
+    extent, cropped to that extent
+    """
     qrLogic = CustomSegmentEditorLogic
     segmentationsLogic = slicer.modules.segmentations.logic()
 
-    largestLM = None
-    largestSize = 0
-    for segment in qrLogic.getAllSegments(segmentationNode):
-      imageData = vtkSegmentationCore.vtkOrientedImageData()
-      segmentID = segmentationNode.GetSegmentation().GetSegmentIdBySegment(segment)
-      segmentationsLogic.GetSegmentBinaryLabelmapRepresentation(segmentationNode, segmentID, imageData)
-      extent = imageData.GetExtent()
-
-      if extent[1] != -1 and extent[3] != -1 and extent[5] != -1:
-        tempLabel = slicer.vtkMRMLLabelMapVolumeNode()
-        tempLabel.SetName(segment.GetName() + "CentroidHelper")
-        segmentationsLogic.CreateLabelmapVolumeFromOrientedImageData(imageData, tempLabel)
-
-        dims = tempLabel.GetImageData().GetDimensions()
-        size = dims[0]*dims[1]
-        if size > largestSize:
-          largestSize = size
-          largestLM = tempLabel
+    geometry = SegmentExtentAnalyzer.getSegmentationGeometry(segmentationNode)
+    if geometry is None:
+      return None
+    segmentIDs = [segmentationNode.GetSegmentation().GetSegmentIdBySegment(segment)
+                  for segment in qrLogic.getAllSegments(segmentationNode)]
+    extents = SegmentExtentAnalyzer.getEffectiveExtents(segmentationNode, segmentIDs, geometry)
 
+    largestSegmentID = None
+    largestSize = 0
+    for segmentID in segmentIDs:
+      extent = extents[segmentID]
+      if extent is None:
+        continue
+      size = (extent[1] - extent[0] + 1) * (extent[3] - extent[2] + 1)
+      if size > largestSize:
+        largestSize = size
+        largestSegmentID = segmentID
+    if largestSegmentID is None:
+      return None
+
+    imageData = DICOMSegmentationExporter.getCroppedSegmentLabelmap(segmentationNode, largestSegmentID, geometry,
+                                                                   extents)
+    largestLM = slicer.vtkMRMLLabelMapVolumeNode()
+    largestLM.SetName(segmentationNode.GetSegmentation().GetSegment(largestSegmentID).GetName() + "CentroidHelper")
+    segmentationsLogic.CreateLabelmapVolumeFromOrientedImageData(imageData, largestLM)
     return largestLM
 
   @staticmethod
@@ -369,23 +377,22 @@ class HTMLReportCreator(ScreenShotHelper):
     return largestLabel
 
   def getTerminologyInformation(self, segment):
-    terminologyEntry = DICOMSegmentationExporter.getDeserializedTerminologyEntry(segment)
-    catModifier = terminologyEntry.GetTypeModifierObject ().GetCodeMeaning()
+    codeSequences = DICOMSegmentationExporter.getTerminologyCodeSequences(segment)
+
+    def getCodeMeaning(codeSequenceName):
+      codeSequence = codeSequences[codeSequenceName]
+      return codeSequence["CodeMeaning"] if codeSequence else ""
 
-    try:
-      anatomicRegion = terminologyEntry.GetRegionObject().GetCodeMeaning()
-      anatomicRegionModifier = terminologyEntry.GetRegionModifierObject ().GetCodeMeaning()
-    except AttributeError:
-      # backward compatibility with Slicer 5.8.1
-      anatomicRegion = terminologyEntry.GetAnatomicRegionObject().GetCodeMeaning()
-      anatomicRegionModifier = terminologyEntry.GetAnatomicRegionModifierObject ().GetCodeMeaning()
+    catModifier = getCodeMeaning("SegmentedPropertyTypeModifierCodeSequence")
+    anatomicRegion = getCodeMeaning("AnatomicRegionSequence")
+    anatomicRegionModifier = getCodeMeaning("AnatomicRegionModifierSequence")
 
     html = '''
       <table border=0 width='100%' cellPadding=3 cellSpacing=0>
         {}{}{}{}{}
       </table>
-    '''.format(self.infoRow.format("Category:", terminologyEntry.GetCategoryObject().GetCodeMeaning()),
-               self.infoRow.format("Category Type:", terminologyEntry.GetTypeObject().GetCodeMeaning()),
+    '''.format(self.infoRow.format("Category:", getCodeMeaning("SegmentedPropertyCategoryCodeSequence")),
+               self.infoRow.format("Category Type:", getCodeMeaning("SegmentedPropertyTypeCodeSequence")),
                self.infoRow.format("Category Type Modifier:", catModifier) if catModifier else "",
                self.infoRow.format("Anatomic Region:", anatomicRegion) if anatomicRegion else "",
                self.infoRow.format("Anatomic Region Modifier:", anatomicRegionModifier) if anatomicRegionModifier else "")
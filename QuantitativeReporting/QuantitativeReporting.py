@@ -6,6 +6,7 @@ import os
 import ctk
 import qt
 import slicer
+import vtk
 from slicer.ScriptedLoadableModule import *
 
 import vtkSegmentationCorePython as vtkSegmentationCore
@@ -21,6 +22,7 @@ from SlicerDevelopmentToolboxUtils.widgets import CopySegmentBetweenSegmentation
 from SlicerDevelopmentToolboxUtils.widgets import DICOMBasedInformationWatchBox, ImportLabelMapIntoSegmentationWidget
 from SlicerDevelopmentToolboxUtils.forms.FormsDialog import FormsDialog
 
+from QRUtils.batchReport import BatchReportLogic
 from QRUtils.htmlReport import HTMLReportCreator
 from QRUtils.testdata import TestDataLogic
 
@@ -56,12 +58,15 @@ class QuantitativeReportingWidget(ModuleWidgetMixin, ScriptedLoadableModuleWidge
   https://github.com/Slicer/Slicer/blob/master/Base/Python/slicer/ScriptedLoadableModule.py
   """
 
+  # statistics which are automatically updated after editing are computed in a worker thread
+  computeStatisticsInBackground = True
+
   def __init__(self, parent=None):
     ScriptedLoadableModuleWidget.__init__(self, parent)
     self.slicerTempDir = slicer.util.tempDirectory()
     slicer.mrmlScene.AddObserver(slicer.mrmlScene.EndCloseEvent, self.onSceneClosed)
     self.modulePath = os.path.dirname(slicer.util.modulePath(self.moduleName))
-    self.delayedAutoUpdateTimer = self.createTimer(500, self.updateMeasurementsTable, singleShot=True)
+    self.delayedAutoUpdateTimer = self.createTimer(500, self.onDelayedAutoUpdate, singleShot=True)
 
   def __del__(self):
     self.delayedAutoUpdateTimer.stop()
@@ -466,6 +471,7 @@ class QuantitativeReportingWidget(ModuleWidgetMixin, ScriptedLoadableModuleWidge
   def onMeasurementReportSelected(self, node):
     # TODO check here if it's longitudinal data
     self.removeSegmentationObserver()
+    self.segmentEditorWidget.logic.segmentStatisticsLogic.cancelBackgroundUpdate()
     self.segmentEditorWidget.editor.setMasterVolumeNode(None)
     self.calculateAutomaticallyCheckbox.checked = True
     self.tableNode = node
@@ -532,7 +538,7 @@ class QuantitativeReportingWidget(ModuleWidgetMixin, ScriptedLoadableModuleWidge
                           vtkSegmentationCore.vtkSegmentation.RepresentationModified]
 
     for event in segmentationEvents:
-      self.segmentationObservers.append(segNode.AddObserver(event, self.onSegmentationNodeChanged))
+      self.segmentationObservers.append(segNode.AddObserver(event, self.onSegmentModified))
 
   def initializeWatchBox(self, node):
     if not node:
@@ -558,6 +564,11 @@ class QuantitativeReportingWidget(ModuleWidgetMixin, ScriptedLoadableModuleWidge
   def createNewSegmentationNode(self):
     return slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSegmentationNode")
 
+  @vtk.calldata_type(vtk.VTK_STRING)
+  def onSegmentModified(self, caller, event, segmentID):
+    self.segmentEditorWidget.logic.segmentStatisticsLogic.setSegmentModified(segmentID)
+    self.onSegmentationNodeChanged()
+
   @postCall(refreshUIElementsAvailability)
   def onSegmentationNodeChanged(self, observer=None, caller=None):
     if self.segmentImportWidget.busy:
@@ -567,10 +578,17 @@ class QuantitativeReportingWidget(ModuleWidgetMixin, ScriptedLoadableModuleWidge
     self.delayedAutoUpdateTimer.start()
     #self.updateMeasurementsTable() # instead use delayed auto update triggered above
 
-  def updateMeasurementsTable(self, triggered=False, visibleOnly=False):
+  def onDelayedAutoUpdate(self):
+    self.updateMeasurementsTable(background=self.computeStatisticsInBackground)
+
+  def updateMeasurementsTable(self, triggered=False, visibleOnly=False, background=False):
     if not self.calculateAutomaticallyCheckbox.checked and not triggered:
       self.tableView.setStyleSheet("QTableView{border:2px solid red;};")
       return
+    if background:
+      self.segmentEditorWidget.calculateSegmentStatisticsInBackground(self.tableNode, visibleOnly,
+                                                                      self.setMeasurementsTable)
+      return
     table = self.segmentEditorWidget.calculateSegmentStatistics(self.tableNode, visibleOnly)
     self.setMeasurementsTable(table)
 
@@ -673,35 +691,13 @@ class QuantitativeReportingWidget(ModuleWidgetMixin, ScriptedLoadableModuleWidge
     return dcmSegmentationPath
 
   def createDICOMSR(self, referencedSegmentation, completed):
-    data = self.dicomSegmentationExporter.getSeriesAttributes()
-    data["SeriesDescription"] = "Measurement Report"
-
-    compositeContextDataDir, data["compositeContext"] = \
-      os.path.dirname(referencedSegmentation), [os.path.basename(referencedSegmentation)]
-    imageLibraryDataDir, data["imageLibrary"] = \
-      self.dicomSegmentationExporter.getDICOMFileList(self.segmentEditorWidget.masterVolumeNode)
-    data.update(self._getAdditionalSRInformation(completed))
-
-    data["Measurements"] = \
+    measurements = \
       self.segmentEditorWidget.logic.segmentStatisticsLogic.generateJSON4DcmSR(referencedSegmentation,
                                                                                self.segmentEditorWidget.masterVolumeNode)
-    logging.debug("DICOM SR Metadata output:")
-    logging.debug(json.dumps(data, indent=2, separators=(',', ': ')))
-
-    metaFilePath = self.saveJSON(data, os.path.join(self.dicomSegmentationExporter.tempDir, "sr_meta.json"))
     outputSRPath = os.path.join(self.dicomSegmentationExporter.tempDir, "sr.dcm")
-
-    params = {"metaDataFileName": metaFilePath,
-              "compositeContextDataDir": compositeContextDataDir,
-              "imageLibraryDataDir": imageLibraryDataDir,
-              "outputFileName": outputSRPath}
-
-    logging.debug(params)
-    cliNode = slicer.cli.run(slicer.modules.tid1500writer, None, params, wait_for_completion=True)
-
-    if cliNode.GetStatusString() != 'Completed':
-      raise Exception("tid1500writer CLI did not complete cleanly")
-    return outputSRPath
+    return BatchReportLogic.createDICOMSR(self.dicomSegmentationExporter, referencedSegmentation,
+                                          self.segmentEditorWidget.masterVolumeNode, measurements,
+                                          self._getAdditionalSRInformation(completed), outputSRPath)
 
   def cleanupTemporaryData(self):
     if self.dicomSegmentationExporter:
@@ -709,14 +705,7 @@ class QuantitativeReportingWidget(ModuleWidgetMixin, ScriptedLoadableModuleWidge
     self.dicomSegmentationExporter = None
 
   def _getAdditionalSRInformation(self, completed=False):
-    data = dict()
-    data["observerContext"] = {"ObserverType": "PERSON",
-                               "PersonObserverName": self._metadata["ContentCreatorName"]}
-    data["VerificationFlag"] = "VERIFIED" if completed else "UNVERIFIED"
-    data["CompletionFlag"] = "COMPLETE" if completed else "PARTIAL"
-    data["activitySession"] = "1"
-    data["timePoint"] = self._metadata["ClinicalTrialTimePointID"]
-    return data
+    return BatchReportLogic.getAdditionalSRInformation(self._metadata, completed)
 
   def saveJSON(self, data, destination):
     with open(os.path.join(destination), 'w') as outfile:
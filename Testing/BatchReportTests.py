@@ -0,0 +1,188 @@
+from __future__ import absolute_import
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy
+import pydicom
+import slicer
+from pydicom.dataset import Dataset, FileMetaDataset
+
+from base.TID1500MeasurementReader import TID1500MeasurementReader
+from QRUtils import batchReport
+from QRUtils.batchReport import BatchReportLogic
+
+
+SEGMENT_ATTRIBUTES = [
+  {"labelID": 1, "SegmentLabel": "Tumor", "SegmentDescription": "Tumor", "SegmentAlgorithmType": "MANUAL",
+   "recommendedDisplayRGBValue": [255, 0, 0],
+   "SegmentedPropertyCategoryCodeSequence": {"CodeValue": "49755003", "CodingSchemeDesignator": "SCT",
+                                             "CodeMeaning": "Morphologically Altered Structure"},
+   "SegmentedPropertyTypeCodeSequence": {"CodeValue": "4147007", "CodingSchemeDesignator": "SCT",
+                                         "CodeMeaning": "Mass"}},
+  {"labelID": 2, "SegmentLabel": "Liver", "SegmentDescription": "Liver", "SegmentAlgorithmType": "MANUAL",
+   "recommendedDisplayRGBValue": [0, 255, 0],
+   "SegmentedPropertyCategoryCodeSequence": {"CodeValue": "123037004", "CodingSchemeDesignator": "SCT",
+                                             "CodeMeaning": "Anatomical Structure"},
+   "SegmentedPropertyTypeCodeSequence": {"CodeValue": "10200004", "CodingSchemeDesignator": "SCT",
+                                         "CodeMeaning": "Liver"}}
+]
+
+METADATA = {"ContentCreatorName": "Reader1", "ClinicalTrialSeriesID": "Session1", "ClinicalTrialTimePointID": "1",
+            "SeriesDescription": "Segmentation", "SeriesNumber": "300", "InstanceNumber": "1",
+            "BodyPartExamined": "Liver"}
+
+# KJI ordered voxels, spacing and origin (LPS) of the synthetic reference series
+SHAPE = (6, 16, 20)
+SPACING = (0.8, 0.8, 2.)
+ORIGIN = (10., 20., 30.)
+
+
+def writeFile(fileName, dataset):
+  try:
+    pydicom.dcmwrite(fileName, dataset, enforce_file_format=True)
+  except TypeError:
+    # pydicom < 3
+    pydicom.dcmwrite(fileName, dataset, write_like_original=False)
+
+
+def writeReferenceSeries(directory, pixelArray):
+  """ Writes the KJI ordered pixelArray as axial CT series to directory """
+  studyUID, seriesUID, frameOfReferenceUID = [pydicom.uid.generate_uid() for _ in range(3)]
+  for sliceIndex, pixels in enumerate(pixelArray):
+    ds = Dataset()
+    ds.SOPClassUID = pydicom.uid.CTImageStorage
+    ds.SOPInstanceUID = pydicom.uid.generate_uid()
+    ds.StudyInstanceUID = studyUID
+    ds.SeriesInstanceUID = seriesUID
+    ds.FrameOfReferenceUID = frameOfReferenceUID
+    ds.PatientName = "QR^Batch"
+    ds.PatientID = "QRBatch"
+    ds.PatientBirthDate = ""
+    ds.PatientSex = "O"
+    ds.StudyDate = "20200101"
+    ds.StudyTime = "120000"
+    ds.StudyID = "1"
+    ds.AccessionNumber = ""
+    ds.ReferringPhysicianName = ""
+    ds.Modality = "CT"
+    ds.Manufacturer = ""
+    ds.SeriesNumber = 1
+    ds.InstanceNumber = sliceIndex + 1
+    ds.ImagePositionPatient = [ORIGIN[0], ORIGIN[1], ORIGIN[2] + sliceIndex * SPACING[2]]
+    ds.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+    ds.PixelSpacing = [SPACING[1], SPACING[0]]
+    ds.SliceThickness = SPACING[2]
+    ds.Rows, ds.Columns = pixels.shape
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.BitsAllocated = 16
+    ds.BitsStored = 16
+    ds.HighBit = 15
+    ds.PixelRepresentation = 1
+    ds.RescaleIntercept = 0
+    ds.RescaleSlope = 1
+    ds.PixelData = pixels.astype(numpy.int16).tobytes()
+    ds.file_meta = FileMetaDataset()
+    ds.file_meta.MediaStorageSOPClassUID = ds.SOPClassUID
+    ds.file_meta.MediaStorageSOPInstanceUID = ds.SOPInstanceUID
+    ds.file_meta.TransferSyntaxUID = pydicom.uid.ExplicitVRLittleEndian
+    writeFile(os.path.join(directory, "{}.dcm".format(sliceIndex)), ds)
+
+
+def getIJKToRAS():
+  ijkToRAS = numpy.diag([-SPACING[0], -SPACING[1], SPACING[2], 1.])
+  ijkToRAS[:3, 3] = [-ORIGIN[0], -ORIGIN[1], ORIGIN[2]]
+  return ijkToRAS
+
+
+class BatchReportTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp(prefix="QRBatchReportTest")
+    self.logic = BatchReportLogic()
+    self.labels = numpy.zeros(SHAPE, dtype=numpy.uint8)
+    self.labels[1:4, 3:9, 4:12] = 1
+    self.labels[2:6, 10:15, 2:18] = 2
+    self.labelmapFileName = os.path.join(self.directory, "labels.nrrd")
+    labelNode = slicer.util.addVolumeFromArray(self.labels, ijkToRAS=getIJKToRAS(),
+                                               nodeClassName="vtkMRMLLabelMapVolumeNode")
+    slicer.util.saveNode(labelNode, self.labelmapFileName)
+    slicer.mrmlScene.RemoveNode(labelNode)
+
+  def tearDown(self):
+    slicer.mrmlScene.Clear(0)
+    shutil.rmtree(self.directory)
+
+  def test_load_segmentation(self):
+    volumeNode = slicer.util.addVolumeFromArray(numpy.zeros(SHAPE, dtype=numpy.int16), ijkToRAS=getIJKToRAS())
+    nodes = []
+    segmentationNode = self.logic.loadSegmentation([self.labelmapFileName], [SEGMENT_ATTRIBUTES], volumeNode, nodes)
+    self.assertEqual(nodes, [segmentationNode])
+    segmentation = segmentationNode.GetSegmentation()
+    segmentNames = [segmentation.GetNthSegment(index).GetName() for index in range(segmentation.GetNumberOfSegments())]
+    self.assertEqual(segmentNames, ["Tumor", "Liver"])
+    for index, labelValue in enumerate([1, 2]):
+      array = slicer.util.arrayFromSegmentBinaryLabelmap(segmentationNode, segmentation.GetNthSegmentID(index),
+                                                         volumeNode)
+      self.assertTrue(numpy.array_equal(array > 0, self.labels == labelValue))
+
+    # each labelmap file needs its segment attributes
+    with self.assertRaises(ValueError):
+      self.logic.loadSegmentation([self.labelmapFileName], [], volumeNode, nodes)
+
+  def test_create_report(self):
+    seriesDirectory = os.path.join(self.directory, "series")
+    os.makedirs(seriesDirectory)
+    writeReferenceSeries(seriesDirectory, numpy.random.RandomState(0).randint(-100, 200, SHAPE))
+    metadata = dict(METADATA, segmentAttributes=[SEGMENT_ATTRIBUTES])
+    case = {"id": "case1", "referenceSeries": seriesDirectory, "segmentations": [self.labelmapFileName],
+            "metadata": metadata}
+    outputDirectory = os.path.join(self.directory, "output")
+
+    results = self.logic.createReports([case], outputDirectory)
+    self.assertEqual(results[0]["status"], "succeeded", results[0]["error"])
+    self.assertEqual(slicer.mrmlScene.GetNumberOfNodesByClass("vtkMRMLSegmentationNode"), 0)
+
+    seg = pydicom.dcmread(results[0]["files"]["seg"])
+    self.assertEqual([str(item.SegmentLabel) for item in seg.SegmentSequence], ["Tumor", "Liver"])
+    sr = pydicom.dcmread(results[0]["files"]["sr"])
+    measurements = TID1500MeasurementReader(sr).getMetadata()["Measurements"]
+    self.assertEqual([measurement["TrackingIdentifier"] for measurement in measurements], ["Tumor", "Liver"])
+    self.assertTrue(all(measurement["segmentationSOPInstanceUID"] == seg.SOPInstanceUID
+                        for measurement in measurements))
+
+  def test_read_results(self):
+    resultsFileName = os.path.join(self.directory, "results.jsonl")
+    with open(resultsFileName, "w") as resultsFile:
+      resultsFile.write(json.dumps({"id": "case1", "status": "succeeded"}) + "\n")
+      resultsFile.write('{"id": "case2", "sta')
+    self.assertEqual(BatchReportLogic.readResults(resultsFileName), {"case1": {"id": "case1", "status": "succeeded"}})
+    self.assertEqual(BatchReportLogic.readResults(os.path.join(self.directory, "missing.jsonl")), {})
+
+  def test_worker_crash_keeps_finished_cases(self):
+    cases = [{"id": "case1"}, {"id": "case2"}]
+
+    def crashAfterFirstCase(command, **kwargs):
+      with open(command[command.index("--results") + 1], "w") as resultsFile:
+        resultsFile.write(json.dumps({"id": "case1", "status": "succeeded", "error": None}) + "\n")
+      return -11
+
+    with mock.patch.object(batchReport.subprocess, "call", side_effect=crashAfterFirstCase):
+      results = self.logic._runWorkerProcess(cases, self.directory, False, False)
+    self.assertEqual([result["status"] for result in results], ["succeeded", "failed"])
+    self.assertIn("exited with code -11", results[1]["error"])
+
+  def test_worker_launch_failure(self):
+    cases = [{"id": "case1"}, {"id": "case2"}]
+    with mock.patch.object(batchReport.subprocess, "call", side_effect=OSError("cannot execute")):
+      results = self.logic._runWorkerProcess(cases, self.directory, False, False)
+    self.assertEqual([result["status"] for result in results], ["failed", "failed"])
+    self.assertTrue(all("cannot execute" in result["error"] for result in results))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,183 @@
+from __future__ import absolute_import
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+import pydicom
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.sequence import Sequence
+
+from base.TID1500MeasurementReader import TID1500MeasurementReader
+from QRUtils.cohortExport import COLUMNS, exportCohortMeasurements, extractMeasurementRows
+
+
+def createCode(value, designator, meaning):
+  code = Dataset()
+  code.CodeValue = value
+  code.CodingSchemeDesignator = designator
+  code.CodeMeaning = meaning
+  return code
+
+
+def createContentItem(valueType, conceptName, **attributes):
+  item = Dataset()
+  item.ValueType = valueType
+  item.ConceptNameCodeSequence = Sequence([createCode(*conceptName)])
+  for keyword, value in attributes.items():
+    setattr(item, keyword, value)
+  return item
+
+
+def createNumericItem(quantity, value, unit, derivation=None):
+  measuredValue = Dataset()
+  measuredValue.NumericValue = value
+  measuredValue.MeasurementUnitsCodeSequence = Sequence([createCode(*unit)])
+  item = createContentItem("NUM", quantity, MeasuredValueSequence=Sequence([measuredValue]))
+  if derivation:
+    item.ContentSequence = Sequence([createContentItem("CODE", ("121401", "DCM", "Derivation"),
+                                                       ConceptCodeSequence=Sequence([createCode(*derivation)]))])
+  return item
+
+
+def createLongCodeItem():
+  """ Returns a text item whose concept name is coded with a LongCodeValue instead of a CodeValue """
+  code = Dataset()
+  code.LongCodeValue = "a-private-concept-name-longer-than-sixteen-characters"
+  code.CodingSchemeDesignator = "99QR"
+  code.CodeMeaning = "Private Note"
+  item = Dataset()
+  item.ValueType = "TEXT"
+  item.ConceptNameCodeSequence = Sequence([code])
+  item.TextValue = "note"
+  return item
+
+
+def createMeasurementReport():
+  """ Returns a TID1500 SR with one measurement group of a liver segment """
+  reference = Dataset()
+  reference.ReferencedSOPInstanceUID = "1.2.3.4.2"
+  reference.ReferencedSegmentNumber = 1
+  meanHU = ("112031", "DCM", "Attenuation Coefficient")
+  hounsfield = ("[hnsf'U]", "UCUM", "Hounsfield unit")
+  group = createContentItem("CONTAINER", ("125007", "DCM", "Measurement Group"), ContentSequence=Sequence([
+    createContentItem("TEXT", ("112039", "DCM", "Tracking Identifier"), TextValue="Liver"),
+    createContentItem("UIDREF", ("112040", "DCM", "Tracking Unique Identifier"), UID="1.2.3.4.3"),
+    createContentItem("IMAGE", ("121191", "DCM", "Referenced Segment"),
+                      ReferencedSOPSequence=Sequence([reference])),
+    createContentItem("CODE", ("121071", "DCM", "Finding"),
+                      ConceptCodeSequence=Sequence([createCode("10200004", "SCT", "Liver")])),
+    createContentItem("CODE", ("363698007", "SCT", "Finding Site"),
+                      ConceptCodeSequence=Sequence([createCode("10200004", "SCT", "Liver")])),
+    createNumericItem(("118565006", "SCT", "Volume"), "12.5", ("cm3", "UCUM", "cubic centimeter")),
+    createNumericItem(meanHU, "-20", hounsfield, ("255605001", "SCT", "Minimum")),
+    createNumericItem(meanHU, "35.5", hounsfield, ("373098007", "SCT", "Mean")),
+    createNumericItem(meanHU, "36", hounsfield, ("373098007", "SCT", "Mean")),
+    createContentItem("NUM", ("118565006", "SCT", "Volume")),
+    createLongCodeItem()
+  ]))
+
+  dataset = Dataset()
+  dataset.PatientID = "QR-1"
+  dataset.StudyInstanceUID = "1.2.3"
+  dataset.StudyDate = "20200101"
+  dataset.SeriesInstanceUID = "1.2.3.4"
+  dataset.SOPInstanceUID = "1.2.3.4.1"
+  dataset.SOPClassUID = pydicom.uid.ComprehensiveSRStorage
+  dataset.Modality = "SR"
+  dataset.SeriesDescription = "Measurements"
+  dataset.SeriesNumber = 100
+  template = Dataset()
+  template.MappingResource = "DCMR"
+  template.TemplateIdentifier = "1500"
+  dataset.ContentTemplateSequence = Sequence([template])
+  dataset.ContentSequence = Sequence([
+    createContentItem("CONTAINER", ("126010", "DCM", "Imaging Measurements"), ContentSequence=Sequence([group]))])
+
+  dataset.file_meta = FileMetaDataset()
+  dataset.file_meta.MediaStorageSOPClassUID = dataset.SOPClassUID
+  dataset.file_meta.MediaStorageSOPInstanceUID = dataset.SOPInstanceUID
+  dataset.file_meta.TransferSyntaxUID = pydicom.uid.ExplicitVRLittleEndian
+  return dataset
+
+
+def writeFile(fileName, dataset):
+  try:
+    pydicom.dcmwrite(fileName, dataset, enforce_file_format=True)
+  except TypeError:
+    # pydicom < 3
+    pydicom.dcmwrite(fileName, dataset, write_like_original=False)
+
+
+class CohortExportTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp(prefix="QRCohortExportTest")
+    self.reportFileName = os.path.join(self.directory, "report.dcm")
+    writeFile(self.reportFileName, createMeasurementReport())
+    self.otherFileName = os.path.join(self.directory, "notes.txt")
+    with open(self.otherFileName, "w") as f:
+      f.write("not a DICOM file")
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def test_read_measurements(self):
+    metadata = TID1500MeasurementReader(pydicom.dcmread(self.reportFileName)).getMetadata()
+    self.assertEqual(metadata["SeriesDescription"], "Measurements")
+    self.assertEqual(len(metadata["Measurements"]), 1)
+    measurement = metadata["Measurements"][0]
+    self.assertEqual(measurement["TrackingIdentifier"], "Liver")
+    self.assertEqual(measurement["TrackingUniqueIdentifier"], "1.2.3.4.3")
+    self.assertEqual(measurement["segmentationSOPInstanceUID"], "1.2.3.4.2")
+    self.assertEqual(measurement["ReferencedSegment"], 1)
+    self.assertEqual(measurement["FindingSite"]["CodeMeaning"], "Liver")
+    # the item without measured value is skipped
+    self.assertEqual([item["value"] for item in measurement["measurementItems"]], ["12.5", "-20", "35.5", "36"])
+    self.assertNotIn("derivationModifier", measurement["measurementItems"][0])
+    self.assertEqual(measurement["measurementItems"][1]["derivationModifier"]["CodeMeaning"], "Minimum")
+
+  def test_concept_without_code_value(self):
+    item = createLongCodeItem()
+    self.assertFalse(TID1500MeasurementReader.isConcept(item, "trackingIdentifier"))
+    item.ConceptNameCodeSequence[0].LongCodeValue = "112039"
+    item.ConceptNameCodeSequence[0].CodingSchemeDesignator = "DCM"
+    self.assertTrue(TID1500MeasurementReader.isConcept(item, "trackingIdentifier"))
+    self.assertFalse(TID1500MeasurementReader.isConcept(Dataset(), "trackingIdentifier"))
+
+  def test_measurement_information(self):
+    measurementItems = TID1500MeasurementReader(pydicom.dcmread(self.reportFileName)).getMetadata()[
+      "Measurements"][0]["measurementItems"]
+    infoItems = TID1500MeasurementReader.enumerateDuplicateNames(
+      TID1500MeasurementReader.generateMeasurementInformation(measurementItems))
+    self.assertEqual([info["name"] for info in infoItems],
+                     ["Volume [cm3]", "Minimum [hnsf'U]", "Mean [hnsf'U] (1)", "Mean [hnsf'U] (2)"])
+    self.assertEqual(infoItems[0]["unit"], "cubic centimeter")
+
+  def test_extract_measurement_rows(self):
+    rows = extractMeasurementRows(self.reportFileName)
+    self.assertEqual(len(rows), 4)
+    self.assertTrue(all(len(row) == len(COLUMNS) for row in rows))
+    self.assertEqual(dict(zip(COLUMNS, rows[1])), {
+      "PatientID": "QR-1", "StudyInstanceUID": "1.2.3", "StudyDate": "20200101", "SeriesInstanceUID": "1.2.3.4",
+      "SOPInstanceUID": "1.2.3.4.1", "TrackingIdentifier": "Liver", "TrackingUniqueIdentifier": "1.2.3.4.3",
+      "Finding": "Liver", "FindingSite": "Liver", "Measurement": "Minimum [hnsf'U]",
+      "Quantity": "Attenuation Coefficient", "Units": "Hounsfield unit", "Derivation": "Minimum", "Value": "-20"})
+    self.assertEqual(rows[0][COLUMNS.index("Derivation")], "")
+    self.assertEqual(extractMeasurementRows(self.otherFileName), [])
+
+  def test_export_csv(self):
+    outputFileName = os.path.join(self.directory, "measurements.csv")
+    summary = exportCohortMeasurements([self.reportFileName, self.otherFileName], outputFileName,
+                                       numberOfWorkers=0)
+    self.assertEqual((summary["files"], summary["reports"], summary["rows"]), (2, 1, 4))
+    self.assertEqual(summary["failures"], [])
+    with open(outputFileName, newline="") as f:
+      rows = list(csv.reader(f))
+    self.assertEqual(rows[0], COLUMNS)
+    self.assertEqual(rows[1:], extractMeasurementRows(self.reportFileName))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,91 @@
+from __future__ import absolute_import
+import unittest
+
+import numpy
+import slicer
+
+from SegmentStatistics import SegmentStatisticsLogic
+from QRCustomizations.CustomSegmentStatistics import GroupedSegmentStatistics
+
+
+class GroupedSegmentStatisticsTest(unittest.TestCase):
+
+  keys = GroupedSegmentStatistics.supportedKeys
+
+  def compute(self, scalars, labels, labelValues, voxelVolume=1.):
+    return GroupedSegmentStatistics.compute(numpy.array(scalars, dtype=numpy.int16).reshape(1, 1, -1),
+                                            numpy.array(labels, dtype=numpy.uint8).reshape(1, 1, -1),
+                                            labelValues, voxelVolume, self.keys)
+
+  def test_statistics(self):
+    stats = self.compute([4, 9, 2, 7, 0], [1, 0, 1, 1, 2], {"a": 1, "b": 2}, voxelVolume=2.)
+    self.assertEqual(stats["a"]["voxel_count"], 3)
+    self.assertAlmostEqual(stats["a"]["volume_mm3"], 6.)
+    self.assertAlmostEqual(stats["a"]["volume_cm3"], 0.006)
+    self.assertEqual(stats["a"]["min"], 2)
+    self.assertEqual(stats["a"]["max"], 7)
+    self.assertAlmostEqual(stats["a"]["mean"], 13. / 3)
+    self.assertAlmostEqual(stats["a"]["stdev"], numpy.std([4, 2, 7], ddof=1))
+
+  def test_median_odd_and_even_counts(self):
+    stats = self.compute([5, 1, 3, 8, 2, 4, 6], [1, 1, 1, 2, 2, 2, 2], {"odd": 1, "even": 2})
+    self.assertEqual(stats["odd"]["median"], 3)
+    self.assertEqual(stats["even"]["median"], 5)
+
+  def test_single_voxel(self):
+    stats = self.compute([3, 5], [0, 1], {"a": 1})
+    self.assertEqual(stats["a"]["voxel_count"], 1)
+    self.assertEqual(stats["a"]["median"], 5)
+    self.assertEqual(stats["a"]["stdev"], 0)
+
+  def test_empty_segments(self):
+    stats = self.compute([3, 5], [1, 1], {"a": 1, "empty": 2})
+    self.assertEqual(stats["empty"], {key: 0 for key in self.keys})
+    stats = self.compute([3, 5], [0, 0], {"a": 1})
+    self.assertEqual(stats["a"], {key: 0 for key in self.keys})
+
+  def test_label_values_not_requested(self):
+    stats = self.compute([1, 100, 3, -100], [1, 2, 1, 3], {"a": 1})
+    self.assertEqual(list(stats.keys()), ["a"])
+    self.assertEqual(stats["a"]["voxel_count"], 2)
+    self.assertEqual(stats["a"]["min"], 1)
+    self.assertEqual(stats["a"]["max"], 3)
+
+  def test_matches_scalar_volume_plugin(self):
+    self.addCleanup(slicer.mrmlScene.Clear, 0)
+    scalars = numpy.random.RandomState(0).randint(-100, 100, (6, 7, 8)).astype(numpy.int16)
+    labels = numpy.zeros(scalars.shape, dtype=numpy.uint8)
+    labels[1:4, 2:5, 1:6] = 1
+    labels[3:6, 0:2, 4:8] = 2
+    labels[0, 6, 7] = 3
+    volumeNode = slicer.util.addVolumeFromArray(scalars)
+    labelNode = slicer.util.addVolumeFromArray(labels, nodeClassName="vtkMRMLLabelMapVolumeNode")
+    for node in [volumeNode, labelNode]:
+      node.SetSpacing(0.5, 1., 2.)
+    segmentationNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSegmentationNode")
+    segmentationNode.SetReferenceImageGeometryParameterFromVolumeNode(volumeNode)
+    slicer.modules.segmentations.logic().ImportLabelmapToSegmentationNode(labelNode, segmentationNode)
+    segmentation = segmentationNode.GetSegmentation()
+    labelValues = {segmentation.GetNthSegmentID(index): index + 1 for index in range(3)}
+
+    logic = SegmentStatisticsLogic()
+    parameterNode = logic.getParameterNode()
+    parameterNode.SetParameter("Segmentation", segmentationNode.GetID())
+    parameterNode.SetParameter("ScalarVolume", volumeNode.GetID())
+    parameterNode.SetParameter("LabelmapSegmentStatisticsPlugin.enabled", "False")
+    parameterNode.SetParameter("ClosedSurfaceSegmentStatisticsPlugin.enabled", "False")
+    for key in self.keys:
+      parameterNode.SetParameter("ScalarVolumeSegmentStatisticsPlugin.{}.enabled".format(key), "True")
+    logic.computeStatistics()
+    expected = logic.getStatistics()
+
+    stats = GroupedSegmentStatistics.compute(scalars, labels, labelValues, 1., self.keys)
+    for segmentID in labelValues.keys():
+      for key in self.keys:
+        self.assertAlmostEqual(stats[segmentID][key],
+                               expected[segmentID, "ScalarVolumeSegmentStatisticsPlugin." + key], places=4,
+                               msg="{} of segment {}".format(key, segmentID))
+
+
+if __name__ == '__main__':
+  unittest.main()
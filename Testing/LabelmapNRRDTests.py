@@ -0,0 +1,102 @@
+from __future__ import absolute_import
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+import slicer
+import vtk
+from vtk.util import numpy_support
+
+from DICOMSegmentationPlugin import DICOMSegmentationExporter
+
+
+def getObliqueIJKToRAS(spacing=(0.7, 0.9, 2.5), origin=(-12.5, 30.25, 101.)):
+  """ Returns a 4x4 IJK to RAS matrix rotated about all three axes, with anisotropic spacing """
+  rotation = numpy.eye(3)
+  for axis, angle in enumerate(numpy.radians([20., -35., 50.])):
+    cosine, sine = numpy.cos(angle), numpy.sin(angle)
+    axisRotation = numpy.eye(3)
+    first, second = [index for index in range(3) if index != axis]
+    axisRotation[[first, first, second, second], [first, second, first, second]] = [cosine, -sine, sine, cosine]
+    rotation = axisRotation.dot(rotation)
+  ijkToRAS = numpy.eye(4)
+  ijkToRAS[:3, :3] = rotation * spacing
+  ijkToRAS[:3, 3] = origin
+  return ijkToRAS
+
+
+def readNRRD(fileName):
+  """ Returns the header fields and the raw data of a NRRD file """
+  with open(fileName, "rb") as nrrdFile:
+    content = nrrdFile.read()
+  header, data = content.split(b"\n\n", 1)
+  fields = dict(line.split(": ", 1) for line in header.decode("ascii").splitlines()[1:])
+  return fields, data
+
+
+def parseVectors(value):
+  return numpy.array([[float(component) for component in vector.strip("()").split(",")]
+                      for vector in value.split()])
+
+
+class LabelmapNRRDTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp(prefix="QRLabelmapNRRDTest")
+    self.fileName = os.path.join(self.directory, "label.nrrd")
+    self.ijkToRAS = getObliqueIJKToRAS()
+    self.array = numpy.zeros((5, 7, 9), dtype=numpy.uint8)
+    self.array[1:4, 2:6, 3:8] = 1
+    self.array[4, 0, 0] = 1
+    self.array[0, 6, 8] = 1
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def test_header_and_voxels(self):
+    array = self.array.astype(numpy.int16) * 300
+    DICOMSegmentationExporter.writeLabelmapNRRD(self.fileName, array, self.ijkToRAS[:3].tolist())
+    fields, data = readNRRD(self.fileName)
+    self.assertEqual(fields["type"], "short")
+    self.assertEqual(fields["sizes"], "9 7 5")
+    self.assertEqual(fields["space"], "left-posterior-superior")
+    lpsToRAS = numpy.diag([-1., -1., 1.])
+    directions = parseVectors(fields["space directions"]).dot(lpsToRAS)
+    numpy.testing.assert_allclose(directions.T, self.ijkToRAS[:3, :3], rtol=0, atol=1e-12)
+    numpy.testing.assert_allclose(parseVectors(fields["space origin"])[0].dot(lpsToRAS), self.ijkToRAS[:3, 3],
+                                  rtol=0, atol=1e-12)
+    voxels = numpy.frombuffer(gzip.decompress(data), dtype="<i2").reshape(array.shape)
+    self.assertTrue(numpy.array_equal(voxels, array))
+
+  def test_reload_cropped_oblique_labelmap(self):
+    self.addCleanup(slicer.mrmlScene.Clear, 0)
+    # the labelmap only covers slices 3 to 7 of the segmentation geometry, as written by
+    # createAndGetLabelMapsFromSegments for a segment cropped along the slice axis
+    imageToWorld = vtk.vtkMatrix4x4()
+    for row in range(4):
+      for column in range(4):
+        imageToWorld.SetElement(row, column, self.ijkToRAS[row, column])
+    imageData = slicer.vtkOrientedImageData()
+    imageData.SetImageToWorldMatrix(imageToWorld)
+    imageData.SetExtent(0, 8, 0, 6, 3, 7)
+    imageData.AllocateScalars(vtk.VTK_UNSIGNED_CHAR, 1)
+    numpy_support.vtk_to_numpy(imageData.GetPointData().GetScalars())[:] = self.array.reshape(-1)
+
+    origin = imageToWorld.MultiplyPoint(list(imageData.GetExtent()[::2]) + [1.0])
+    ijkToRAS = [[imageToWorld.GetElement(row, column) for column in range(3)] + [origin[row]] for row in range(3)]
+    DICOMSegmentationExporter.writeLabelmapNRRD(self.fileName, self.array, ijkToRAS)
+
+    labelNode = slicer.util.loadLabelVolume(self.fileName)
+    self.assertTrue(numpy.array_equal(slicer.util.arrayFromVolume(labelNode), self.array))
+    expectedIJKToRAS = self.ijkToRAS.copy()
+    expectedIJKToRAS[:3, 3] = self.ijkToRAS.dot([0, 0, 3, 1])[:3]
+    loadedIJKToRAS = vtk.vtkMatrix4x4()
+    labelNode.GetIJKToRASMatrix(loadedIJKToRAS)
+    numpy.testing.assert_allclose(slicer.util.arrayFromVTKMatrix(loadedIJKToRAS), expectedIJKToRAS, rtol=0, atol=1e-6)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,67 @@
+from __future__ import absolute_import
+import unittest
+
+import numpy
+
+from DICOMSegmentationPlugin import SegmentExtentAnalyzer
+
+
+class SegmentExtentAnalyzerTest(unittest.TestCase):
+
+  def setUp(self):
+    # one shared labelmap layer in KJI order holding the label values 1, 2 and 5
+    self.array = numpy.zeros((4, 5, 6), dtype=numpy.uint8)
+    self.array[1:3, 2, 1:4] = 1
+    self.array[0, 0, 5] = 2
+    self.array[3, 4, 0] = 2
+    self.array[2, 1:4, 5] = 5
+
+  def test_group_voxels(self):
+    voxelIndices, groups, counts = SegmentExtentAnalyzer.groupVoxels(self.array, {"a": 1, "b": 2})
+    self.assertEqual(counts.tolist(), [6, 2])
+    self.assertTrue((numpy.diff(voxelIndices) > 0).all())
+    self.assertEqual(self.array.reshape(-1)[voxelIndices].tolist(), [[1, 2][group] for group in groups])
+
+  def test_group_voxels_without_segments(self):
+    voxelIndices, groups, counts = SegmentExtentAnalyzer.groupVoxels(self.array, {})
+    self.assertEqual((len(voxelIndices), len(groups), len(counts)), (0, 0, 0))
+    voxelIndices, groups, counts = SegmentExtentAnalyzer.groupVoxels(numpy.zeros((2, 2, 2)), {"a": 1})
+    self.assertEqual((len(voxelIndices), counts.tolist()), (0, [0]))
+
+  def test_voxel_counts_and_extents_of_shared_layer(self):
+    results = SegmentExtentAnalyzer.getVoxelCountsAndExtents(self.array, {"a": 1, "b": 2, "c": 5})
+    self.assertEqual(results, {
+      "a": (6, [1, 3, 2, 2, 1, 2]),
+      "b": (2, [0, 5, 0, 4, 0, 3]),
+      "c": (3, [5, 5, 1, 3, 2, 2])
+    })
+
+  def test_empty_segments(self):
+    results = SegmentExtentAnalyzer.getVoxelCountsAndExtents(self.array, {"a": 1, "empty": 3})
+    self.assertEqual(results["empty"], (0, None))
+    self.assertEqual(results["a"], (6, [1, 3, 2, 2, 1, 2]))
+    results = SegmentExtentAnalyzer.getVoxelCountsAndExtents(numpy.zeros((2, 2, 2), dtype=numpy.uint8), {"a": 1})
+    self.assertEqual(results, {"a": (0, None)})
+
+  def test_label_values_not_requested(self):
+    # voxels of other segments of the layer must not extend the extent
+    results = SegmentExtentAnalyzer.getVoxelCountsAndExtents(self.array, {"c": 5})
+    self.assertEqual(results, {"c": (3, [5, 5, 1, 3, 2, 2])})
+
+  def test_crop_array(self):
+    extent = [1, 3, 2, 2, 1, 2]
+    cropped = SegmentExtentAnalyzer.cropArray(self.array, extent)
+    self.assertEqual(cropped.shape, (2, 1, 3))
+    self.assertTrue((cropped == 1).all())
+    origin = (1, 2, 1)
+    self.assertTrue((SegmentExtentAnalyzer.cropArray(cropped, extent, origin) == cropped).all())
+    self.assertEqual(SegmentExtentAnalyzer.cropArray(self.array, None).size, 0)
+
+  def test_union_extent(self):
+    self.assertEqual(SegmentExtentAnalyzer.getUnionExtent([[1, 3, 2, 2, 1, 2], None, [0, 5, 0, 1, 2, 3]]),
+                     [0, 5, 0, 2, 1, 3])
+    self.assertIsNone(SegmentExtentAnalyzer.getUnionExtent([None]))
+
+
+if __name__ == '__main__':
+  unittest.main()
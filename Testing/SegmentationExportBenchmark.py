@@ -0,0 +1,63 @@
+"""Benchmark for writing segment labelmaps for itkimage2segimage with different numbers of workers.
+
+Run with:
+  Slicer --no-main-window --python-script Testing/SegmentationExportBenchmark.py [--segments 50] [--workers 1 4 16]
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import argparse
+import sys
+import time
+
+import numpy
+import slicer
+
+from DICOMSegmentationPlugin import DICOMSegmentationExporter
+
+
+def createSegmentation(numberOfSegments, dimensions=(256, 256, 200)):
+  volumeNode = slicer.util.addVolumeFromArray(numpy.zeros(dimensions[::-1], dtype=numpy.int16))
+  volumeNode.SetSpacing(0.8, 0.8, 1.5)
+  segmentationNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSegmentationNode")
+  segmentationNode.CreateDefaultDisplayNodes()
+  segmentationNode.SetReferenceImageGeometryParameterFromVolumeNode(volumeNode)
+
+  random = numpy.random.RandomState(0)
+  k, j, i = numpy.ogrid[:dimensions[2], :dimensions[1], :dimensions[0]]
+  for index in range(numberOfSegments):
+    center = [random.randint(20, size - 20) for size in dimensions]
+    radius = random.randint(5, 20)
+    mask = (i - center[0]) ** 2 + (j - center[1]) ** 2 + (k - center[2]) ** 2 <= radius ** 2
+    segmentID = segmentationNode.GetSegmentation().AddEmptySegment("segment_{}".format(index))
+    slicer.util.updateSegmentBinaryLabelmapFromArray(mask.astype(numpy.uint8), segmentationNode, segmentID,
+                                                     volumeNode)
+  return segmentationNode
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--segments", type=int, default=50)
+  parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+  parser.add_argument("--repetitions", type=int, default=3)
+  args = parser.parse_args(argv)
+
+  segmentationNode = createSegmentation(args.segments)
+  exporter = DICOMSegmentationExporter(segmentationNode)
+  segmentIDs = exporter.getSegmentIDs(segmentationNode)
+  try:
+    for numberOfWorkers in args.workers:
+      durations = []
+      for _ in range(args.repetitions):
+        startTime = time.time()
+        exporter.createAndGetLabelMapsFromSegments(segmentIDs, numberOfWorkers=numberOfWorkers)
+        durations.append(time.time() - startTime)
+      print("{} segments, {:2d} workers: best {:.2f}s, mean {:.2f}s".format(len(segmentIDs), numberOfWorkers,
+                                                                            min(durations),
+                                                                            sum(durations) / len(durations)))
+  finally:
+    exporter.cleanup()
+
+
+if __name__ == "__main__":
+  main(sys.argv[1:])
+  slicer.util.exit()